@@ -1,8 +1,14 @@
 # Gunicorn Configuration File for ATF Label Application
 # Usage: gunicorn -c gunicorn_config.py wsgi:app
 
+import glob
 import multiprocessing
 import os
+import sys
+import tempfile
+
+# hooks below use the app's modules, same path wsgi.py sets up
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
 
 # Server socket
 bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:10000')
@@ -37,7 +43,9 @@ cert_reqs = 0
 ca_certs = None
 suppress_ragged_eof = True
 do_handshake_on_connect = False
-preload_app = False
+# Load the app, and with it the OCR model, once in the master; workers share the weights
+# copy-on-write instead of loading a copy each. GUNICORN_PRELOAD=0 loads it per worker
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
 
 # Application
 paste = None
@@ -47,6 +55,20 @@ raw_env = []
 # Process naming
 proc_name = 'atflabel'
 
+# every worker keeps its /metrics numbers in OCR_METRICS_DIR so any of them can answer for all;
+# numbers of an earlier run, retired totals included, are dropped at startup
+if not os.environ.get('OCR_METRICS_DIR'):
+    os.environ['OCR_METRICS_DIR'] = tempfile.mkdtemp(prefix='atflabel-metrics-')
+for stale in glob.glob(os.path.join(os.environ['OCR_METRICS_DIR'], '*.json')):
+    os.remove(stale)
+
+# jobs of POST /jobs are kept in OCR_JOB_STORE so a poll answered by any worker finds them
+if not os.environ.get('OCR_JOB_STORE'):
+    os.environ['OCR_JOB_STORE'] = os.path.join(tempfile.mkdtemp(prefix='atflabel-jobs-'), 'jobs.db')
+
+# torch threads per worker, OCR_TORCH_THREADS or the cores split between the workers
+torch_threads = int(os.environ.get('OCR_TORCH_THREADS', 0))
+
 # Server hooks
 def on_starting(server):
     """Called when Gunicorn server is started"""
@@ -54,10 +76,39 @@ def on_starting(server):
     print("ATF Label WSGI Server Starting")
     print(f"Workers: {server.cfg.workers}")
     print(f"Timeout: {server.cfg.timeout}s")
+    print(f"Preload: {server.cfg.preload_app}")
     print("="*60 + "\n")
 
 def when_ready(server):
     """Called when Gunicorn is ready to accept requests"""
     print("\n" + "="*60)
     print("ATF Label Server Ready")
+    print("Workers warm their model up before /ready reports them ready")
     print("="*60 + "\n")
+    if server.cfg.preload_app:
+        from ocr_models import format_memory, memory_usage
+        print(f"Master memory with the app loaded: {format_memory(memory_usage())}")
+
+def pre_fork(server, worker):
+    """Called in the master before each worker is forked"""
+    if server.cfg.preload_app:
+        from ocr_models import prepare_fork
+        prepare_fork()
+
+def post_fork(server, worker):
+    """Called in each worker right after the fork"""
+    from ocr_models import configure_worker_threads, worker_threads
+    configure_worker_threads(worker_threads(server.cfg.workers, torch_threads))
+
+def post_worker_init(worker):
+    """Called in each worker once the app is loaded: what this worker costs on top of the shared model"""
+    from ocr_models import format_memory, memory_usage
+    print(f"Worker {worker.pid} memory: {format_memory(memory_usage())}")
+    # warm the model up in this worker, /ready answers 503 until it is done
+    from server import warmup
+    warmup.start()
+
+def worker_exit(server, worker):
+    """Called in each worker as it exits: what it recorded is added to the retired totals in OCR_METRICS_DIR"""
+    from metrics import metrics
+    metrics.retire()
@@ -82,7 +82,9 @@ fi
 
 # Start Gunicorn
 echo -e "${GREEN}Starting ATF Label Server...${NC}\n"
+# gunicorn_config.py preloads the model in the master (GUNICORN_PRELOAD=0 to load it per worker)
 exec gunicorn \
+    -c gunicorn_config.py \
     -w "$WORKERS" \
     -b "$BIND" \
     --timeout "$TIMEOUT" \
@@ -0,0 +1,103 @@
+"""Alcohol content detection.
+
+Looks the submitted ABV up among the number-plus-% statements parsed once per
+image (quantity_index), then looks for the "ALC/ALCOHOL ... VOL/VOLUME" (or
+ABV) context once: in the candidate's own box, or in the boxes read around it
+(ocr_layout) when the statement is split over boxes.
+This replaces fuzzy matching every box against nine phrasings of the
+statement (up to 18 edit distance computations per box).
+"""
+from typing import List, Optional, Tuple
+from functools import lru_cache
+
+import regex
+
+try:
+    from .ocr_result import OCRResult
+    from .ocr_layout import Layout
+    from .quantity_index import QuantityIndex
+except ImportError:
+    from ocr_result import OCRResult
+    from ocr_layout import Layout
+    from quantity_index import QuantityIndex
+
+# a letter off is allowed on the long forms, the short forms have to be exact
+_ALC = regex.compile(r'\b(?:(?:ALCOHOL){e<=1}|ALC|A1C)')
+_VOL = regex.compile(r'(?:(?:VOLUME){e<=1}|VOL|V0L)\b')
+_ABV = regex.compile(r'\bABV\b')
+# boxes either side of a split number that may hold its wording
+CONTEXT_BOXES = 3
+
+
+def parse_abv(value: str) -> Optional[float]:
+    """Parses an ABV as typed in the form or read off a label ("40", "12.5%", "5,8").
+
+    Returns:
+        float: the percentage, None if it is not a number
+    """
+    try:
+        return float(value.replace('%', '').replace(',', '.').strip())
+    except (ValueError, AttributeError):
+        return None
+
+
+def has_abv_context(text: str) -> bool:
+    """Whether uppercase text says alcohol by volume (ALC ... VOL, ALCOHOL BY VOLUME, ABV)."""
+    return bool(_ABV.search(text) or (_ALC.search(text) and _VOL.search(text)))
+
+
+class ABVMatcher:
+    """Finds one ABV value on a label, compiled once per submitted value."""
+
+    def __init__(self, alcohol_content: str):
+        self.alcohol_content = alcohol_content
+        self.value = parse_abv(alcohol_content)
+
+    def candidates(self, result: OCRResult) -> List[int]:
+        """rdix ids of boxes containing the submitted number followed by %."""
+        if self.value is None:
+            return []
+        return QuantityIndex.of(result).find_percent(self.value)
+
+    def find(self, result: OCRResult) -> Tuple[bool, list]:
+        """Looks for the ABV statement.
+
+        Args:
+            result (OCRResult): normalized OCR data
+
+        Returns:
+            bool: True if present, false if not
+            list: list of bounding boxes for the found text
+        """
+        candidates = self.candidates(result)
+        # whole statement in one box
+        for i in candidates:
+            if has_abv_context(result.upper[i]):
+                return True, [result[i]['bbox']]
+        # split over boxes, context has to be next to the number
+        for i in candidates:
+            boxes = self._split_context(result, i)
+            if boxes:
+                return True, [result[i]['bbox']] + boxes
+        return False, []
+
+    @staticmethod
+    def _split_context(result: OCRResult, i: int) -> list:
+        # the boxes read just before and after the number, nearest first
+        neighbors = Layout.of(result).neighbors(i)[:2 * CONTEXT_BOXES]
+        text = result.upper[i]
+        used = []
+        for pid in neighbors:
+            ptext = result.upper[pid]
+            if _ALC.search(ptext) or _VOL.search(ptext) or _ABV.search(ptext):
+                text += ' ' + ptext
+                used.append(result[pid]['bbox'])
+                if has_abv_context(text):
+                    return used
+        return []
+
+
+@lru_cache(maxsize=64)
+def compile_abv_matcher(alcohol_content: str) -> ABVMatcher:
+    """Returns the ABVMatcher for a value, built once and reused across images."""
+    return ABVMatcher(alcohol_content)
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""Batch audit: re-validates a manifest of stored submissions across a process pool.
+
+Each worker process loads the OCR model once and validates labels from the
+manifest. Results stream to a JSONL file as they finish, and throughput in
+labels per minute is reported on stderr.
+
+Manifest rows (CSV header or JSONL keys):
+    id                  optional, defaults to the row number
+    images              image paths separated by ';', relative to the manifest
+    brand_name, product_class, alcohol_content, net_contents, net_contents_unit
+
+Usage:
+    python src/audit.py manifest.csv --output results.jsonl --workers 4
+
+With --queue the manifest is put on a job queue instead and the results are
+collected from whatever headless workers (worker.py) are taking jobs from it:
+    python src/audit.py manifest.csv --queue sqlite:///audit.db --output results.jsonl
+"""
+from typing import Any, Dict, Iterator, List, Optional
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+try:
+    from .ocr_checker import OCRChecker
+    from .job_queue import JobQueue, open_queue
+except ImportError:
+    from ocr_checker import OCRChecker
+    from job_queue import JobQueue, open_queue
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+FIELDS = ['brand_name', 'product_class', 'alcohol_content', 'net_contents', 'net_contents_unit']
+
+# One checker per worker process, built by _init_worker
+_checker: Optional[OCRChecker] = None
+
+
+def read_manifest(manifest_path: str) -> Iterator[Dict[str, Any]]:
+    """Reads a CSV or JSONL manifest.
+
+    Args:
+        manifest_path (str): .csv or .jsonl file
+
+    Returns:
+        Iterator[dict]: one entry per label with id, image paths and form fields
+    """
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, 'r', newline='') as f:
+        if manifest_path.endswith('.csv'):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for n, row in enumerate(rows):
+            images = row.get('images') or row.get('image') or []
+            if isinstance(images, str):
+                images = [p.strip() for p in images.split(';') if p.strip()]
+            entry = {field: str(row.get(field) or '') for field in FIELDS}
+            entry['id'] = str(row.get('id') or n)
+            entry['images'] = [os.path.join(base, p) for p in images]
+            yield entry
+
+
+def _init_worker(model: str, fixture_path: Optional[str], threads: int):
+    global _checker
+    _checker = OCRChecker(modelSelect=model, fixture_path=fixture_path)
+    # every worker would otherwise start a torch thread per core
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(threads)
+
+
+def audit_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Validates one manifest entry with this worker process' checker."""
+    return validate_entry(_checker, entry)
+
+
+def validate_entry(checker: OCRChecker, entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Validates one manifest entry.
+
+    Args:
+        checker (OCRChecker): checker to validate with
+        entry (dict): manifest entry from read_manifest
+
+    Returns:
+        dict: id, success, validations, seconds, and error if it could not be validated
+    """
+    start = time.perf_counter()
+    try:
+        images = []
+        for path in entry['images']:
+            with open(path, 'rb') as f:
+                images.append(f.read())
+        validations, _ = checker.validate(
+            images=images,
+            brand_name=entry['brand_name'],
+            product_class=entry['product_class'],
+            alcohol_content=entry['alcohol_content'],
+            net_contents=entry['net_contents'],
+            net_contents_unit=entry['net_contents_unit'],
+            annotate=False
+        )
+        return {
+            'id': entry['id'],
+            'success': all(validations.values()),
+            'validations': validations,
+            'seconds': round(time.perf_counter() - start, 3)
+        }
+    except Exception as e:
+        return {
+            'id': entry['id'],
+            'success': False,
+            'error': str(e),
+            'seconds': round(time.perf_counter() - start, 3)
+        }
+
+
+def run_audit(manifest_path: str, output, workers: int = 1, model: str = 'easyocr', fixture_path: Optional[str] = None, threads_per_worker: Optional[int] = None, report_every: int = 100) -> Dict[str, Any]:
+    """Validates every label in a manifest and writes one JSON line per label.
+
+    Args:
+        manifest_path (str): .csv or .jsonl manifest
+        output (file): text file the JSONL results are written to
+        workers (int): worker processes, each loads its own model
+        model (str): OCR backend name
+        fixture_path (str): replay fixtures for the replay backend
+        threads_per_worker (int): torch threads per worker, defaults to cores / workers
+        report_every (int): log throughput every this many labels
+
+    Returns:
+        dict: labels, passed, failed, errors, seconds, labels_per_minute
+    """
+    threads = threads_per_worker or max((os.cpu_count() or 1) // workers, 1)
+    summary = {'labels': 0, 'passed': 0, 'failed': 0, 'errors': 0}
+    start = time.perf_counter()
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(model, fixture_path, threads)) as pool:
+        for result in pool.imap_unordered(audit_entry, read_manifest(manifest_path)):
+            output.write(json.dumps(result) + '\n')
+            _count(summary, result)
+            if summary['labels'] % report_every == 0:
+                output.flush()
+                elapsed = time.perf_counter() - start
+                logger.info(f"{summary['labels']} labels, {summary['labels'] / elapsed * 60:.1f} labels/min")
+    elapsed = time.perf_counter() - start
+    summary['seconds'] = round(elapsed, 3)
+    summary['labels_per_minute'] = round(summary['labels'] / elapsed * 60, 1) if elapsed > 0 else 0.0
+    return summary
+
+
+def _count(summary: Dict[str, Any], result: Dict[str, Any]):
+    summary['labels'] += 1
+    if 'error' in result:
+        summary['errors'] += 1
+    elif result['success']:
+        summary['passed'] += 1
+    else:
+        summary['failed'] += 1
+
+
+def run_audit_queued(manifest_path: str, output, queue: JobQueue, poll_interval: float = 1.0, report_every: int = 100,
+                     timeout: Optional[float] = 600.0) -> Dict[str, Any]:
+    """Puts every label of a manifest on a job queue and collects the results workers push back.
+
+    Results are polled by the ids of the jobs put on the queue, so workers whose clocks disagree
+    with this machine's are still heard from.
+
+    Args:
+        manifest_path (str): .csv or .jsonl manifest
+        output (file): text file the JSONL results are written to
+        queue (JobQueue): queue the workers take jobs from
+        poll_interval (float): seconds between checks for new results
+        timeout (float): seconds to wait without a new result before giving up on the rest, None to wait forever
+
+    Returns:
+        dict: labels, passed, failed, errors, seconds, labels_per_minute and the ids of the jobs still
+        outstanding when it gave up (empty if every result came back)
+    """
+    summary = {'labels': 0, 'passed': 0, 'failed': 0, 'errors': 0}
+    start = time.perf_counter()
+    waiting = []
+    for entry in read_manifest(manifest_path):
+        waiting.append(queue.put(entry))
+    last_result = time.monotonic()
+    while waiting:
+        found = queue.results_of(waiting)
+        if found:
+            last_result = time.monotonic()
+        for job_id in waiting:
+            if job_id not in found:
+                continue
+            output.write(json.dumps(found[job_id]) + '\n')
+            _count(summary, found[job_id])
+            if summary['labels'] % report_every == 0:
+                output.flush()
+                elapsed = time.perf_counter() - start
+                logger.info(f"{summary['labels']} labels, {summary['labels'] / elapsed * 60:.1f} labels/min")
+        waiting = [job_id for job_id in waiting if job_id not in found]
+        if not waiting:
+            break
+        if timeout is not None and time.monotonic() - last_result > timeout:
+            logger.error(f"No result for {timeout:g}s, giving up on {len(waiting)} outstanding jobs: {', '.join(waiting[:20])}"
+                         + (' ...' if len(waiting) > 20 else ''))
+            break
+        time.sleep(poll_interval)
+    elapsed = time.perf_counter() - start
+    summary['outstanding'] = waiting
+    summary['seconds'] = round(elapsed, 3)
+    summary['labels_per_minute'] = round(summary['labels'] / elapsed * 60, 1) if elapsed > 0 else 0.0
+    return summary
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Re-validate a manifest of label submissions")
+    parser.add_argument("manifest", help="CSV or JSONL manifest of image paths and form fields")
+    parser.add_argument("--output", default="-", help="JSONL file for the results. Default: stdout")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes, each loads one model. Default: cores")
+    parser.add_argument("--threads-per-worker", type=int, default=None, help="Torch threads per worker. Default: cores / workers")
+    parser.add_argument("--model", default=os.environ.get('OCR_MODEL', 'easyocr'), help="OCR backend: easyocr, tesseract or replay")
+    parser.add_argument("--fixtures", default=os.environ.get('OCR_REPLAY_FIXTURES'), help="Replay fixture file for --model replay")
+    parser.add_argument("--queue", default=None, help="Queue URL (sqlite:///file.db) to hand the labels to worker.py processes instead of a local pool")
+    parser.add_argument("--timeout", type=float, default=600.0, help="With --queue, seconds without a new result before the labels still outstanding are given up on. Default: 600")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        if args.queue:
+            summary = run_audit_queued(args.manifest, output, open_queue(args.queue), timeout=args.timeout)
+        else:
+            summary = run_audit(args.manifest, output, workers=args.workers, model=args.model,
+                                fixture_path=args.fixtures, threads_per_worker=args.threads_per_worker)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    logger.info(f"Audit done: {json.dumps(summary)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""Per-stage benchmark of the validation pipeline with regression thresholds.
+
+Every label of a manifest (see audit.py, examples/manifest.csv by default) is
+run through the stages of a validation one at a time, each image on its own,
+with a checker set up from the same OCR_* settings as the server's (the cache
+left out, so every run reads):
+
+    decode       bytes to pixels
+    validate     the image validated as a submission is: preprocessing, staged
+                 detect/recognize batches until every field is found, rotated
+                 re-scans and the checks, annotation left out
+    ocr          a full read through the preprocessor, reduced to box records
+                 that the stages below run on
+    index        ocrdata and the box index built from the records
+    score        every box against the fuzzy targets
+    layout       boxes grouped into lines and blocks for split phrases
+    quantities   volumes and percentages parsed off the lines
+    check_*      each field check
+    annotate     found boxes drawn and the image encoded as jpg
+
+Wall time, CPU time and the change in RSS across each stage are recorded into
+a JSON report. Each label is run --repeat times and the fastest run of each
+stage is kept, the least noisy number for spotting regressions. Against a
+--baseline report, a stage fails if it got slower than --tolerance (and by
+more than --min-seconds), or the memory it holds on to grew past
+--rss-tolerance (and by more than --min-rss-mb).
+
+--model replay benchmarks everything but the OCR without loading a model; the
+labels need fixtures for that, --record writes them with a real model once.
+
+Usage (from atfback):
+    python src/bench.py --model replay --fixtures bench_fixtures.json --output report.json
+    python src/bench.py --model easyocr --record bench_fixtures.json       # once, needs the model
+    python src/bench.py --model replay --fixtures bench_fixtures.json --baseline baseline.json
+    python src/bench.py --model replay --fixtures bench_fixtures.json --save-baseline baseline.json
+"""
+from typing import Any, Dict, List, Optional
+from contextlib import contextmanager
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+try:
+    from .audit import read_manifest
+    from .ocr_backends import box_records, index_boxes, record_fixtures
+    from .ocr_checker import OCRChecker, settings_from_env
+    from .ocr_image import DecodedImage
+    from .ocr_layout import Layout
+    from .ocr_models import current_rss
+    from .quantity_index import QuantityIndex
+except ImportError:
+    from audit import read_manifest
+    from ocr_backends import box_records, index_boxes, record_fixtures
+    from ocr_checker import OCRChecker, settings_from_env
+    from ocr_image import DecodedImage
+    from ocr_layout import Layout
+    from ocr_models import current_rss
+    from quantity_index import QuantityIndex
+
+DEFAULT_MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'examples', 'manifest.csv')
+STAGES = ['decode', 'validate', 'ocr', 'index', 'score', 'layout', 'quantities', 'check_brand_name', 'check_product_class', 'check_alcohol_content',
+          'check_net_contents', 'check_government_warning', 'annotate']
+
+
+def bench_checker(model: Optional[str] = None, fixtures: Optional[str] = None) -> OCRChecker:
+    """A checker set up like the server's from the OCR_* settings, without a cache so every run reads.
+
+    Args:
+        model (str): OCR backend, OCR_MODEL if None
+        fixtures (str): replay fixture file, OCR_REPLAY_FIXTURES if None
+    """
+    settings = settings_from_env()
+    if model is not None:
+        settings['modelSelect'] = model
+    if fixtures is not None:
+        settings['fixture_path'] = fixtures
+    return OCRChecker(**settings)
+
+
+class StageTimer:
+    """Collects wall time, CPU time and RSS change of the stages of one run.
+
+    The RSS change is what a stage left resident (current RSS after it minus before), so unlike the
+    process' peak it is the stage's own and not the largest stage run so far.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        rss_before = current_rss()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            rss = current_rss()
+            self.stages[name] = {
+                'wall': time.perf_counter() - wall,
+                'cpu': time.process_time() - cpu,
+                'rss': rss,
+                'rss_delta': rss - rss_before
+            }
+
+
+def run_label(checker: OCRChecker, entry: Dict[str, Any], imagedata: bytes) -> Dict[str, Dict[str, float]]:
+    """Runs one image of a label through every stage once.
+
+    Args:
+        checker (OCRChecker): checker whose backend and checks are timed
+        entry (dict): manifest entry with the form fields
+        imagedata (bytes): the image as uploaded
+
+    Returns:
+        dict: stage name to its wall, cpu, rss and rss_delta
+    """
+    timer = StageTimer()
+    with timer.stage('decode'):
+        image = DecodedImage.from_bytes(imagedata)
+    with timer.stage('validate'):
+        checker.validate([image], entry['brand_name'], entry['product_class'], entry['alcohol_content'],
+                         entry['net_contents'], entry['net_contents_unit'], annotate=False)
+    with timer.stage('ocr'):
+        records = box_records(checker.backend.read_records(image))
+    with timer.stage('index'):
+        ocrdata, _ = index_boxes(records)
+    with timer.stage('score'):
+        ocrdata.score(checker.fuzzy_targets(entry['brand_name'], entry['product_class']))
+    with timer.stage('layout'):
+        Layout.of(ocrdata)
+    with timer.stage('quantities'):
+        QuantityIndex.of(ocrdata)
+    found = {}
+    with timer.stage('check_brand_name'):
+        found['brand_name'] = checker.check_brand_name(ocrdata, image.width, image.height, entry['brand_name'])
+    with timer.stage('check_product_class'):
+        found['product_class'] = checker.check_product_class(ocrdata, image.width, image.height, entry['product_class'])
+    with timer.stage('check_alcohol_content'):
+        found['alcohol_content'] = checker.check_alcohol_content(ocrdata, image.width, image.height, entry['alcohol_content'])
+    with timer.stage('check_net_contents'):
+        found['net_contents'] = checker.check_net_contents(ocrdata, image.width, image.height, entry['net_contents'], entry['net_contents_unit'])
+    with timer.stage('check_government_warning'):
+        found['gov_warn'] = checker.check_government_warning(ocrdata, image.width, image.height)
+    with timer.stage('annotate'):
+        for result in found.values():
+            # checks may return just False (or None) when nothing was found
+            if isinstance(result, tuple) and result[0]:
+                image.draw_boxes(result[1])
+        image.encode('.jpg')
+    return timer.stages
+
+
+def _fastest(runs: List[Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, float]]:
+    return {
+        name: {
+            'wall': min(run[name]['wall'] for run in runs),
+            'cpu': min(run[name]['cpu'] for run in runs),
+            'rss': max(run[name]['rss'] for run in runs),
+            'rss_delta': max(run[name]['rss_delta'] for run in runs)
+        }
+        for name in runs[0]
+    }
+
+
+def summarize(images: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Per stage totals over all images: summed wall and cpu, highest RSS and RSS change."""
+    summary = {}
+    for name in STAGES:
+        rows = [image['stages'][name] for image in images if name in image['stages']]
+        if not rows:
+            continue
+        summary[name] = {
+            'wall': round(sum(row['wall'] for row in rows), 6),
+            'cpu': round(sum(row['cpu'] for row in rows), 6),
+            'rss': max(row['rss'] for row in rows),
+            'rss_delta': max(row['rss_delta'] for row in rows)
+        }
+    return summary
+
+
+def run_benchmark(checker: OCRChecker, entries: List[Dict[str, Any]], repeat: int = 3) -> Dict[str, Any]:
+    """Benchmarks every image of every manifest entry.
+
+    Args:
+        checker (OCRChecker): checker to benchmark
+        entries (list): manifest entries from read_manifest
+        repeat (int): runs per image, the fastest of each stage is kept
+
+    Returns:
+        dict: report with meta, per image stages and per stage totals
+    """
+    images = []
+    for entry in entries:
+        for path in entry['images']:
+            with open(path, 'rb') as f:
+                imagedata = f.read()
+            runs = [run_label(checker, entry, imagedata) for _ in range(max(repeat, 1))]
+            stages = _fastest(runs)
+            images.append({
+                'id': entry['id'],
+                'image': os.path.basename(path),
+                'stages': {name: {key: round(value, 6) if key in ('wall', 'cpu') else value for key, value in row.items()}
+                           for name, row in stages.items()}
+            })
+    return {
+        'meta': {
+            'model': checker.modelname,
+            'backend': checker.backend.cache_key(),
+            'repeat': repeat,
+            'images': len(images),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'created': time.time()
+        },
+        'images': images,
+        'stages': summarize(images)
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.25, min_seconds: float = 0.005,
+            rss_tolerance: float = 0.1, min_rss: int = 2**20) -> List[str]:
+    """Stages of a report that regressed past a baseline report.
+
+    Args:
+        report (dict): report from run_benchmark
+        baseline (dict): earlier report to hold it to
+        tolerance (float): allowed slowdown of a stage's wall time, as a fraction
+        min_seconds (float): slowdowns smaller than this are noise, never regressions
+        rss_tolerance (float): allowed growth of a stage's RSS change, as a fraction
+        min_rss (int): growth smaller than this many bytes is noise, never a regression
+
+    Returns:
+        List[str]: one message per regression, empty if none
+    """
+    regressions = []
+    for name, base in baseline.get('stages', {}).items():
+        now = report['stages'].get(name)
+        if now is None:
+            continue
+        if now['wall'] > base['wall'] * (1 + tolerance) and now['wall'] - base['wall'] > min_seconds:
+            regressions.append(f"{name}: {now['wall']:.4f}s wall, baseline {base['wall']:.4f}s (+{tolerance:.0%} allowed)")
+        if 'rss_delta' in base and now['rss_delta'] - base['rss_delta'] > max(abs(base['rss_delta']) * rss_tolerance, min_rss):
+            regressions.append(f"{name}: {now['rss_delta'] / 2**20:+.1f} MB RSS, baseline {base['rss_delta'] / 2**20:+.1f} MB (+{rss_tolerance:.0%} allowed)")
+    return regressions
+
+
+def print_summary(report: Dict[str, Any], file=sys.stderr):
+    print(f"{'stage':<26} {'wall ms':>9} {'cpu ms':>9} {'RSS +MB':>8}", file=file)
+    for name, row in report['stages'].items():
+        print(f"{name:<26} {row['wall'] * 1000:>9.2f} {row['cpu'] * 1000:>9.2f} {row['rss_delta'] / 2**20:>+8.1f}", file=file)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Per-stage benchmark of the validation pipeline")
+    parser.add_argument("manifest", nargs='?', default=DEFAULT_MANIFEST, help="CSV or JSONL manifest. Default: examples/manifest.csv")
+    parser.add_argument("--model", default=None, help="OCR backend: easyocr, tesseract or replay. Default: OCR_MODEL or easyocr")
+    parser.add_argument("--fixtures", default=None, help="Replay fixture file for --model replay. Default: OCR_REPLAY_FIXTURES")
+    parser.add_argument("--record", default=None, help="Write replay fixtures for every image with --model to this file and exit")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per image, the fastest is kept. Default: 3")
+    parser.add_argument("--output", default=None, help="Write the JSON report here. Default: stdout")
+    parser.add_argument("--baseline", default=None, help="Fail if a stage regressed past this earlier report")
+    parser.add_argument("--save-baseline", default=None, help="Also write the report here as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed wall time slowdown per stage. Default: 0.25")
+    parser.add_argument("--min-seconds", type=float, default=0.005, help="Slowdowns below this are noise. Default: 0.005")
+    parser.add_argument("--rss-tolerance", type=float, default=0.1, help="Allowed growth of the RSS change per stage. Default: 0.1")
+    parser.add_argument("--min-rss-mb", type=float, default=1.0, help="RSS growth below this is noise. Default: 1")
+    args = parser.parse_args(argv)
+
+    entries = list(read_manifest(args.manifest))
+    checker = bench_checker(args.model, args.fixtures)
+
+    if args.record:
+        paths = [path for entry in entries for path in entry['images']]
+        images = []
+        for path in paths:
+            with open(path, 'rb') as f:
+                images.append(f.read())
+        record_fixtures(checker.backend, images, args.record)
+        print(f"Recorded {len(images)} image(s) to {args.record}", file=sys.stderr)
+        return 0
+
+    # the first inference of a model (and everything built on first use) pays for warming up, keep that out of the numbers
+    if entries and entries[0]['images']:
+        entry = entries[0]
+        with open(entry['images'][0], 'rb') as f:
+            checker.validate([f.read()], entry['brand_name'], entry['product_class'], entry['alcohol_content'],
+                             entry['net_contents'], entry['net_contents_unit'], annotate=False)
+
+    report = run_benchmark(checker, entries, repeat=args.repeat)
+    text = json.dumps(report, indent=1)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            f.write(text)
+    print_summary(report)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('backend') != report['meta']['backend']:
+            print(f"Baseline was taken with {baseline.get('meta', {}).get('backend')}, this run uses {report['meta']['backend']}", file=sys.stderr)
+        regressions = compare(report, baseline, args.tolerance, args.min_seconds, args.rss_tolerance, int(args.min_rss_mb * 2**20))
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
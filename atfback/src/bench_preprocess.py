@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Benchmark of OCR latency against match accuracy for the downscaling/tiling stage.
+
+Every image is first read at full resolution, which is taken as the reference.
+It is then read again through a Preprocessor at each target text height, and
+for every run the OCR time, working scale, tile count and recall (share of the
+reference's text found again, fuzzy matched) are reported.
+
+Usage (from atfback):
+    python src/bench_preprocess.py ../examples --model easyocr --heights 32 24 20 16
+    python src/bench_preprocess.py ../examples/CriocFront.jpg --max-side 1024     # force tiling
+"""
+from typing import Any, Dict, List, Optional
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+from thefuzz import fuzz
+
+try:
+    from .ocr_backends import create_backend, OCRBackend
+    from .ocr_image import DecodedImage
+    from .ocr_preprocess import Preprocessor
+    from .ocr_result import clean_text
+except ImportError:
+    from ocr_backends import create_backend, OCRBackend
+    from ocr_image import DecodedImage
+    from ocr_preprocess import Preprocessor
+    from ocr_result import clean_text
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def list_images(paths: List[str]) -> List[str]:
+    """Expands directories into the images in them, skipping earlier *_output.jpg annotations."""
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = sorted(glob.glob(os.path.join(path, '*')))
+        else:
+            found = [path]
+        images.extend(p for p in found if p.lower().endswith(IMAGE_EXTENSIONS) and '_output' not in p)
+    return images
+
+
+def texts(ocrdata: Dict[int, Dict[str, Any]]) -> List[str]:
+    """Cleaned text of every box worth matching (3 characters or more)."""
+    return [t for t in (clean_text(entry['text']) for entry in ocrdata.values()) if len(t) >= 3]
+
+
+def recall(reference: List[str], found: List[str], threshold: int = 85) -> float:
+    """Share of the reference texts that appear, fuzzy matched, in the found texts."""
+    if not reference:
+        return 1.0
+    joined = ' '.join(found)
+    hits = sum(1 for t in reference if fuzz.partial_ratio(t, joined) >= threshold)
+    return hits / len(reference)
+
+
+def bench_image(backend: OCRBackend, image: DecodedImage, preprocessors: List[Optional[Preprocessor]]) -> List[Dict[str, Any]]:
+    """Reads an image with each preprocessor, the first run (None) being the full resolution reference."""
+    rows = []
+    reference = None
+    for preprocessor in preprocessors:
+        backend.preprocessor = preprocessor
+        start = time.perf_counter()
+        ocrdata, _ = backend.read(image)
+        seconds = time.perf_counter() - start
+        found = texts(ocrdata)
+        if reference is None:
+            reference = found
+        tiles = preprocessor.tiles(image) if preprocessor else []
+        rows.append({
+            'target_text_height': preprocessor.target_text_height if preprocessor else None,
+            'scale': round(tiles[0].scale, 3) if tiles else 1.0,
+            'tiles': len(tiles) or 1,
+            'boxes': len(ocrdata),
+            'seconds': round(seconds, 3),
+            'recall': round(recall(reference, found), 3)
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="OCR latency vs. accuracy with adaptive downscaling and tiling")
+    parser.add_argument("images", nargs='+', help="Images or directories of images")
+    parser.add_argument("--model", default=os.environ.get('OCR_MODEL', 'easyocr'), help="OCR backend: easyocr or tesseract")
+    parser.add_argument("--heights", type=int, nargs='+', default=[32, 24, 20, 16], help="Target text heights to try")
+    parser.add_argument("--max-side", type=int, default=2560, help="Longest side before tiling")
+    parser.add_argument("--min-pixels", type=int, default=0, help="Images this small are not preprocessed. Default: preprocess everything")
+    parser.add_argument("--json", action='store_true', help="Print JSON lines instead of a table")
+    args = parser.parse_args(argv)
+
+    backend = create_backend(args.model)
+    preprocessors = [None] + [Preprocessor(target_text_height=h, max_side=args.max_side, min_pixels=args.min_pixels) for h in args.heights]
+    if not args.json:
+        print(f"{'image':<28} {'height':>6} {'scale':>6} {'tiles':>5} {'boxes':>5} {'seconds':>8} {'recall':>6}")
+    for n, path in enumerate(list_images(args.images)):
+        with open(path, 'rb') as f:
+            image = DecodedImage.from_bytes(f.read())
+        if n == 0:
+            # warm the model up so the first reference run isn't charged for it
+            backend.readtext(image)
+        for row in bench_image(backend, image, preprocessors):
+            if args.json:
+                print(json.dumps({'image': os.path.basename(path), **row}))
+            else:
+                height = row['target_text_height'] or 'full'
+                print(f"{os.path.basename(path)[:28]:<28} {height:>6} {row['scale']:>6} {row['tiles']:>5} {row['boxes']:>5} {row['seconds']:>8} {row['recall']:>6}")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
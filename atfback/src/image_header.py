@@ -0,0 +1,265 @@
+"""Header-only inspection of uploads, ahead of any decode.
+
+An upload's size in bytes says little about what decoding it costs: a small,
+highly compressed PNG can expand to gigabytes of pixels. read_header sniffs
+the format from the magic bytes and reads just enough of the header for the
+dimensions and frame count, without decompressing anything, so admit can turn
+away what is not an image, not a supported format or over the pixel budget
+before cv2.imdecode (or a worker's memory) ever sees it.
+"""
+from typing import Iterable, Optional, Sequence
+import struct
+import logging
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# formats cv2 decodes that labels come in
+SUPPORTED_FORMATS = ('jpeg', 'png', 'webp', 'bmp', 'tiff')
+# past this many IFDs/chunks a file is not walked any further
+_MAX_WALK = 4096
+
+
+class UploadRejected(ValueError):
+    """Raised when an upload is not admitted.
+
+    Attributes:
+        reason (str): bad_image, unsupported_format, too_many_pixels or too_many_frames
+        status (int): HTTP status to answer with
+    """
+
+    def __init__(self, message: str, reason: str, status: int):
+        super().__init__(message)
+        self.reason = reason
+        self.status = status
+
+
+class ImageHeader:
+    """What the header of an image says about it.
+
+    Attributes:
+        format (str): one of SUPPORTED_FORMATS, or gif
+        width (int): width in pixels
+        height (int): height in pixels
+        frames (int): frames or pages, 1 for still images
+    """
+
+    def __init__(self, format: str, width: int, height: int, frames: int = 1):
+        self.format = format
+        self.width = width
+        self.height = height
+        self.frames = frames
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+    def __repr__(self):
+        return f'ImageHeader({self.format}, {self.width}x{self.height}, frames={self.frames})'
+
+
+def _png(data: bytes) -> ImageHeader:
+    # IHDR is always the first chunk
+    if data[12:16] != b'IHDR':
+        raise ValueError('PNG without IHDR')
+    width, height = struct.unpack('>II', data[16:24])
+    frames = 1
+    # an animated PNG says so in acTL, which comes before the first IDAT
+    offset = 8
+    for _ in range(_MAX_WALK):
+        if offset + 8 > len(data):
+            break
+        length, kind = struct.unpack('>I4s', data[offset:offset + 8])
+        if kind == b'acTL':
+            frames = struct.unpack('>I', data[offset + 8:offset + 12])[0]
+            break
+        if kind in (b'IDAT', b'IEND'):
+            break
+        offset += 12 + length
+    return ImageHeader('png', width, height, frames)
+
+
+# start of frame markers, every other 0xC0-0xCF one (DHT, JPG, DAC) carries no size
+_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _jpeg(data: bytes) -> ImageHeader:
+    offset = 2
+    for _ in range(_MAX_WALK):
+        # markers may be padded with any number of 0xFF
+        while offset < len(data) and data[offset] == 0xFF:
+            offset += 1
+        if offset >= len(data):
+            break
+        marker = data[offset]
+        offset += 1
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            continue
+        if marker in (0xD9, 0xDA):
+            # end of image or start of scan before any frame header
+            break
+        length = struct.unpack('>H', data[offset:offset + 2])[0]
+        if marker in _SOF:
+            height, width = struct.unpack('>HH', data[offset + 3:offset + 7])
+            return ImageHeader('jpeg', width, height)
+        offset += length
+    raise ValueError('JPEG without a frame header')
+
+
+def _webp(data: bytes) -> ImageHeader:
+    kind = data[12:16]
+    if kind == b'VP8 ':
+        # lossy: key frame start code, then 14 bit width and height
+        if data[23:26] != b'\x9d\x01\x2a':
+            raise ValueError('WebP VP8 without a key frame')
+        width, height = struct.unpack('<HH', data[26:30])
+        return ImageHeader('webp', width & 0x3FFF, height & 0x3FFF)
+    if kind == b'VP8L':
+        if data[20] != 0x2F:
+            raise ValueError('WebP VP8L without signature')
+        bits = struct.unpack('<I', data[21:25])[0]
+        return ImageHeader('webp', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1)
+    if kind == b'VP8X':
+        width = int.from_bytes(data[24:27], 'little') + 1
+        height = int.from_bytes(data[27:30], 'little') + 1
+        frames = 1
+        if data[20] & 0x02:
+            # animated: count the frame chunks
+            frames = 0
+            offset = 12
+            for _ in range(_MAX_WALK):
+                if offset + 8 > len(data):
+                    break
+                chunk, length = struct.unpack('<4sI', data[offset:offset + 8])
+                if chunk == b'ANMF':
+                    frames += 1
+                offset += 8 + length + (length & 1)
+        return ImageHeader('webp', width, height, max(frames, 1))
+    raise ValueError('Unknown WebP chunk')
+
+
+def _bmp(data: bytes) -> ImageHeader:
+    header_size = struct.unpack('<I', data[14:18])[0]
+    if header_size == 12:
+        width, height = struct.unpack('<HH', data[18:22])
+    else:
+        width, height = struct.unpack('<ii', data[18:26])
+    # negative height means top-down rows
+    return ImageHeader('bmp', abs(width), abs(height))
+
+
+def _tiff(data: bytes) -> ImageHeader:
+    endian = '<' if data[:2] == b'II' else '>'
+    offset = struct.unpack(endian + 'I', data[4:8])[0]
+    width = height = None
+    frames = 0
+    for _ in range(_MAX_WALK):
+        if offset == 0 or offset + 2 > len(data):
+            break
+        frames += 1
+        count = struct.unpack(endian + 'H', data[offset:offset + 2])[0]
+        for n in range(count):
+            entry = offset + 2 + 12 * n
+            tag, kind = struct.unpack(endian + 'HH', data[entry:entry + 4])
+            if frames == 1 and tag in (256, 257):
+                # SHORT or LONG, stored in the value field itself
+                value = struct.unpack(endian + ('H' if kind == 3 else 'I'), data[entry + 8:entry + (10 if kind == 3 else 12)])[0]
+                if tag == 256:
+                    width = value
+                else:
+                    height = value
+        next_at = offset + 2 + 12 * count
+        offset = struct.unpack(endian + 'I', data[next_at:next_at + 4])[0]
+    if width is None or height is None:
+        raise ValueError('TIFF without dimensions')
+    return ImageHeader('tiff', width, height, max(frames, 1))
+
+
+def _gif(data: bytes) -> ImageHeader:
+    width, height = struct.unpack('<HH', data[6:10])
+    return ImageHeader('gif', width, height)
+
+
+def read_header(data: bytes) -> Optional[ImageHeader]:
+    """Reads format, dimensions and frame count from the start of an image file.
+
+    Args:
+        data (bytes): the upload, only its header is looked at
+
+    Returns:
+        ImageHeader: what the header says, None if the magic bytes are not of a known image format
+
+    Raises:
+        ValueError: If the magic bytes are known but the header is truncated or malformed
+    """
+    try:
+        if data.startswith(b'\x89PNG\r\n\x1a\n'):
+            return _png(data)
+        if data.startswith(b'\xff\xd8'):
+            return _jpeg(data)
+        if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+            return _webp(data)
+        if data.startswith(b'BM'):
+            return _bmp(data)
+        if data[:4] in (b'II*\x00', b'MM\x00*'):
+            return _tiff(data)
+        if data[:6] in (b'GIF87a', b'GIF89a'):
+            return _gif(data)
+    except (struct.error, IndexError) as e:
+        raise ValueError(f'Truncated image header: {e}')
+    return None
+
+
+def admit(data: bytes, max_pixels: int, max_frames: int = 1, formats: Sequence[str] = SUPPORTED_FORMATS, name: str = 'upload') -> ImageHeader:
+    """Checks an upload against the pixel budget from its header alone.
+
+    Args:
+        data (bytes): the upload
+        max_pixels (int): largest width * height let through, 0 for no limit
+        max_frames (int): most frames/pages let through, 0 for no limit
+        formats (Sequence[str]): formats let through
+        name (str): what to call the upload in messages (its filename)
+
+    Raises:
+        UploadRejected: If the upload is not admitted
+
+    Returns:
+        ImageHeader: the upload's header
+    """
+    try:
+        header = read_header(data)
+    except ValueError as e:
+        raise UploadRejected(f'Image "{name}" is not a valid image: {e}', 'bad_image', 400)
+    if header is None:
+        raise UploadRejected(f'Image "{name}" is not an image', 'bad_image', 415)
+    if header.format not in formats:
+        raise UploadRejected(f'Image "{name}" is {header.format}, supported formats are {", ".join(formats)}', 'unsupported_format', 415)
+    if header.width <= 0 or header.height <= 0:
+        raise UploadRejected(f'Image "{name}" has no pixels', 'bad_image', 400)
+    if max_pixels and header.pixels > max_pixels:
+        raise UploadRejected(f'Image "{name}" is {header.width}x{header.height}, over the {max_pixels / 1e6:g} megapixel limit', 'too_many_pixels', 413)
+    if max_frames and header.frames > max_frames:
+        raise UploadRejected(f'Image "{name}" has {header.frames} frames, at most {max_frames} allowed', 'too_many_frames', 413)
+    return header
+
+
+def admit_all(uploads: Iterable[tuple], max_pixels: int, max_total_pixels: int = 0, max_frames: int = 1) -> list:
+    """admit for every (name, data) upload of a submission, plus a budget for all of them together.
+
+    Args:
+        uploads (Iterable[tuple]): (name, data) pairs
+        max_pixels (int): per image limit, see admit
+        max_total_pixels (int): limit on the pixels of all images together, 0 for none
+        max_frames (int): per image frame limit
+
+    Raises:
+        UploadRejected: If any upload, or all of them together, is not admitted
+
+    Returns:
+        list: the ImageHeader of every upload
+    """
+    headers = [admit(data, max_pixels, max_frames, name=name) for name, data in uploads]
+    total = sum(header.pixels for header in headers)
+    if max_total_pixels and total > max_total_pixels:
+        raise UploadRejected(f'Images add up to {total / 1e6:.1f} megapixels, over the {max_total_pixels / 1e6:g} megapixel limit', 'too_many_pixels', 413)
+    return headers
@@ -0,0 +1,202 @@
+"""Pluggable queue between audit producers and headless OCR workers.
+
+A producer puts validation jobs (manifest entries) on the queue, any number
+of workers take them, validate, and put the results back. JobQueue is the
+interface a broker backed queue (Kafka etc.) would implement; SQLiteJobQueue
+needs no broker, so the whole setup runs on one machine or on workers that
+share a filesystem.
+"""
+from typing import Any, Dict, Iterable, Iterator, Optional
+from contextlib import contextmanager
+import json
+import sqlite3
+import time
+import uuid
+import logging
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """Interface for validation job queues.
+
+    Jobs and results are JSON serializable dicts. A taken job is leased to a
+    worker; if no result arrives before the lease runs out it is handed to
+    another worker.
+    """
+
+    def put(self, job: Dict[str, Any]) -> str:
+        """Queues a job.
+
+        Args:
+            job (dict): job payload, an 'id' is added if missing
+
+        Returns:
+            str: the job id
+        """
+        raise NotImplementedError
+
+    def take(self, worker: str) -> Optional[Dict[str, Any]]:
+        """Claims the oldest available job for a worker.
+
+        Args:
+            worker (str): worker name, for bookkeeping
+
+        Returns:
+            dict: the job payload, None if nothing is available
+        """
+        raise NotImplementedError
+
+    def complete(self, job_id: str, result: Dict[str, Any]):
+        """Stores the result of a taken job."""
+        raise NotImplementedError
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Returns a job's result, None if it is not done."""
+        raise NotImplementedError
+
+    def results(self, since: float = 0.0) -> Iterator[Dict[str, Any]]:
+        """Results completed after a time, oldest first."""
+        raise NotImplementedError
+
+    def results_of(self, job_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Results of the given jobs that are done, by job id.
+
+        Looked up by id, not by completion time, so clocks of workers and producer never have to agree.
+        Queues that can fetch many results at once should override this.
+        """
+        found = {}
+        for job_id in job_ids:
+            result = self.result(job_id)
+            if result is not None:
+                found[job_id] = result
+        return found
+
+    def pending(self) -> int:
+        """Number of jobs without a result."""
+        raise NotImplementedError
+
+
+class SQLiteJobQueue(JobQueue):
+    """JobQueue in a SQLite file, safe to share between processes on one filesystem."""
+
+    def __init__(self, path: str, lease_seconds: float = 300.0):
+        """
+        Args:
+            path (str): database file, created if missing
+            lease_seconds (float): how long a worker may hold a job before it is handed out again
+        """
+        self.path = path
+        self.lease_seconds = lease_seconds
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                worker TEXT,
+                created REAL NOT NULL,
+                claimed REAL,
+                finished REAL,
+                result TEXT
+            )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # a connection per call keeps this usable from any thread or process
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def put(self, job: Dict[str, Any]) -> str:
+        job = dict(job)
+        job.setdefault('id', uuid.uuid4().hex)
+        job_id = str(job['id'])
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, payload, status, created) VALUES (?, ?, 'queued', ?)",
+                (job_id, json.dumps(job), time.time())
+            )
+        return job_id
+
+    def take(self, worker: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._connect() as conn:
+            # IMMEDIATE takes the write lock up front so two workers never claim the same row
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id, payload FROM jobs WHERE status = 'queued' OR (status = 'running' AND claimed < ?) ORDER BY created LIMIT 1",
+                    (now - self.lease_seconds,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE jobs SET status = 'running', worker = ?, claimed = ? WHERE id = ?", (worker, now, row[0]))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return json.loads(row[1]) if row else None
+
+    def complete(self, job_id: str, result: Dict[str, Any]):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', finished = ?, result = ? WHERE id = ?",
+                (time.time(), json.dumps(result), str(job_id))
+            )
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT result FROM jobs WHERE id = ? AND status = 'done'", (str(job_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def results(self, since: float = 0.0) -> Iterator[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT result, finished FROM jobs WHERE status = 'done' AND finished > ? ORDER BY finished",
+                (since,)
+            ).fetchall()
+        for result, finished in rows:
+            out = json.loads(result)
+            out['finished'] = finished
+            yield out
+
+    def results_of(self, job_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        job_ids = [str(job_id) for job_id in job_ids]
+        found = {}
+        with self._connect() as conn:
+            # within SQLite's limit on bound parameters
+            for n in range(0, len(job_ids), 500):
+                chunk = job_ids[n:n + 500]
+                rows = conn.execute(
+                    f"SELECT id, result FROM jobs WHERE status = 'done' AND id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((job_id, json.loads(result)) for job_id, result in rows)
+        return found
+
+    def pending(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status != 'done'").fetchone()[0]
+
+
+def open_queue(url: str) -> JobQueue:
+    """Opens a queue from a URL.
+
+    Args:
+        url (str): sqlite:///path/to/file.db (or just a file path)
+
+    Raises:
+        ValueError: If the queue type is not supported
+
+    Returns:
+        JobQueue: the queue
+    """
+    if url.startswith('sqlite:///'):
+        return SQLiteJobQueue(url[len('sqlite:///'):])
+    if '://' not in url:
+        return SQLiteJobQueue(url)
+    raise ValueError(f"Unsupported job queue: {url}")
@@ -0,0 +1,466 @@
+"""In-process job executor for label validations.
+
+A bounded pool of worker threads shares the process' loaded OCR model. Jobs
+wait in a bounded queue, and submitters block for a while when it is full
+before being turned away, instead of being rejected as soon as one job runs.
+Every job carries its own result so concurrent requests never share state.
+Finished jobs are kept for a while so clients can poll for them; with a
+JobStore their status, progress and results are also written to a SQLite file
+every server process shares, so a poll answered by another gunicorn worker
+than the one running the job still finds it. Results and attachments are
+stored as JSON, and attachments that are lists of bytes (the uploads of a
+boxes submission) as files of their own next to the database, read back one
+at a time when asked for.
+"""
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+from contextlib import contextmanager
+import json
+import os
+import queue
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+import logging
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# seconds between writes of a running job's progress to its store; status changes are written right away
+PROGRESS_SAVE_INTERVAL = 1.0
+
+
+class QueueFull(Exception):
+    """Raised when a job cannot be queued before the submit timeout."""
+
+
+_local = threading.local()
+
+
+def current_job() -> Optional['Job']:
+    """Returns the job running on this thread, None outside of a worker."""
+    return getattr(_local, 'job', None)
+
+
+def report_progress(**fields):
+    """Updates the progress of the job running on this thread, a no-op outside of a worker."""
+    job = current_job()
+    if job is not None:
+        job.progress.update(fields)
+        job.save_progress()
+
+
+def attach(**values):
+    """Keeps values with the job running on this thread, next to its result but never sent with it; a no-op outside of a worker."""
+    job = current_job()
+    if job is not None:
+        job.attachments.update(values)
+
+
+def available_memory() -> Optional[int]:
+    """Returns MemAvailable from /proc/meminfo in bytes, None if unknown."""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def default_workers(job_memory_mb: int = 512) -> int:
+    """Worker count sized to the cores and the memory one running job needs.
+
+    The model weights are shared, so only the per-inference working memory
+    (activations, decoded image) is counted per worker.
+
+    Args:
+        job_memory_mb (int): memory one running validation needs in MB
+
+    Returns:
+        int: number of workers, at least 1
+    """
+    workers = os.cpu_count() or 1
+    mem = available_memory()
+    if mem is not None and job_memory_mb > 0:
+        workers = min(workers, mem // (job_memory_mb * 1024 * 1024))
+    return max(int(workers), 1)
+
+
+class Job:
+    """A single submitted validation and its result.
+
+    Attributes:
+        id (str): job id
+        owner (str): who submitted it
+        status (str): one of queued, running, done, failed
+        progress (dict): whatever the job reported through report_progress
+        result (Any): return value of the job function once done
+        attachments (dict): whatever the job kept through attach (uploads to render on request), dropped with the job
+        error (str): error message if it failed
+    """
+
+    def __init__(self, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any], owner: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.status = QUEUED
+        self.progress: Dict[str, Any] = {}
+        self.result = None
+        self.attachments: Dict[str, Any] = {}
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        # where the job is shared with other processes, None to keep it in this one
+        self.store: Optional['JobStore'] = None
+        # nobody will ask for the result any more, it is not stored
+        self.abandoned = False
+        self._saved = 0.0
+        self._done = threading.Event()
+
+    def save(self):
+        """Writes the job to its store, if it has one and the job is not abandoned."""
+        if self.store is None or self.abandoned:
+            return
+        self._saved = time.monotonic()
+        try:
+            self.store.save(self)
+        except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+            # the job still runs and answers polls reaching this process
+            logger.error(f"Could not store job {self.id}: {e}")
+
+    def save_progress(self):
+        """Writes the job's progress to its store, at most every PROGRESS_SAVE_INTERVAL seconds."""
+        if time.monotonic() - self._saved >= PROGRESS_SAVE_INTERVAL:
+            self.save()
+
+    def run(self):
+        self.status = RUNNING
+        self.started = time.time()
+        self.save()
+        _local.job = self
+        try:
+            self.result = self.fn(*self.args, **self.kwargs)
+            self.status = DONE
+        except Exception as e:
+            self.error = str(e)
+            self.status = FAILED
+            logger.error(f"Job {self.id} failed: {e}", exc_info=True)
+        finally:
+            _local.job = None
+            self.finished = time.time()
+            # drop references to the inputs (image bytes) as soon as possible
+            self.args = ()
+            self.kwargs = {}
+            self.save()
+            self._done.set()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Waits for the job to finish.
+
+        Args:
+            timeout (float): seconds to wait, None to wait forever
+
+        Returns:
+            bool: True if the job finished
+        """
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Status of the job without its result."""
+        return {
+            'id': self.id,
+            'status': self.status,
+            'progress': dict(self.progress),
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished
+        }
+
+
+class StoredFiles(Sequence[bytes]):
+    """A list of bytes attachment kept in a JobStore, each item read from its file when indexed."""
+
+    def __init__(self, directory: str, name: str, count: int):
+        self._paths = [os.path.join(directory, f'{name}-{n}') for n in range(count)]
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            return [self[i] for i in range(*n.indices(len(self)))]
+        with open(self._paths[n], 'rb') as f:
+            return f.read()
+
+
+def _is_files(value: Any) -> bool:
+    return isinstance(value, (list, tuple)) and len(value) > 0 and all(isinstance(item, bytes) for item in value)
+
+
+class JobStore:
+    """Status, progress and results of jobs in a SQLite file, shared by every process pointed at it.
+
+    Jobs read back from the store are snapshots: they answer done() and
+    to_dict() and carry their result and attachments, but cannot be waited on.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): database file, created if missing; attached files go in a directory next to it
+        """
+        self.path = path
+        self.files = path + '.files'
+        with self._connect() as conn:
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                owner TEXT,
+                status TEXT NOT NULL,
+                progress TEXT NOT NULL,
+                error TEXT,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL,
+                result TEXT,
+                attachments TEXT
+            )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # a connection per call keeps this usable from any thread or process
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            yield conn
+        finally:
+            conn.close()
+
+    def _directory(self, job_id: str) -> str:
+        return os.path.join(self.files, job_id)
+
+    def _dump_attachments(self, job: Job) -> str:
+        # lists of bytes go to files, everything else into the row as JSON
+        stored: Dict[str, Any] = {}
+        for name, value in job.attachments.items():
+            if not _is_files(value):
+                stored[name] = {'value': value}
+                continue
+            directory = self._directory(job.id)
+            os.makedirs(directory, exist_ok=True)
+            for n, data in enumerate(value):
+                fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp, os.path.join(directory, f'{name}-{n}'))
+            stored[name] = {'files': len(value)}
+        return json.dumps(stored)
+
+    def _load_attachments(self, job_id: str, data: str) -> Dict[str, Any]:
+        return {
+            name: StoredFiles(self._directory(job_id), name, entry['files']) if 'files' in entry else entry['value']
+            for name, entry in json.loads(data).items()
+        }
+
+    def save(self, job: Job):
+        """Writes a job's current state; its result and attachments once it has finished."""
+        finished = job.finished is not None
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, owner, status, progress, error, created, started, finished, result, attachments) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.owner, job.status, json.dumps(job.progress), job.error, job.created, job.started, job.finished,
+                 json.dumps(job.result) if finished else None, self._dump_attachments(job) if finished else None)
+            )
+
+    def load(self, job_id: str) -> Optional[Job]:
+        """A snapshot of a stored job, None if there is none."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, owner, status, progress, error, created, started, finished, result, attachments FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = Job(None, (), {}, owner=row[1])
+        job.id, job.status, job.progress, job.error = row[0], row[2], json.loads(row[3]), row[4]
+        job.created, job.started, job.finished = row[5], row[6], row[7]
+        if row[8] is not None:
+            job.result = json.loads(row[8])
+        if row[9] is not None:
+            job.attachments = self._load_attachments(job.id, row[9])
+        if job.status in (DONE, FAILED):
+            job._done.set()
+        return job
+
+    def delete(self, job_id: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        shutil.rmtree(self._directory(job_id), ignore_errors=True)
+
+    def prune(self, before: float):
+        """Drops jobs finished before a time, and their files."""
+        with self._connect() as conn:
+            expired: List[str] = [row[0] for row in conn.execute("SELECT id FROM jobs WHERE finished < ?", (before,))]
+            conn.execute("DELETE FROM jobs WHERE finished < ?", (before,))
+        for job_id in expired:
+            shutil.rmtree(self._directory(job_id), ignore_errors=True)
+
+
+# executors to restart in a forked child
+_executors: 'weakref.WeakSet[JobExecutor]' = weakref.WeakSet()
+
+
+def _restart_executors():
+    for executor in list(_executors):
+        executor._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_executors)
+
+
+class JobExecutor:
+    """Bounded worker pool with a bounded queue in front of it."""
+
+    def __init__(self, workers: Optional[int] = None, queue_size: int = 16, submit_timeout: float = 5.0, result_ttl: float = 600.0,
+                 store: Optional[JobStore] = None):
+        """
+        Args:
+            workers (int): worker threads, None to size by default_workers()
+            queue_size (int): jobs that may wait for a worker
+            submit_timeout (float): seconds submit() blocks on a full queue before raising QueueFull
+            result_ttl (float): seconds a finished job stays available through get()
+            store (JobStore): where jobs are shared with other processes, None to keep them in this one
+        """
+        self.workers = workers or default_workers()
+        self.submit_timeout = submit_timeout
+        self.result_ttl = result_ttl
+        self.queue_size = queue_size
+        self.store = store
+        self._start()
+        _executors.add(self)
+        logger.info(f'Job executor started with {self.workers} workers, queue size {queue_size}')
+
+    def _start(self):
+        self._jobs: Dict[str, Job] = {}
+        self._queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        self._running = 0
+        self._lock = threading.Lock()
+        self._threads = []
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'ocr-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _after_fork(self):
+        # threads don't survive a fork: a preforked server worker starts its own, with a queue and jobs of its own
+        self._start()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                self._running += 1
+            try:
+                job.run()
+            finally:
+                with self._lock:
+                    self._running -= 1
+                self._queue.task_done()
+
+    def submit(self, fn: Callable[..., Any], *args, owner: Optional[str] = None, **kwargs) -> Job:
+        """Queues fn(*args, **kwargs) to run on a worker.
+
+        Args:
+            owner (str): who submitted the job, checked by callers of get()
+
+        Raises:
+            QueueFull: If the queue stays full for submit_timeout seconds
+
+        Returns:
+            Job: the queued job
+        """
+        self._prune()
+        job = Job(fn, args, kwargs, owner=owner)
+        job.store = self.store
+        # stored before a worker can pick it up, so its later updates are never overwritten
+        job.save()
+        try:
+            self._queue.put(job, timeout=self.submit_timeout)
+        except queue.Full:
+            if self.store is not None:
+                self.store.delete(job.id)
+            raise QueueFull(f'Validation queue is full ({self._queue.maxsize} waiting)')
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Returns a queued, running or recently finished job by id, submitted here or, with a store, in another process."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            job = self.store.load(job_id)
+            if job is not None and job.finished is not None and job.finished < time.time() - self.result_ttl:
+                return None
+        return job
+
+    def discard(self, job_id: str):
+        """Forgets a finished job whose result has already been handed out."""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+        if self.store is not None:
+            self.store.delete(job_id)
+
+    def abandon(self, job_id: str):
+        """Forgets a job nobody will ask for again, finished or not; a running job's result is never stored."""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is not None:
+            job.abandoned = True
+        if self.store is not None:
+            self.store.delete(job_id)
+
+    def _prune(self):
+        # finished jobs hold their results (encoded images), don't keep them forever
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items() if job.finished is not None and job.finished < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+        if self.store is not None:
+            self.store.prune(cutoff)
+
+    def stats(self) -> Dict[str, int]:
+        """Current load of the executor."""
+        with self._lock:
+            running = self._running
+        return {
+            'workers': self.workers,
+            'running': running,
+            'queued': self._queue.qsize(),
+            'queue_size': self._queue.maxsize
+        }
+
+    def busy(self) -> bool:
+        """True if every worker is running a job."""
+        stats = self.stats()
+        return stats['running'] >= stats['workers']
@@ -0,0 +1,319 @@
+"""Process-wide latency histograms and counters, exposed in the Prometheus text format.
+
+Every part of a validation records into the shared `metrics` object: how long
+a job queued, each stage of the pipeline (decode, OCR, each check, annotate,
+serialization), boxes per image, cache lookups, rejected and timed out
+submissions. With a directory configured every process writes its numbers to
+a file of its own there and render() adds up all the files, so /metrics on any
+gunicorn worker answers for all of them. A file is named after the process'
+pid and a random id, so a new worker reusing a pid never overwrites what an
+earlier one recorded; a worker that exits folds its numbers into the
+directory's retired totals and removes its own file.
+
+A process writes its file at most every flush_interval while events come in,
+and once more flush_interval after the last of a burst, so a process gone
+idle has still written everything it recorded. The server also flushes at
+the end of every request and job, and at exit.
+"""
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple
+from contextlib import contextmanager
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+import logging
+
+try:
+    import fcntl
+except ImportError:
+    # no advisory locks (Windows): retiring a process may briefly count it twice
+    fcntl = None
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+
+# seconds, from a check on a handful of boxes to a large label's OCR
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+BOX_BUCKETS = (0, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# numbers of the processes that exited, added up
+RETIRED_FILE = 'retired.json'
+# held shared while the files are read, exclusive while a process retires
+LOCK_FILE = '.lock'
+
+# name: (type, help, buckets)
+DEFINITIONS: Dict[str, Tuple[str, str, Optional[Sequence[float]]]] = {
+    'ocr_queue_wait_seconds': (HISTOGRAM, 'Time a validation waited for a worker', LATENCY_BUCKETS),
+    'ocr_stage_seconds': (HISTOGRAM, 'Time spent per pipeline stage (decode, ocr, detect, recognize, layout, quantities, check_*, annotate, serialize_images, serialize)', LATENCY_BUCKETS),
+    'ocr_boxes_per_image': (HISTOGRAM, 'Text boxes found per validated image', BOX_BUCKETS),
+    'ocr_images_total': (COUNTER, 'Images validated', None),
+    'ocr_boxes_total': (COUNTER, 'Text boxes found on validated images', None),
+    'ocr_cache_requests_total': (COUNTER, 'OCR cache lookups by result (hit, disk_hit, miss)', None),
+    'ocr_rejections_total': (COUNTER, 'Submissions turned away by reason (busy, too_large, bad_request, bad_image, unsupported_format, too_many_pixels, too_many_frames)', None),
+    'ocr_timeouts_total': (COUNTER, 'Submissions that timed out waiting for their result', None)
+}
+
+
+def _label_key(labels: Dict[str, Any]) -> str:
+    return ','.join(f'{name}="{labels[name]}"' for name in sorted(labels))
+
+
+def _merge(total: Dict[str, Any], snapshot: Dict[str, Any]):
+    """Adds the numbers of one snapshot to total, in place."""
+    for name, series in snapshot.get('counters', {}).items():
+        merged = total['counters'].setdefault(name, {})
+        for key, value in series.items():
+            merged[key] = merged.get(key, 0) + value
+    for name, series in snapshot.get('histograms', {}).items():
+        merged = total['histograms'].setdefault(name, {})
+        for key, entry in series.items():
+            if key not in merged:
+                merged[key] = {'buckets': list(entry['buckets']), 'sum': entry['sum'], 'count': entry['count']}
+                continue
+            merged[key]['buckets'] = [a + b for a, b in zip(merged[key]['buckets'], entry['buckets'])]
+            merged[key]['sum'] += entry['sum']
+            merged[key]['count'] += entry['count']
+
+
+def _load(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _process_id() -> str:
+    return f'{os.getpid()}-{uuid.uuid4().hex[:12]}'
+
+
+class Metrics:
+    """Counters and histograms of one process, optionally shared through a directory."""
+
+    def __init__(self, directory: Optional[str] = None, flush_interval: float = 1.0):
+        """
+        Args:
+            directory (str): where every process keeps its numbers for render() to add up, None for this process only
+            flush_interval (float): seconds between writes of this process' file, and from the last event to the write that includes it
+        """
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        # a write of this process' file and its retirement never overlap
+        self._write_lock = threading.Lock()
+        self._id = _process_id()
+        self._reset()
+
+    def _reset(self):
+        self._counters: Dict[str, Dict[str, float]] = {}
+        self._histograms: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._flushed = 0.0
+        # recorded since the last write
+        self._changed = False
+        # the trailing write of a burst, pending
+        self._timer: Optional[threading.Timer] = None
+        # folded into the retired totals, nothing more is written
+        self._retired = False
+
+    def configure(self, directory: Optional[str] = None, flush_interval: Optional[float] = None):
+        """Sets where the numbers are shared, the server does this once at startup."""
+        self.directory = directory
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        """Adds to a counter."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+            self._changed = True
+        self._maybe_flush()
+
+    def observe(self, name: str, value: float, **labels):
+        """Records a value into a histogram."""
+        buckets = DEFINITIONS[name][2]
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            entry = series.get(key)
+            if entry is None:
+                # one count per bucket and a last one for +Inf, made cumulative when rendered
+                entry = series[key] = {'buckets': [0] * (len(buckets) + 1), 'sum': 0.0, 'count': 0}
+            n = 0
+            while n < len(buckets) and value > buckets[n]:
+                n += 1
+            entry['buckets'][n] += 1
+            entry['sum'] += value
+            entry['count'] += 1
+            self._changed = True
+        self._maybe_flush()
+
+    @contextmanager
+    def time(self, name: str, **labels) -> Iterator[None]:
+        """Observes the wall time of the block into a histogram, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """This process' numbers."""
+        with self._lock:
+            return json.loads(json.dumps({'counters': self._counters, 'histograms': self._histograms}))
+
+    def _path(self) -> str:
+        return os.path.join(self.directory, f'{self._id}.json')
+
+    @contextmanager
+    def _locked(self, exclusive: bool) -> Iterator[None]:
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, LOCK_FILE), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _write(self, path: str, snapshot: Dict[str, Any]):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _maybe_flush(self):
+        if not self.directory:
+            return
+        wait = self.flush_interval - (time.monotonic() - self._flushed)
+        if wait <= 0:
+            self.flush()
+            return
+        # too soon to write again, but the events of a burst's tail must not wait for the next event
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(wait, self._trailing_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _trailing_flush(self):
+        with self._lock:
+            self._timer = None
+        self.flush(changed_only=True)
+
+    def flush(self, changed_only: bool = False):
+        """Writes this process' numbers to its file in the directory.
+
+        Args:
+            changed_only (bool): skip the write if nothing was recorded since the last one
+        """
+        if not self.directory or (changed_only and not self._changed):
+            return
+        with self._write_lock:
+            if self._retired:
+                return
+            self._flushed = time.monotonic()
+            with self._lock:
+                self._changed = False
+            snapshot = self.snapshot()
+            try:
+                self._write(self._path(), snapshot)
+            except OSError as e:
+                logger.warning(f'Could not write metrics to {self.directory}: {e}')
+
+    def retire(self):
+        """Folds this process' numbers into the directory's retired totals and removes its own file.
+
+        Called as a gunicorn worker exits, so what it recorded is still counted once and a later
+        worker given the same pid starts a file of its own. Nothing is written for this process afterwards.
+        """
+        if not self.directory:
+            return
+        with self._write_lock:
+            if self._retired:
+                return
+            self._retired = True
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            retired_path = os.path.join(self.directory, RETIRED_FILE)
+            try:
+                # readers never see the numbers in both files, or in neither
+                with self._locked(exclusive=True):
+                    total = _load(retired_path) or {'counters': {}, 'histograms': {}}
+                    _merge(total, self.snapshot())
+                    self._write(retired_path, total)
+                    if os.path.exists(self._path()):
+                        os.remove(self._path())
+            except OSError as e:
+                logger.warning(f'Could not retire metrics to {retired_path}: {e}')
+
+    def collect(self) -> Dict[str, Any]:
+        """The numbers of every process sharing the directory added up (this process' alone without one)."""
+        if not self.directory:
+            return self.snapshot()
+        self.flush()
+        total: Dict[str, Any] = {'counters': {}, 'histograms': {}}
+        # the live processes' files and the retired totals
+        with self._locked(exclusive=False):
+            snapshots = [_load(path) for path in glob.glob(os.path.join(self.directory, '*.json'))]
+        for snapshot in snapshots:
+            if snapshot is not None:
+                _merge(total, snapshot)
+        return total
+
+    def render(self) -> str:
+        """Everything collect() returns in the Prometheus text exposition format."""
+        data = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in DEFINITIONS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == COUNTER:
+                for key, value in sorted(data['counters'].get(name, {}).items()):
+                    lines.append(f'{name}{{{key}}} {value:g}' if key else f'{name} {value:g}')
+                continue
+            for key, entry in sorted(data['histograms'].get(name, {}).items()):
+                prefix = f'{key},' if key else ''
+                cumulative = 0
+                for bound, count in zip([*buckets, '+Inf'], entry['buckets']):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                labels = f'{{{key}}}' if key else ''
+                lines.append(f'{name}_sum{labels} {entry["sum"]:g}')
+                lines.append(f'{name}_count{labels} {entry["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def _after_fork(self):
+        # a forked worker starts from zero, what the master recorded is the master's (and so is its timer thread)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        # a file of its own, even where the pid was the master's or an earlier worker's
+        self._id = _process_id()
+        self._reset()
+
+
+# Shared by everything in this process
+metrics = Metrics()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=metrics._after_fork)
+atexit.register(metrics.flush)
@@ -0,0 +1,359 @@
+"""OCR backends that all produce the (ocrdata, rdix) shape OCRChecker works on.
+
+Each backend only has to implement readtext() returning easyocr style results,
+a list of (bbox, text, confidence) where bbox is four [x, y] corner points.
+Turning that into the ocrdata dict and box index is shared.
+"""
+from typing import List, Dict, Any, Optional, Tuple, Union
+import hashlib
+import json
+import logging
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+try:
+    from .ocr_models import registry
+    from .ocr_image import DecodedImage
+    from .ocr_result import OCRResult
+    from .ocr_boxes import BoxIndex
+    from .ocr_preprocess import Preprocessor
+    from .ocr_staged import Region, StagedRead
+except ImportError:
+    from ocr_models import registry
+    from ocr_image import DecodedImage
+    from ocr_result import OCRResult
+    from ocr_boxes import BoxIndex
+    from ocr_preprocess import Preprocessor
+    from ocr_staged import Region, StagedRead
+
+SUPPORTED_BACKENDS = ['easyocr', 'tesseract', 'replay']
+
+
+def image_key(imagedata: bytes) -> str:
+    """Stable key for an image, used to look up replay fixtures.
+
+    Args:
+        imagedata (bytes): encoded image bytes
+
+    Returns:
+        str: sha256 hex digest of the bytes
+    """
+    return hashlib.sha256(imagedata).hexdigest()
+
+
+def build_ocr_index(result) -> Tuple[OCRResult, BoxIndex]:
+    """Builds ocrdata and the box index from easyocr style results.
+
+    Args:
+        result (list): (bbox, text, prob) tuples, bbox being four [x, y] points
+
+    Returns:
+        tuple: (ocrdata, rdix)
+            - ocrdata (OCRResult): OCR data with rdix ids as keys, text normalized once
+            - rdix (BoxIndex): spatial index of bounding boxes
+    """
+    return index_boxes(box_records(result))
+
+
+def box_records(result) -> List[Tuple[str, float, Tuple[int, int, int, int]]]:
+    """Reduces easyocr style results to compact (text, confidence, (minx, miny, maxx, maxy)) records.
+
+    Args:
+        result (list): (bbox, text, prob) tuples, bbox being four [x, y] points
+
+    Returns:
+        list: one record per box, in OCR order
+    """
+    records = []
+    for (bbox, text, prob) in result:
+        minx = int(min(v[0] for v in bbox))
+        miny = int(min(v[1] for v in bbox))
+        maxx = int(max(v[0] for v in bbox))
+        maxy = int(max(v[1] for v in bbox))
+        records.append((text, round(float(prob), 4), (minx, miny, maxx, maxy)))
+    return records
+
+
+def index_boxes(records) -> Tuple[OCRResult, BoxIndex]:
+    """Builds ocrdata and the box index from box records.
+
+    Args:
+        records (list): (text, confidence, (minx, miny, maxx, maxy)) records
+
+    Returns:
+        tuple: (ocrdata, rdix)
+    """
+    out = {}
+    for bbid_counter, (text, prob, bbox) in enumerate(records):
+        out[bbid_counter] = {
+            "text": text,
+            "confidence": prob,
+            "bbox": tuple(int(v) for v in bbox)
+        }
+
+    # all boxes at once, ids are the record positions as in ocrdata
+    return OCRResult(out), BoxIndex.from_records(records)
+
+
+class mockReader:
+    """Stand in for easyocr.Reader that replays recorded results.
+
+    Fixtures map image_key(imagedata) to the readtext output for that image.
+    Images with no fixture return no text.
+    """
+    def __init__(self, fixtures: Optional[Dict[str, list]] = None):
+        self.fixtures = fixtures or {}
+
+    def readtext(self, imagedata: bytes, rotation_info: List[int] = [0]):
+        # Mock function to simulate OCR output
+        result = self.fixtures.get(image_key(imagedata))
+        if result is None:
+            logger.debug('No replay fixture for image, returning no text')
+            return []
+        return [(bbox, text, prob) for (bbox, text, prob) in result]
+
+
+def load_fixtures(fixture_path: Optional[str] = None) -> mockReader:
+    """Loads a replay fixture file into a mockReader.
+
+    Args:
+        fixture_path (str): JSON file of {image sha256: readtext results}, None for no fixtures
+
+    Returns:
+        mockReader: reader replaying the fixtures
+    """
+    if fixture_path is None:
+        return mockReader()
+    with open(fixture_path, 'r') as f:
+        return mockReader(json.load(f))
+
+
+def record_fixtures(backend: 'OCRBackend', images: List[Union[bytes, DecodedImage]], fixture_path: str):
+    """Runs images through a backend and saves the results as a replay fixture file.
+
+    Args:
+        backend (OCRBackend): backend to record from
+        images (List[bytes | DecodedImage]): images to record
+        fixture_path (str): JSON file to write
+    """
+    fixtures = {}
+    for imagedata in images:
+        image = DecodedImage.coerce(imagedata)
+        fixtures[image_key(image.data)] = [
+            [[[int(v[0]), int(v[1])] for v in bbox], text, round(float(prob), 4)]
+            for (bbox, text, prob) in backend.readtext(image)
+        ]
+    with open(fixture_path, 'w') as f:
+        json.dump(fixtures, f, indent=1)
+
+
+def _load_tesseract():
+    import pytesseract
+    # Fails early if the tesseract binary is missing
+    pytesseract.get_tesseract_version()
+    return pytesseract
+
+
+registry.register_loader('tesseract', _load_tesseract)
+registry.register_loader('replay', load_fixtures)
+
+
+class OCRBackend:
+    """Base class for OCR engines."""
+    name = ''
+    # settings that change what readtext returns, part of the OCR cache key
+    config: Dict[str, Any] = {}
+    # downscales/tiles images ahead of readtext, None reads them at full resolution
+    preprocessor: Optional[Preprocessor] = None
+
+    def cache_key(self) -> str:
+        """Identifies the backend and its output affecting config, for keying cached results."""
+        config = dict(self.config)
+        if self.preprocessor is not None:
+            config['preprocess'] = self.preprocessor.config
+        return f"{self.name}:{json.dumps(config, sort_keys=True)}"
+
+    def readtext(self, image: DecodedImage) -> list:
+        """Runs OCR on an image.
+
+        Args:
+            image (DecodedImage): the decoded upload, must not be modified
+
+        Returns:
+            list: (bbox, text, prob) tuples, bbox being four [x, y] points
+        """
+        raise NotImplementedError
+
+    def read(self, image: Union[bytes, DecodedImage]) -> Tuple[OCRResult, BoxIndex]:
+        """Runs OCR on an image and indexes the found text.
+
+        Args:
+            image (bytes | DecodedImage): the image, decoded here if given as bytes
+
+        Returns:
+            tuple: (ocrdata, rdix) in the coordinates of the image
+        """
+        return build_ocr_index(self.read_records(image))
+
+    def read_records(self, image: Union[bytes, DecodedImage]) -> list:
+        """Runs OCR on an image through the preprocessor, without indexing the result.
+
+        Returns:
+            list: (bbox, text, prob) tuples in the coordinates of the image
+        """
+        image = DecodedImage.coerce(image)
+        if self.preprocessor is None:
+            return self.readtext(image)
+        return self.preprocessor.read(self.readtext, image)
+
+    # backends that can detect regions and recognize them separately set this
+    staged = False
+
+    def detect(self, image: DecodedImage) -> List[Region]:
+        """Finds the text regions of an image without reading them, staged backends only."""
+        raise NotImplementedError
+
+    def recognize(self, image: DecodedImage, regions: List[Region]) -> list:
+        """Reads detected regions, staged backends only.
+
+        Returns:
+            list: (bbox, text, prob) tuples on image, one per region
+        """
+        raise NotImplementedError
+
+    def start(self, image: Union[bytes, DecodedImage], batch_size: int = 8, regions: Optional[List[Region]] = None) -> Optional[StagedRead]:
+        """Detects the text regions of an image, leaving recognition to the returned StagedRead.
+
+        Args:
+            image (bytes | DecodedImage): the image
+            batch_size (int): regions recognized per StagedRead.next_batch call
+            regions (List[Region]): regions an earlier read of the image detected, None to detect them
+
+        Returns:
+            StagedRead: regions to recognize on demand, None if the backend can't stage or the image needs tiling (use read)
+        """
+        if not self.staged:
+            return None
+        image = DecodedImage.coerce(image)
+        working, to_original = image, None
+        if self.preprocessor is not None:
+            tiles = self.preprocessor.tiles(image)
+            if len(tiles) > 1:
+                return None
+            if tiles[0].scale < 1.0:
+                working, to_original = DecodedImage(b'', tiles[0].pixels), tiles[0].to_original
+        if regions is None:
+            regions = self.detect(working)
+        return StagedRead(self.recognize, working, regions, to_original=to_original, batch_size=batch_size)
+
+
+class EasyOCRBackend(OCRBackend):
+    name = 'easyocr'
+
+    def __init__(self, quantize: bool = True, model_storage_directory: str = "./EasyOCR", download_enabled: bool = False):
+        self.reader = registry.get('easyocr', quantize=quantize, model_storage_directory=model_storage_directory, download_enabled=download_enabled)
+        self.config = {'quantize': quantize}
+
+    def readtext(self, image: DecodedImage) -> list:
+        # easyocr reads a colour array as RGB, the decoded pixels are BGR
+        return self.reader.readtext(image.rgb)
+
+    staged = True
+
+    def detect(self, image: DecodedImage) -> List[Region]:
+        horizontal, free = self.reader.detect(image.rgb)
+        # one list per image passed in
+        return [Region('horizontal', box) for box in horizontal[0]] + [Region('free', box) for box in free[0]]
+
+    def recognize(self, image: DecodedImage, regions: List[Region]) -> list:
+        return self.reader.recognize(
+            image.gray,
+            horizontal_list=[r.coords for r in regions if r.kind == 'horizontal'],
+            free_list=[r.coords for r in regions if r.kind == 'free'],
+            reformat=False
+        )
+
+
+class TesseractBackend(OCRBackend):
+    """pytesseract backend. Words are grouped into lines to match easyocr's phrase level boxes."""
+    name = 'tesseract'
+
+    def __init__(self, min_confidence: float = 0.0):
+        self.reader = registry.get('tesseract')
+        self.min_confidence = min_confidence
+        self.config = {'min_confidence': min_confidence}
+
+    def readtext(self, image: DecodedImage) -> list:
+        # pytesseract goes through PIL, which reads a colour array as RGB
+        data = self.reader.image_to_data(image.rgb, output_type=self.reader.Output.DICT)
+
+        lines: Dict[Tuple[int, int, int], Dict[str, Any]] = {}
+        for i, word in enumerate(data['text']):
+            conf = float(data['conf'][i])
+            # conf of -1 marks layout rows with no word in them
+            if not word.strip() or conf < 0:
+                continue
+            key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            left, top = data['left'][i], data['top'][i]
+            right, bottom = left + data['width'][i], top + data['height'][i]
+            line = lines.get(key)
+            if line is None:
+                lines[key] = {'words': [word], 'confs': [conf], 'box': [left, top, right, bottom]}
+            else:
+                line['words'].append(word)
+                line['confs'].append(conf)
+                box = line['box']
+                line['box'] = [min(box[0], left), min(box[1], top), max(box[2], right), max(box[3], bottom)]
+
+        result = []
+        for line in lines.values():
+            prob = sum(line['confs']) / len(line['confs']) / 100
+            if prob < self.min_confidence:
+                continue
+            minx, miny, maxx, maxy = line['box']
+            bbox = [[minx, miny], [maxx, miny], [maxx, maxy], [minx, maxy]]
+            result.append((bbox, ' '.join(line['words']), prob))
+        return result
+
+
+class ReplayBackend(OCRBackend):
+    """Deterministic backend replaying recorded results, no model is loaded."""
+    name = 'replay'
+
+    def __init__(self, fixture_path: Optional[str] = None):
+        self.reader = registry.get('replay', fixture_path=fixture_path)
+        self.config = {'fixture_path': fixture_path}
+
+    def readtext(self, image: DecodedImage) -> list:
+        return self.reader.readtext(image.data)
+
+
+def create_backend(name: str, quantize: bool = True, model_storage_directory: str = "./EasyOCR", download_enabled: bool = False, fixture_path: Optional[str] = None, preprocessor: Optional[Preprocessor] = None) -> OCRBackend:
+    """Creates the OCR backend for a model name.
+
+    Args:
+        name (str): one of SUPPORTED_BACKENDS
+        quantize (bool): easyocr only, use the quantized model
+        model_storage_directory (str): easyocr only, where the weights live
+        download_enabled (bool): easyocr only, allow downloading missing weights
+        fixture_path (str): replay only, JSON fixture file
+        preprocessor (Preprocessor): downscaling/tiling ahead of OCR, ignored by replay whose fixtures are the full image's
+
+    Raises:
+        ValueError: If unsupported OCR model is specified
+
+    Returns:
+        OCRBackend: the backend
+    """
+    match name:
+        case 'easyocr':
+            backend = EasyOCRBackend(quantize=quantize, model_storage_directory=model_storage_directory, download_enabled=download_enabled)
+        case 'tesseract':
+            backend = TesseractBackend()
+        case 'replay':
+            return ReplayBackend(fixture_path=fixture_path)
+        case _:
+            raise ValueError(f"Unsupported OCR model: {name}")
+    backend.preprocessor = preprocessor
+    return backend
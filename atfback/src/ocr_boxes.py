@@ -0,0 +1,111 @@
+"""Array-backed spatial index of an image's OCR boxes.
+
+Every read used to create an rtree and insert its boxes one at a time, a
+native call (and a Python tuple) per box, only for a check to ask it for the
+boxes in one rectangle now and then. BoxIndex keeps the boxes as NumPy
+arrays instead, coordinates, confidence and the rdix id that keys the box's
+text in ocrdata, built in one go from all of a read's records.
+
+A label has tens to a few thousand boxes, few enough that one vectorized
+comparison over all of them answers a rectangle query faster than building
+and walking a tree does, so a query is a linear scan of the arrays. The
+checks and the layout (src/ocr_layout.py) work from the boxes directly, in
+reading order; rectangle queries are only asked for regions near a found
+field (src/ocr_staged.py).
+
+BoxIndex keeps the part of rtree.index.Index's interface the checks used,
+insert and intersection, so it drops in where the rtree was.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+Rect = Tuple[float, float, float, float]
+
+
+class BoxIndex:
+    """(minx, miny, maxx, maxy) boxes by rdix id, stored as arrays.
+
+    Attributes:
+        ids (np.ndarray): rdix id of every box, int64
+        bounds (np.ndarray): (n, 4) minx, miny, maxx, maxy, float64
+        confidence (np.ndarray): OCR confidence of every box, float32 (1 where unknown)
+    """
+
+    def __init__(self, ids: Sequence[int] = (), bounds: Optional[Sequence[Rect]] = None, confidence: Optional[Sequence[float]] = None):
+        """
+        Args:
+            ids (Sequence[int]): rdix ids
+            bounds (Sequence[Rect]): a (minx, miny, maxx, maxy) box per id
+            confidence (Sequence[float]): a confidence per id, defaults to 1
+        """
+        n = len(ids)
+        self._size = n
+        self._ids = np.array(ids, dtype=np.int64).reshape(n)
+        self._bounds = np.array(bounds if bounds is not None else [], dtype=np.float64).reshape(n, 4)
+        self._confidence = np.array(confidence if confidence is not None else np.ones(n), dtype=np.float32).reshape(n)
+        self._rows = None
+
+    @classmethod
+    def from_records(cls, records: Sequence[Tuple[str, float, Rect]], start: int = 0) -> 'BoxIndex':
+        """Builds the index from (text, confidence, bbox) box records in one go, ids counting up from start."""
+        return cls(range(start, start + len(records)), [record[2] for record in records], [record[1] for record in records])
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._size]
+
+    @property
+    def bounds(self) -> np.ndarray:
+        return self._bounds[:self._size]
+
+    @property
+    def confidence(self) -> np.ndarray:
+        return self._confidence[:self._size]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        if needed <= len(self._ids):
+            return
+        # grow geometrically so box by box inserts stay amortized O(1)
+        capacity = max(needed, 2 * len(self._ids), 16)
+        for name, shape in (('_ids', (capacity,)), ('_bounds', (capacity, 4)), ('_confidence', (capacity,))):
+            old = getattr(self, name)
+            new = np.empty(shape, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def extend(self, ids: Sequence[int], bounds: Sequence[Rect], confidence: Optional[Sequence[float]] = None):
+        """Adds boxes in bulk, e.g. those of a rotated re-scan."""
+        n = len(ids)
+        if n == 0:
+            return
+        self._reserve(n)
+        self._ids[self._size:self._size + n] = ids
+        self._bounds[self._size:self._size + n] = np.asarray(bounds, dtype=np.float64).reshape(n, 4)
+        self._confidence[self._size:self._size + n] = 1 if confidence is None else confidence
+        self._size += n
+        self._rows = None
+
+    def insert(self, i: int, bbox: Rect, confidence: float = 1.0):
+        """Adds one box, as rtree's insert does."""
+        self.extend([i], [bbox], [confidence])
+
+    def row(self, i: int) -> int:
+        """Array row of an rdix id."""
+        if self._rows is None:
+            self._rows = {int(v): row for row, v in enumerate(self.ids)}
+        return self._rows[i]
+
+    def bbox(self, i: int) -> Rect:
+        return tuple(self.bounds[self.row(i)])
+
+    def intersection(self, area: Rect) -> List[int]:
+        """rdix ids of the boxes overlapping or touching area, in insertion order."""
+        b = self.bounds
+        # closed intervals like rtree: boxes touching the area's edge are in it
+        mask = (b[:, 0] <= area[2]) & (b[:, 2] >= area[0]) & (b[:, 1] <= area[3]) & (b[:, 3] >= area[1])
+        return self.ids[mask].tolist()
@@ -0,0 +1,266 @@
+"""Content addressed cache of OCR results.
+
+Applicants resubmit the same label image after fixing a form field, and only
+the string matching changes between those submissions. OCRCache keeps the OCR
+output under a hash of the image bytes and the backend config, as compact
+(text, confidence, bbox) records: a bounded LRU in memory and, optionally, a
+JSON file per image on disk that outlives restarts and is shared by every
+process pointed at the same directory. ocrdata and the box index are rebuilt from
+the records on every hit, so callers are free to modify what they get back.
+
+Reads that recognized only some of an image's detected regions (validation
+stopped once every field was found) are kept as their state instead: the
+detected regions and what was recognized so far, so a resubmission skips
+detection and only recognizes regions nobody read yet.
+
+The disk tier is bounded too: entries older than max_age, and past
+max_disk_bytes the least recently used ones, are removed by a sweep each
+process runs at most every PRUNE_INTERVAL seconds when it writes. A disk hit
+counts as a use.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import logging
+
+try:
+    from .ocr_backends import index_boxes
+    from .ocr_boxes import BoxIndex
+    from .metrics import metrics
+    from .ocr_result import OCRResult
+except ImportError:
+    from ocr_backends import index_boxes
+    from ocr_boxes import BoxIndex
+    from metrics import metrics
+    from ocr_result import OCRResult
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+Record = Tuple[str, float, Tuple[int, int, int, int]]
+
+# seconds between sweeps of the disk tier by one process
+PRUNE_INTERVAL = 60.0
+
+
+def cache_key(imagedata: bytes, backend_key: str) -> str:
+    """Key for an image read by a backend.
+
+    Args:
+        imagedata (bytes): encoded image bytes
+        backend_key (str): OCRBackend.cache_key() of the backend reading it
+
+    Returns:
+        str: sha256 hex digest of both
+    """
+    h = hashlib.sha256(backend_key.encode('utf-8'))
+    h.update(b'\0')
+    h.update(imagedata)
+    return h.hexdigest()
+
+
+class OCRCache:
+    """LRU of OCR box records, backed by an optional directory."""
+
+    def __init__(self, max_entries: int = 256, directory: Optional[str] = None, max_disk_bytes: Optional[int] = None,
+                 max_age: Optional[float] = None):
+        """
+        Args:
+            max_entries (int): images kept in memory, 0 keeps none
+            directory (str): where to store results on disk, None for memory only
+            max_disk_bytes (int): size the disk tier is kept under, least recently used entries go first; None for no limit
+            max_age (float): seconds an entry is kept on disk after it was last written or read, None for no limit
+        """
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.max_age = max_age
+        self._pruned: Optional[float] = None
+        # records of full reads, states of partial ones
+        self._entries: 'OrderedDict[str, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Tuple[OCRResult, BoxIndex]]:
+        """Looks up a result, memory first and then disk.
+
+        Args:
+            key (str): cache_key() of the image
+
+        Returns:
+            tuple: (ocrdata, rdix) built fresh from the records, None on a miss
+        """
+        records = self._lookup(key)
+        if records is None:
+            return None
+        return index_boxes([(text, prob, tuple(bbox)) for text, prob, bbox in records])
+
+    def put(self, key: str, ocrdata: Dict[int, Dict[str, Any]]):
+        """Stores the result of reading an image.
+
+        Args:
+            key (str): cache_key() of the image
+            ocrdata (dict): ocrdata as returned by the backend, before anything is merged into it
+        """
+        records = [(entry['text'], entry['confidence'], tuple(entry['bbox'])) for entry in ocrdata.values()]
+        self._remember(key, records)
+        self._write(key, records)
+
+    def get_state(self, key: str) -> Optional[Dict[str, Any]]:
+        """Looks up a partial read stored with put_state, memory first and then disk.
+
+        Args:
+            key (str): cache_key() of the image for the partial read
+
+        Returns:
+            dict: the stored state, a copy the caller may keep; None on a miss
+        """
+        state = self._lookup(key)
+        return json.loads(json.dumps(state)) if state is not None else None
+
+    def put_state(self, key: str, state: Dict[str, Any]):
+        """Stores a partial read (StagedRead.state()) so a later read of the image resumes it.
+
+        Args:
+            key (str): cache_key() of the image for the partial read
+            state (dict): JSON serializable state
+        """
+        self._remember(key, state)
+        self._write(key, state)
+
+    def _lookup(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if entry is not None:
+            metrics.inc('ocr_cache_requests_total', result='hit')
+            return entry
+        entry = self._read(key)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            metrics.inc('ocr_cache_requests_total', result='miss')
+            return None
+        with self._lock:
+            self.disk_hits += 1
+        metrics.inc('ocr_cache_requests_total', result='disk_hit')
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry: Any):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        # fan out over subdirectories so no single directory gets huge
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def _read(self, key: str) -> Any:
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+            # a hit keeps the entry from being the next one swept
+            os.utime(path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f'Ignoring unreadable OCR cache entry {key}: {e}')
+            return None
+
+    def _write(self, key: str, entry: Any):
+        if not self.directory:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # written aside and renamed so readers in other processes never see half a file
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f'Could not write OCR cache entry {key}: {e}')
+        if self._pruned is None or time.monotonic() - self._pruned >= PRUNE_INTERVAL:
+            self.prune()
+
+    def prune(self) -> int:
+        """Removes disk entries past max_age, then the least recently used until the tier is under max_disk_bytes.
+
+        Returns:
+            int: entries removed
+        """
+        self._pruned = time.monotonic()
+        if not self.directory or (self.max_age is None and self.max_disk_bytes is None):
+            return 0
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name.endswith('.tmp'), path))
+        files.sort()
+        now = time.time()
+        total = sum(size for _, size, _, _ in files)
+        removed = 0
+        for mtime, size, partial, path in files:
+            expired = self.max_age is not None and now - mtime > self.max_age
+            oversize = self.max_disk_bytes is not None and total > self.max_disk_bytes
+            if not expired and not oversize:
+                # oldest first, so everything after is newer and the total is under the limit
+                break
+            # a file still being written is only ever removed once it is stale
+            if partial and not expired:
+                continue
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f'Could not remove OCR cache entry {path}: {e}')
+                continue
+            total -= size
+        if removed:
+            logger.info(f'Removed {removed} OCR cache entries from {self.directory}')
+        return removed
+
+    def clear(self):
+        """Empties the memory tier, the disk tier is left alone."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'directory': self.directory,
+                'max_disk_bytes': self.max_disk_bytes,
+                'max_age': self.max_age,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses
+            }
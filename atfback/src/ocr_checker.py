@@ -1,11 +1,11 @@
 from pickletools import pystring
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Union, Callable, Optional, Sequence
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+import os
+import threading
 
-import regex
-import easyocr
-
-import rtree
-from thefuzz import fuzz
 import cv2
 from io import BytesIO
 from PIL import Image
@@ -15,21 +15,101 @@ import logging
 # Set up logger for this module
 logger = logging.getLogger(__name__)
 
+try:
+    from .ocr_models import registry
+    from .metrics import metrics
+    from .ocr_backends import build_ocr_index, create_backend, index_boxes
+    from .ocr_boxes import BoxIndex
+    from .ocr_layout import Layout
+    from .quantity_index import QuantityIndex, decimals, normalize_unit, parse_number
+    from .ocr_staged import Region, StagedRead
+    from .ocr_image import DecodedImage
+    from .ocr_result import OCRResult, clean_text, compile_matcher
+    from .abv_matcher import compile_abv_matcher
+    from .warning_matcher import ClauseMatch, compile_warning_matcher
+    from .ocr_cache import OCRCache, cache_key
+    from .ocr_preprocess import Preprocessor
+    from .ocr_orientation import rotate, rotation_plan, unrotate_bbox
+except ImportError:
+    from ocr_models import registry
+    from metrics import metrics
+    from ocr_backends import build_ocr_index, create_backend, index_boxes
+    from ocr_boxes import BoxIndex
+    from ocr_layout import Layout
+    from quantity_index import QuantityIndex, decimals, normalize_unit, parse_number
+    from ocr_staged import Region, StagedRead
+    from ocr_image import DecodedImage
+    from ocr_result import OCRResult, clean_text, compile_matcher
+    from abv_matcher import compile_abv_matcher
+    from warning_matcher import ClauseMatch, compile_warning_matcher
+    from ocr_cache import OCRCache, cache_key
+    from ocr_preprocess import Preprocessor
+    from ocr_orientation import rotate, rotation_plan, unrotate_bbox
+
 #TODO Configuration file for OCR settings and thresholds
 #TODO: Get bounding boxes for future matches
 #TODO: Handle more edge cases in matching functions
 #TODO: Handle multi-image submissions
 
-class mockReader:
-    def readtext(self, imagedata: bytes, rotation_info: List[int] = [0]):
-        # Mock function to simulate OCR output
-        return []
+
+def settings_from_env(environ: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """OCRChecker arguments from the OCR_* environment, as the server sets its checker up.
+
+    Covers how images are read and checked (model, preprocessing, rotations, staged recognition,
+    warning text); the cache and the worker count are up to the caller.
+
+    Args:
+        environ (dict): environment to read, os.environ if None
+
+    Returns:
+        dict: keyword arguments for OCRChecker
+    """
+    env = os.environ if environ is None else environ
+    return {
+        # OCR_MODEL is one of easyocr, tesseract or replay (replay reads OCR_REPLAY_FIXTURES)
+        'modelSelect': env.get('OCR_MODEL', 'easyocr'),
+        'fixture_path': env.get('OCR_REPLAY_FIXTURES'),
+        # large uploads are scaled down until the small print is OCR_TEXT_HEIGHT pixels tall and tiled past OCR_MAX_SIDE
+        'preprocessor': Preprocessor(
+            target_text_height=int(env.get('OCR_TEXT_HEIGHT', 20)),
+            max_side=int(env.get('OCR_MAX_SIDE', 2560))
+        ) if env.get('OCR_PREPROCESS', '1') != '0' else None,
+        # sideways text is re-scanned while fields are missing, OCR_UPSIDE_DOWN=1 also tries a half turn
+        'rescan_rotations': env.get('OCR_ROTATIONS', '1') != '0',
+        'upside_down': env.get('OCR_UPSIDE_DOWN', '0') == '1',
+        # easyocr detects text once and recognizes OCR_RECOGNIZE_BATCH regions at a time, biggest text first,
+        # until every field is found; OCR_RECOGNIZE_ON_DEMAND=0 reads each image in full
+        'recognize_on_demand': env.get('OCR_RECOGNIZE_ON_DEMAND', '1') != '0',
+        'recognize_batch': int(env.get('OCR_RECOGNIZE_BATCH', 8)),
+        # the government warning needs both clauses of the statement; OCR_WARNING_TEXT=0 accepts the heading alone
+        'warning_text': env.get('OCR_WARNING_TEXT', '1') != '0'
+    }
+
+
 class OCRChecker:
     
-    def __init__(self, modelSelect: str = 'easyocr'):
+    def __init__(self, modelSelect: str = 'easyocr', quantize: bool = True, model_storage_directory: str = "./EasyOCR", download_enabled: bool = False, fixture_path: str = None, cache: Optional[OCRCache] = None, preprocessor: Optional[Preprocessor] = None, rescan_rotations: bool = True, upside_down: bool = False, image_workers: int = 1, recognize_on_demand: bool = True, recognize_batch: int = 8, warning_text: bool = True):
         self.modelname = modelSelect
-        self.reader = easyocr.Reader(['en'], gpu=False, quantize=True, model_storage_directory="./EasyOCR", download_enabled=False)  
-        #self.reader = mockReader()
+        # Models are loaded once per process and shared by every checker/validate call
+        # large uploads are downscaled/tiled by the preprocessor, boxes still come back in upload coordinates
+        self.backend = create_backend(modelSelect, quantize=quantize, model_storage_directory=model_storage_directory, download_enabled=download_enabled, fixture_path=fixture_path, preprocessor=preprocessor)
+        self.reader = self.backend.reader
+        # resubmitted images skip OCR, None to always run it
+        self.cache = cache
+        # re-scan sideways (and with upside_down, upside down) text while fields are missing
+        self.rescan_rotations = rescan_rotations
+        self.upside_down = upside_down
+        # images read at once across all validate calls; each concurrent read holds its own activations in memory
+        self.image_workers = max(image_workers, 1)
+        # backends that detect and recognize separately only recognize regions until every field is found,
+        # recognize_batch regions at a time, biggest text and text next to found fields first
+        self.recognize_on_demand = recognize_on_demand
+        self.recognize_batch = recognize_batch
+        # the government warning needs its full statement, not just the GOVERNMENT WARNING heading
+        self.warning_text = warning_text
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_pid: Optional[int] = None
+        self._pool_lock = threading.Lock()
         
 
     @staticmethod
@@ -41,11 +121,7 @@ class OCRChecker:
         Returns:
             str: string cleaned
         """
-        # Remove unwanted characters (keep alphanumeric and basic punctuation)
-        cleaned = regex.sub(r"[^a-zA-Z0-9\s\-%&]", '', text)  # Added '&' as a valid character
-        # Normalize whitespace
-        cleaned = regex.sub(r'\s+', ' ', cleaned).strip()
-        return cleaned.upper()
+        return clean_text(text)
         
     def validate(self,
             images,
@@ -53,9 +129,109 @@ class OCRChecker:
             product_class,
             alcohol_content,
             net_contents,
-            net_contents_unit
+            net_contents_unit,
+            progress: Optional[Callable[..., None]] = None,
+            annotate: bool = True
         ):
+        """Validates the form fields against the label images.
+
+        The images are read concurrently on the checker's pool (image_workers at a
+        time) and checked as each read finishes; images not started yet are
+        skipped once every field is verified.
+
+        Args:
+            images (List[bytes | DecodedImage]): label images
+            progress (Callable): called with image, images and check keyword arguments as work moves along
+            annotate (bool): draw the found boxes and re-encode the images, skip when only verifications are needed
+
+        Returns:
+            tuple: (verifications, oimages)
+                - verifications (Dict[str, bool]): whether each field was found
+                - oimages (List[bytes]): images with the found boxes drawn on, as jpg (the inputs if annotate is False)
+        """
+        if progress is None:
+            progress = lambda **fields: None
+        verifications, boxes, found_on, decoded = self._check_images(images, brand_name, product_class, alcohol_content, net_contents, net_contents_unit, progress)
+        oimages = images.copy()
+
+        #draw boxes on image for visualization/debugging
+        if annotate:
+            for i, image in decoded.items():
+                progress(image=i, check='annotate')
+                with metrics.time('ocr_stage_seconds', stage='annotate'):
+                    for key, boxlist in boxes.items():
+                        if found_on.get(key) == i:
+                            logger.debug(f'Drawing boxes for {key}: {boxlist}')
+                            image.draw_boxes(boxlist)
+                    #Convert back to bytes
+                    oimages[i] = image.encode('.jpg')
         
+        return verifications, oimages
+
+    def locate(self,
+            images,
+            brand_name,
+            product_class,
+            alcohol_content,
+            net_contents,
+            net_contents_unit,
+            progress: Optional[Callable[..., None]] = None
+        ):
+        """Validates like validate, returning where the fields were found instead of annotated images.
+
+        Nothing is drawn or re-encoded; the client draws the boxes over the images it uploaded,
+        and annotate_image renders an annotated copy when one is asked for.
+
+        Args:
+            images (List[bytes | DecodedImage]): label images
+            progress (Callable): called with image, images and check keyword arguments as work moves along
+
+        Returns:
+            tuple: (verifications, geometry)
+                - verifications (Dict[str, bool]): whether each field was found
+                - geometry (List[dict]): per image, its width and height (None if it was never read) and
+                  boxes, the [minx, miny, maxx, maxy] boxes of each field found on it
+        """
+        if progress is None:
+            progress = lambda **fields: None
+        verifications, boxes, found_on, decoded = self._check_images(images, brand_name, product_class, alcohol_content, net_contents, net_contents_unit, progress)
+        geometry = []
+        for i in range(len(images)):
+            image = decoded.get(i)
+            geometry.append({
+                'width': image.width if image is not None else None,
+                'height': image.height if image is not None else None,
+                'boxes': {key: [[int(round(v)) for v in box] for box in boxlist] for key, boxlist in boxes.items() if found_on.get(key) == i}
+            })
+        return verifications, geometry
+
+    @staticmethod
+    def annotate_image(imagedata: Union[bytes, DecodedImage], boxes: Dict[str, List[Sequence[int]]], ext: str = '.jpg', quality: Optional[int] = None) -> bytes:
+        """Draws the boxes of a locate geometry entry on an image and encodes it.
+
+        Args:
+            imagedata (bytes | DecodedImage): the image as uploaded
+            boxes (Dict[str, list]): [minx, miny, maxx, maxy] boxes per field
+            ext (str): cv2 format extension to encode as
+            quality (int): encoder quality for lossy formats, None for the default
+
+        Returns:
+            bytes: the encoded annotated image
+        """
+        image = DecodedImage.coerce(imagedata)
+        for boxlist in boxes.values():
+            image.draw_boxes(boxlist)
+        return image.encode(ext, quality)
+
+    def _check_images(self, images, brand_name, product_class, alcohol_content, net_contents, net_contents_unit, progress, use_cache: bool = True):
+        """Reads the images and runs the checks until every field is verified.
+
+        With use_cache False the checker's cache is neither read nor written.
+
+        Returns:
+            tuple: (verifications, boxes, found_on, decoded) where found_on maps each verified field
+            to the image it was found on and decoded holds the images that were read
+        """
         verifications = {
             'brand_name': False,
             'product_class': False,
@@ -70,178 +246,334 @@ class OCRChecker:
             'net_contents': [],
             'gov_warn': []
         }
+        # which image each field was verified on, its boxes are drawn there
+        found_on: Dict[str, int] = {}
         
         imagelen = len(images)
-        oimages = images.copy()
-        
-        i = 0
-        while i < imagelen and not all(verifications.values()):
-            imagedata = images[i]
-            image = cv2.imdecode(np.frombuffer(imagedata, np.uint8), cv2.IMREAD_COLOR)
-            height, width = image.shape[:2]
-            
-            ocrdata, rdix = self.process_image(imagedata)
-            # no need to redo if it is found already
-            if verifications['brand_name'] == False:
-                verifications['brand_name'], boxes['brand_name'] = self.check_brand_name(ocrdata, rdix,width, height, brand_name)
-            if verifications['product_class'] == False:
-                verifications['product_class'], boxes['product_class'] = self.check_product_class(ocrdata, rdix, width, height, product_class)
-            if verifications['alcohol_content'] == False:
-                verifications['alcohol_content'], boxes['alcohol_content'] = self.check_alcohol_content(ocrdata, rdix, width, height, alcohol_content)
-            if verifications['net_contents'] == False:
-                verifications['net_contents'], boxes['net_contents'] = self.check_net_contents(ocrdata, rdix, width, height, net_contents, net_contents_unit)
-            if verifications['gov_warn'] == False:
-                verifications['gov_warn'], boxes['gov_warn'] = self.check_government_warning(ocrdata, rdix, width, height)    
-            #TODO: do image rotations for better OCR if not all found
-            
-            #draw boxes on image for visualization/debugging
-            for key, boxlist in boxes.items():
-                logger.debug(f'Drawing boxes for {key}: {boxlist}')
-                for box in boxlist:
-                    cv2.rectangle(image, (box[0], box[1]), (box[2], box[3]), color=(0,255,0), thickness=2)
-            #Convert back to bytes
-            _, buffer = cv2.imencode('.jpg', image)
-            imagedata_with_boxes = buffer.tobytes()
-            oimages[i] = imagedata_with_boxes
-
-            i += 1 
-        
-        #TODO: Draw boxes on the images and return them for visualization
-        # for now, just return the original images
-        
-        return verifications, oimages
+        targets = self.fuzzy_targets(brand_name, product_class)
+        cache = self.cache if use_cache else None
+
+        # images are read concurrently, at most image_workers at a time so reads that turn out
+        # not to be needed are never started; results are checked here, one at a time, as they come in.
+        # per image: the decoded image, its ocrdata/rdix, the regions still to recognize when the backend
+        # reads on demand, and the rotations still to re-scan (None until planned)
+        decoded: Dict[int, DecodedImage] = {}
+        reads: Dict[int, tuple] = {}
+        staged: Dict[int, StagedRead] = {}
+        plans: Dict[int, Optional[List[int]]] = {}
+        # work items are (image, rotation), rotation None being the next batch of regions to recognize
+        todo = deque((i, 0) for i in range(imagelen))
+        pending = {}
+        progress(images=imagelen, check='ocr')
+        try:
+            while (todo or pending) and not all(verifications.values()):
+                while todo and len(pending) < self.image_workers:
+                    i, rotation = todo.popleft()
+                    if rotation is None:
+                        future = self.pool.submit(self._recognize, staged[i])
+                    else:
+                        future = self.pool.submit(self._read_image, decoded.get(i, images[i]), rotation, cache)
+                    pending[future] = (i, rotation)
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, rotation = pending.pop(future)
+                    if rotation is None:
+                        image, (ocrdata, rdix) = decoded[i], reads[i]
+                        self.merge_boxes(ocrdata, rdix, build_ocr_index(future.result())[0])
+                    else:
+                        image, result = future.result()
+                        decoded[i] = image
+                        if isinstance(result, StagedRead):
+                            # regions detected, nothing read yet
+                            staged[i] = result
+                            reads[i] = index_boxes([])
+                            todo.appendleft((i, None))
+                            continue
+                        if rotation == 0:
+                            reads[i] = result
+                            ocrdata, rdix = result
+                        else:
+                            ocrdata, rdix = reads[i]
+                            self.merge_boxes(ocrdata, rdix, result[0], rotation)
+                    # every box against every fuzzy target of this submission in one native call
+                    ocrdata.score(targets)
+                    for key in self._run_checks(verifications, boxes, ocrdata, image.width, image.height, brand_name, product_class, alcohol_content, net_contents, net_contents_unit, partial(progress, image=i)):
+                        found_on[key] = i
+                        # what is printed next to a found field is likely to be checked next
+                        if i in staged:
+                            for bbox in boxes[key]:
+                                staged[i].boost(bbox)
+                    if all(verifications.values()):
+                        break
+
+                    if i in staged and rotation is None:
+                        if not staged[i].finished:
+                            progress(image=i, check='recognize', regions=staged[i].remaining)
+                            todo.appendleft((i, None))
+                            continue
+                        # read in full after all, keep it for resubmissions
+                        if cache is not None:
+                            cache.put(self._cache_key(image, 0), ocrdata)
+                    # sideways text is only re-scanned while something is missing, in the orientations the label seems to have
+                    if self.rescan_rotations and plans.get(i) is None:
+                        progress(image=i, check='orientation')
+                        plans[i] = rotation_plan(image.pixels, upside_down=self.upside_down)
+                    if plans.get(i):
+                        # one rotation per image at a time, the next is only read if this one did not finish the job
+                        todo.append((i, plans[i].pop(0)))
+        finally:
+            # a read still running when everything is found finishes in the background, unused
+            for future in pending:
+                future.cancel()
+        if cache is not None:
+            # reads stopped part way are kept as they are, a resubmission picks them up where they stopped
+            for i, read in staged.items():
+                if not read.finished and not any(key == (i, None) for key in pending.values()):
+                    cache.put_state(self._staged_key(decoded[i]), read.state())
+        for i in decoded:
+            boxcount = len(reads[i][0]) if i in reads else 0
+            metrics.inc('ocr_images_total')
+            metrics.inc('ocr_boxes_total', boxcount)
+            metrics.observe('ocr_boxes_per_image', boxcount)
+        return verifications, boxes, found_on, decoded
     
-    def process_image (self, imagedata: bytes):
+    def _run_checks(self, verifications, boxes, ocrdata, width, height, brand_name, product_class, alcohol_content, net_contents, net_contents_unit, progress) -> List[str]:
+        # no need to redo if it is found already
+        missing = [key for key, found in verifications.items() if not found]
+        if verifications['brand_name'] == False:
+            progress(check='brand_name')
+            with metrics.time('ocr_stage_seconds', stage='check_brand_name'):
+                verifications['brand_name'], boxes['brand_name'] = self.check_brand_name(ocrdata, width, height, brand_name)
+        if verifications['product_class'] == False:
+            progress(check='product_class')
+            with metrics.time('ocr_stage_seconds', stage='check_product_class'):
+                verifications['product_class'], boxes['product_class'] = self.check_product_class(ocrdata, width, height, product_class)
+        if verifications['alcohol_content'] == False:
+            progress(check='alcohol_content')
+            with metrics.time('ocr_stage_seconds', stage='check_alcohol_content'):
+                verifications['alcohol_content'], boxes['alcohol_content'] = self.check_alcohol_content(ocrdata, width, height, alcohol_content)
+        if verifications['net_contents'] == False:
+            progress(check='net_contents')
+            with metrics.time('ocr_stage_seconds', stage='check_net_contents'):
+                verifications['net_contents'], boxes['net_contents'] = self.check_net_contents(ocrdata, width, height, net_contents, net_contents_unit)
+        if verifications['gov_warn'] == False:
+            progress(check='gov_warn')
+            with metrics.time('ocr_stage_seconds', stage='check_government_warning'):
+                verifications['gov_warn'], boxes['gov_warn'] = self.check_government_warning(ocrdata, width, height)
+        # the fields this image verified
+        return [key for key in missing if verifications[key]]
+
+    def _read_image(self, imagedata: Union[bytes, DecodedImage], rotation: int, cache: Optional[OCRCache]):
+        # runs on the image pool: decoding happens here too so it overlaps with the other images' OCR
+        if isinstance(imagedata, DecodedImage):
+            image = imagedata
+        else:
+            with metrics.time('ocr_stage_seconds', stage='decode'):
+                image = DecodedImage.from_bytes(imagedata)
+        if rotation == 0 and self.recognize_on_demand and self.backend.staged:
+            state = None
+            if cache is not None:
+                cached = cache.get(self._cache_key(image, 0))
+                if cached is not None:
+                    return image, cached
+                # an earlier submission stopped recognizing part way: resume it, detection included
+                state = cache.get_state(self._staged_key(image))
+            if state is not None:
+                started = self.backend.start(image, batch_size=self.recognize_batch, regions=[Region.from_json(region) for region in state['regions']])
+                if started is not None:
+                    started.restore(state)
+            else:
+                with metrics.time('ocr_stage_seconds', stage='detect'):
+                    started = self.backend.start(image, batch_size=self.recognize_batch)
+            if started is not None:
+                return image, started
+        return image, self._cached_read(image, rotation, cache)
+
+    @staticmethod
+    def _recognize(staged: StagedRead) -> list:
+        with metrics.time('ocr_stage_seconds', stage='recognize'):
+            return staged.next_batch()
+
+    def _cache_key(self, image: DecodedImage, rotation: int) -> str:
+        return cache_key(image.data, f'{self.backend.cache_key()}:rotation={rotation % 360}')
+
+    def _staged_key(self, image: DecodedImage) -> str:
+        # regions detected and recognized so far by a read that stopped early, the batch size does not change them
+        return cache_key(image.data, f'{self.backend.cache_key()}:staged')
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        """Threads the images of a submission are read on, shared by every validate call of this checker."""
+        # a pool created before a fork (preloaded server) has no threads in the child, start another
+        if self._pool is None or self._pool_pid != os.getpid():
+            with self._pool_lock:
+                if self._pool is None or self._pool_pid != os.getpid():
+                    self._pool = ThreadPoolExecutor(max_workers=self.image_workers, thread_name_prefix='ocr-image')
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+    @staticmethod
+    def merge_boxes(ocrdata: OCRResult, rdix: BoxIndex, new: Dict[int, Dict[str, Any]], rotation: int = 0) -> List[int]:
+        """Adds the boxes of a later read (rotated re-scan, recognized regions) to an image's ocrdata and box index.
+
+        Args:
+            ocrdata (OCRResult): the image's OCR data, extended in place
+            rdix (BoxIndex): the image's box index, extended in place
+            new (dict): ocrdata of the later read, already in upload coordinates
+            rotation (int): clockwise rotation it was read at, kept on each box if not 0
+
+        Returns:
+            List[int]: ids of the added boxes
+        """
+        entries = [dict(entry, rotation=rotation) if rotation else entry for entry in new.values() if clean_text(entry['text'])]
+        ids = ocrdata.add_boxes(entries)
+        rdix.extend(ids, [entry['bbox'] for entry in entries], [entry['confidence'] for entry in entries])
+        return ids
+
+    def process_image (self, imagedata: Union[bytes, DecodedImage], rotation: int = 0):
         """Process image with OCR and extract text with bounding boxes.
 
         Args:
-            imagedata (bytes): The image data in bytes
+            imagedata (bytes | DecodedImage): The image data in bytes or the already decoded image
+            rotation (int): read the image turned clockwise by this many degrees (0, 90, 180, 270); boxes are still in the image's coordinates
 
         Raises:
-            ValueError: If unsupported OCR model is specified
+            ValueError: If the image cannot be decoded
             
         Returns:
-            tuple: (ocrdata, rdix, width, height)
-                - ocrdata (Dict[int, dict[str, Any]]): OCR data with rdix ids as keys
-                - rdix (rtree.index.Index): rtree index of bounding boxes
+            tuple: (ocrdata, rdix)
+                - ocrdata (OCRResult): OCR data with rdix ids as keys, text normalized once
+                - rdix (BoxIndex): spatial index of bounding boxes
         """
+        return self._cached_read(DecodedImage.coerce(imagedata), rotation, self.cache)
+
+    def _cached_read(self, image: DecodedImage, rotation: int, cache: Optional[OCRCache]):
         #Holds found text, confidence, bounding box. uses an id
-        ocrdata : Dict[int, dict[str, Any]] = {}
-        rdix : rtree.index.Index
-        match self.modelname:
-            case 'easyocr':
-                ocrdata, rdix = self.get_easy_data(imagedata)
-            case '_':
-                raise ValueError(f"Unsupported OCR model: {self.modelname}")        
+        ocrdata : OCRResult
+        rdix : BoxIndex
+        if cache is None:
+            return self._read(image, rotation)
+        key = self._cache_key(image, rotation)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        ocrdata, rdix = self._read(image, rotation)
+        cache.put(key, ocrdata)
         return ocrdata, rdix
 
+    def warm_up(self, imagedata: Union[bytes, DecodedImage], brand_name: str, product_class: str, alcohol_content: str, net_contents: str, net_contents_unit: str) -> Dict[str, bool]:
+        """Validates an image the way a submission is validated, with this checker's preprocessing and staged reads.
 
-    def check_government_warning(self, ocrdata: Dict[int, dict[str, Any]], rdix: rtree.index.Index, width: int, height: int) -> bool:
-        """Checks for government warning in the text. Tends to be in all caps and words are together. Simple to just look for the phrase.
+        Used at startup so the first real submission doesn't pay for the model's first inference or anything
+        else built on first use. The cache is left out: it would answer for the model, and an entry written for
+        a label nobody submits is never read again.
+
+        Returns:
+            Dict[str, bool]: whether each field was found
+        """
+        verifications, _, _, _ = self._check_images([DecodedImage.coerce(imagedata)], brand_name, product_class, alcohol_content, net_contents, net_contents_unit, lambda **fields: None, use_cache=False)
+        return verifications
+
+    def _read(self, image: DecodedImage, rotation: int):
+        if rotation % 360 == 0:
+            with metrics.time('ocr_stage_seconds', stage='ocr'):
+                return self.backend.read(image)
+        with metrics.time('ocr_stage_seconds', stage='ocr'):
+            ocrdata, _ = self.backend.read(rotate(image, rotation))
+        return index_boxes([
+            (entry['text'], entry['confidence'], unrotate_bbox(entry['bbox'], rotation, image.width, image.height))
+            for entry in ocrdata.values()
+        ])
+
+
+    def check_government_warning(self, ocrdata: Dict[int, dict[str, Any]], width: int, height: int) -> bool:
+        """Checks for the government warning: its heading and both clauses of the mandated statement.
+
+        With warning_text off only the GOVERNMENT WARNING heading is looked for.
 
         Args:
             ocrdata (Dict[int, dict[str, Any]]): OCR data with rdix ids as keys
-            rdix (rtree.index.Index): rtree index of bounding boxes
 
         Returns:
             bool: True if present, false if not
             list: list of bounding boxes for the found text
         """
-        ocr_texts = [entry['text'].upper() for entry in ocrdata.values()]
-        
-        for i in ocrdata.keys():
-            ctext = self.clean_text(ocrdata[i]['text'])
-            cid = ocrdata[i]
-            if len(ctext) > 10 and fuzz.partial_ratio("GOVERNMENT WARNING", ctext.upper()) > 80:
-                return True, [ocrdata[i]['bbox']]
-        return False, []
+        ocrdata = OCRResult.wrap(ocrdata)
+        if not self.warning_text:
+            return self._check_warning_heading(ocrdata)
+        clauses = self.verify_government_warning(ocrdata)
+        missing = [name for name, clause in clauses.items() if not clause.found]
+        if missing:
+            logger.debug(f'Government warning incomplete, missing {missing}: {clauses}')
+            return False, []
+        ids = dict.fromkeys(i for clause in clauses.values() for i in clause.ids)
+        return True, [ocrdata[i]['bbox'] for i in ids]
+
+    def verify_government_warning(self, ocrdata: Dict[int, dict[str, Any]]) -> Dict[str, ClauseMatch]:
+        """Finds each clause of the government warning in one pass over the image's text in reading order.
+
+        Args:
+            ocrdata (Dict[int, dict[str, Any]]): OCR data with rdix ids as keys
+
+        Returns:
+            dict: clause name (heading, pregnancy, machinery) to its ClauseMatch with coverage and boxes
+        """
+        return compile_warning_matcher().verify(OCRResult.wrap(ocrdata))
+
+    def _check_warning_heading(self, ocrdata: OCRResult) -> tuple:
+        """Looks for the GOVERNMENT WARNING heading alone, in one box or split over neighbouring boxes."""
+        matcher = compile_matcher("GOVERNMENT WARNING", ratio_threshold=None, partial_threshold=80, partial_min_length=11)
+        i = matcher.first(ocrdata)
+        if i is not None:
+            return True, [ocrdata[i]['bbox']]
+        # GOVERNMENT and WARNING read as boxes of their own
+        return self._find_split(ocrdata, "GOVERNMENT WARNING", threshold=80)
+
+    def _find_split(self, ocrdata: OCRResult, phrase: str, threshold: float = 85) -> tuple:
+        """Looks for a phrase split over neighbouring boxes in the image's layout.
+
+        Args:
+            ocrdata (OCRResult): normalized OCR data
+            phrase (str): text to look for, cleaned before matching
+            threshold (float): partial_ratio needed against the joined text of the boxes
+
+        Returns:
+            bool: True if found, false if not
+            list: bounding boxes of the boxes it was found on
+        """
+        target = clean_text(phrase)
+        if len(target.split()) < 2:
+            return False, []
+        ids = Layout.of(ocrdata).find(target, threshold)
+        if ids is None:
+            return False, []
+        logger.debug(f'Found "{target}" split over {[ocrdata.clean[i] for i in ids]}')
+        return True, [ocrdata[i]['bbox'] for i in ids]
 
-    def check_brand_name(self, ocrdata: Dict[int, dict[str, Any]], rdix: rtree.index.Index, width: int, height: int, brand_name: str) -> bool:
+    def check_brand_name(self, ocrdata: Dict[int, dict[str, Any]], width: int, height: int, brand_name: str) -> bool:
         """Checks for brand name in the text
 
         Args:
             ocrdata (Dict[int, dict[str, Any]]): OCR data with rdix ids as keys
-            rdix (rtree.index.Index): rtree index of bounding boxes
             brand_name (str): brand name to check
 
         Returns:
             bool: True if present, false if not
         """
         # Brand name is generally in bigger text, but may be split across boxes. Also may have OCR errors due to 'fancy' fonts
-        for i in ocrdata.keys():
-            ctext = self.clean_text(ocrdata[i]['text'])
-            cid = ocrdata[i]
-            if fuzz.ratio(brand_name.upper(), ctext) > 75 or (len(ctext) > len(brand_name) and fuzz.partial_ratio(brand_name.upper(), ctext) > 85):
-                return True, [ocrdata[i]['bbox']]
+        ocrdata = OCRResult.wrap(ocrdata)
+        i = compile_matcher(brand_name).first(ocrdata)
+        if i is not None:
+            return True, [ocrdata[i]['bbox']]
             
-        #Chain Textbox finding (searches within padding #s for the label name)
-        brand_tokens = brand_name.split()
-        ctoken = brand_tokens[0].upper()
-        logger.debug(f'Brand tokens: {brand_tokens}')
-        found_cids = []
-        if len(brand_tokens) > 1: 
-            for i in ocrdata.keys():
-                ctext = self.clean_text(ocrdata[i]['text'])
-                if fuzz.ratio(ctoken, ctext) > 75 or (len(ctext) > len(brand_name) and fuzz.partial_ratio(ctoken, ctext) > 85):
-                    #GOT FIRST TOKEN, NOW SEARCH NEARBY AND CHAIN
-                    #get bbox dimensions (minx, miny, maxx, maxy)
-                    #get padding
-                    #search until end of tokens or no match found
-                    logger.debug(f'Found ctext "{ctext}" for first token "{ctoken}" @ bbox {ocrdata[i]["bbox"]}')
-                    cbox = ocrdata[i]['bbox']
-                    found_cids.append(i)
-                    break
-            if len(found_cids) == 0:
-                #could not find first token
-                logger.debug(f'Could not find first token "{ctoken}"')
-                return False, []
-            j = 0
-            while j < len(brand_tokens)-1:
-                newfound = False
-                logger.debug(f'Looking for token: {brand_tokens[j+1]}')
-                #5% of the total image width/height or the size of the box proportionate to the number of characters in it. 
-                charcount = len(brand_tokens[j])
-                #use three character widths to allow for spacing
-                xpad = max(width * 0.05, ((cbox[2] - cbox[0])//charcount)*3)
-                #Use half the height of the box as vertical padding
-                ypad = max(height * 0.05, (cbox[3] - cbox[1])//2)
-                
-                #left and right of item box
-                search_area = (cbox[0], cbox[1], cbox[2] + xpad, cbox[3] + ypad)
-                possible_ids = list(rdix.intersection(search_area))
-                logger.debug(f'Searching for token "{brand_tokens[j+1]}" in area {search_area}')
-                logger.debug(f'Possible IDs for token "{brand_tokens[j+1]}": {possible_ids}')
-                for pid in possible_ids:
-                    ptext = self.clean_text(ocrdata[pid]['text'])
-                    logger.debug(f'Comparing to possible text: "{ptext}"')
-                    if (fuzz.ratio(brand_tokens[j+1].upper(), ptext) > 75 or (len(ptext) > len(brand_tokens[j+1]) and fuzz.partial_ratio(brand_tokens[j+1].upper(), ptext) > 85)) and pid not in found_cids:
-                        #found next token
-                        cbox = ocrdata[pid]['bbox']
-                        found_cids.append(pid)
-                        j += 1
-                        newfound = True
-                        logger.debug(f'Found token "{brand_tokens[j]}" as "{ptext}"')
-                        break
-                if not newfound:
-                    #could not find next token
-                    logger.debug(f'Could not find token "{brand_tokens[j+1]}"')
-                    return False, []
-            logger.debug(f'Found all tokens for brand name "{brand_name}": {found_cids}; j is {j}, len is {len(brand_tokens)}')
-            if j == len(brand_tokens)-1:
-                oboxes = []
-                for cid in found_cids:
-                    logger.debug(f'Box for token: {ocrdata[cid]["text"]} is {ocrdata[cid]["bbox"]}')
-                    oboxes.append(ocrdata[cid]["bbox"])
-                return True, oboxes
+        # split over boxes on a line or broken over lines, e.g. a big first word on its own
+        return self._find_split(ocrdata, brand_name)
 
-        return False, []
-
-    def check_product_class(self, ocrdata: Dict[int, dict[str, Any]], rdix: rtree.index.Index, width: int, height: int, product_class: str) -> bool:
+    def check_product_class(self, ocrdata: Dict[int, dict[str, Any]], width: int, height: int, product_class: str) -> bool:
         """Checks for product class in the text
 
         Args:
             ocrdata (Dict[int, dict[str, Any]]): OCR data with rdix ids as keys
-            rdix (rtree.index.Index): rtree index of bounding boxes
             product_class (str): product class to check
 
         Returns:
@@ -249,22 +581,18 @@ class OCRChecker:
             list: list of bounding boxes for the found text
         """
         # Product class should be in close proximity to brand name, usually below it; multiple words should be close together
-        
-        for i in ocrdata.keys():
-            ctext = self.clean_text(ocrdata[i]['text'])
-            cid = ocrdata[i]
-            if fuzz.ratio(product_class.upper(), ctext) > 75 or (len(ctext) > len(product_class) and fuzz.partial_ratio(product_class.upper(), ctext) > 85):
-                return True, [ocrdata[i]['bbox']]
-        ## TODO: check for split text boxes
-        return False, []
+        ocrdata = OCRResult.wrap(ocrdata)
+        i = compile_matcher(product_class).first(ocrdata)
+        if i is not None:
+            return True, [ocrdata[i]['bbox']]
+        return self._find_split(ocrdata, product_class)
 
-    def check_alcohol_content(self, ocrdata: Dict[int, dict[str, Any]], rdix: rtree.index.Index, width: int, height: int, alcohol_content: str) -> bool:
+    def check_alcohol_content(self, ocrdata: Dict[int, dict[str, Any]], width: int, height: int, alcohol_content: str) -> bool:
         """Checks for alcohol content in the text
         Alcohol/Alc may be before it or after it. By Volume is always after both. Ideally it's in one string, but may be in multiple boxes
 
         Args:
             ocrdata (Dict[int, dict[str, Any]]): OCR data with rdix ids as keys
-            rdix (rtree.index.Index): rtree index of bounding boxes
             alcohol_content (str): alcohol content to check
 
         Returns:
@@ -273,120 +601,58 @@ class OCRChecker:
         """
         #Must account for different formats of alcohol content
         # e.g., "40% Alcohol by Volume", "40% Alc by Vol", "Alcohol 40% by Volume", Alc 40% by Vol and 40% Alc/Vol among others"
-        # regex would be ideal, but fuzzy matching may be more reliable given OCR errors
-        # this means all variations must be generated and checked to utilize fuzzy matching
-        abvlist = [  f"{alcohol_content}% ALCOHOL BY VOLUME",
-                                f"{alcohol_content}% ALC BY VOLUME",
-                                f"{alcohol_content}% ALCOHOL BY VOL",
-                                f"{alcohol_content}% ALC BY VOL",
-                                f"{alcohol_content}% ALC/VOL",
-                                f"ALCOHOL {alcohol_content}% BY VOLUME",
-                                f"ALC {alcohol_content}% BY VOLUME",
-                                f"ALCOHOL {alcohol_content}% BY VOL",
-                                f"ALC {alcohol_content}% BY VOL"]
-
-        #would be 'faster' to search boxes by the alcohol_content and then look for the rest, but fuzzy matching may be inaccurate that way
-        for i in ocrdata.keys():
-            ctext = self.clean_text(ocrdata[i]['text'])
-            cid = ocrdata[i]
-            for abvformat in abvlist:
-                if fuzz.ratio(abvformat, ctext) > 75 or (len(ctext) > len(abvformat) and fuzz.partial_ratio(abvformat, ctext) > 75):
-                    #extract text and double check on the number
-                    alcohol_number = self.extract_alcohol_number(ctext)
-                    logger.debug(f'Found alcohol content text "{ctext}" matching format "{abvformat}"\n with extracted number "{alcohol_number}" vs input "{alcohol_content}"')
-                    if alcohol_number == alcohol_content:
-                        return True, [ocrdata[i]['bbox']]
-        #TODO: find alcohol by volume in split boxes from the number
-        return False, []
+        # number + % is found first with a regex, then the alcohol/volume wording is looked for around it once,
+        # in the same box or split into the boxes next to it
+        ocrdata = OCRResult.wrap(ocrdata)
+        return compile_abv_matcher(alcohol_content).find(ocrdata)
     
-    def extract_alcohol_number(self, text: str) -> str:
-        """Extracts the alcohol number from a given text string.
-        Args:
-            text (str): The text string to extract from.
-        Returns:
-            str: The extracted alcohol number as a string, or an empty string if not found.
-        """
-        match = regex.search(r'(\d{1,2}(\.\d{1,2})?)\s*%', text)
-        if match:
-            return match.group(1)
-        return ""
-
-    def check_net_contents(self, ocrdata: Dict[int, dict[str, Any]], rdix: rtree.index.Index, width: int, height: int, net_contents: str, net_contents_unit: str) -> bool:
+    def check_net_contents(self, ocrdata: Dict[int, dict[str, Any]], width: int, height: int, net_contents: str, net_contents_unit: str) -> bool:
         """Checks for net contents in the text
-        Text should be close together and not in abstracted locations
+        Text should be close together and not in abstracted locations; 1.5 L on the label verifies 1500 ml
         Args:
             ocrdata (Dict[int, dict[str, Any]]): OCR data with rdix ids as keys
-            rdix (rtree.index.Index): rtree index of bounding boxes
             net_contents (str): net contents to check
-            net_contents_unit (str): net contents unit to check
+            net_contents_unit (str): net contents unit to check (ml, cl, L, fl oz)
 
         Returns:
             bool: True if present, false if not
             list: list of bounding boxes for the found text
         """
-        if net_contents_unit == 'L':
-            # Check for liter/liters. Unit must account for L, Liter, Liters
-            if net_contents == '1':
-                fullnet = f"{net_contents} LITER".strip().upper()
-            else:
-                fullnet = f"{net_contents} LITERS".strip().upper()
-            for i in ocrdata.keys():
-                ctext = self.clean_text(ocrdata[i]['text'])
-                cid = ocrdata[i]
-                if fuzz.ratio(fullnet, ctext) > 75 or (len(ctext) > len(fullnet) and fuzz.partial_ratio(fullnet, ctext) > 85):
-                    return True, [ocrdata[i]['bbox']]
-            ##TODO: check for split text and use of L instead of Liters
+        # every volume on the image is parsed once into milliliters, so any unit verifies any other
+        ocrdata = OCRResult.wrap(ocrdata)
+        value, unit = parse_number(net_contents or ''), normalize_unit(net_contents_unit)
+        if value is None or unit is None:
+            logger.debug(f'Net contents "{net_contents} {net_contents_unit}" is not a volume')
             return False, []
+        found = QuantityIndex.of(ocrdata).find_volume(value, unit, decimals(net_contents))
+        if found:
+            logger.debug(f'Net contents {value:g} {unit} found as "{found[0].text}"')
+            return True, [ocrdata[i]['bbox'] for i in found[0].ids]
+        return False, []
 
-        ## big enough for a large match
-        if net_contents_unit == 'fl oz':
-            fullnet = f"{net_contents} {net_contents_unit}".strip().upper()
-            for i in ocrdata.keys():
-                ctext = self.clean_text(ocrdata[i]['text'])
-                cid = ocrdata[i]
-                if fuzz.ratio(fullnet, ctext) > 78:
-                    return True, [ocrdata[i]['bbox']]
-                # TODO: Check nearby boxes for split text when dealing with ml and L; more straight forward with fl oz
-            return False, []
-                
-        if net_contents_unit == 'ml':
-            # Check for milliliters
-            fullnet = f"{net_contents} {net_contents_unit}".strip().upper()
-            for i in ocrdata.keys():
-                ctext = self.clean_text(ocrdata[i]['text'])
-                cid = ocrdata[i]
-                ## direct match, use ratio; for a larger grab use partial ratio
-                if fuzz.ratio(fullnet, ctext) > 78 or (len(ctext) > len(fullnet) and fuzz.partial_ratio(fullnet, ctext) > 85):
-                    return True, [ocrdata[i]['bbox']]
-            #if no full can be found, check for split
-            #TODO: implement split check
-            return False, []
+    def fuzzy_targets(self, brand_name: str, product_class: str) -> List[str]:
+        """Target strings the fuzzy checks score boxes against, so they can be scored together.
+
+        Only the whole-box matchers score: brand name and product class, and the warning heading when it is
+        checked alone. Phrases split over boxes go through the layout, the full warning through its own matcher.
+
+        Args:
+            brand_name (str): brand name from the form
+            product_class (str): product class from the form
+
+        Returns:
+            list: uppercase targets
+        """
+        targets = [(brand_name or '').upper(), (product_class or '').upper()]
+        if not self.warning_text:
+            targets.append("GOVERNMENT WARNING")
+        return targets
 
-        pass
-        
     @staticmethod
-    def get_easy_data(imagedata: bytes) -> List[Dict[str, Any]]:
-        
-        
-        reader = easyocr.Reader(['en'])
-        result = reader.readtext(imagedata)
-        out = {}
-        ridx = rtree.index.Index()
-        bbid_counter = 0
-        text=""
-        for (bbox, text, prob) in result:
-            verts = [{"x": int(v[0]), "y": int(v[1])} for v in bbox]
-            minx = int(min(v[0] for v in bbox))
-            miny = int(min(v[1] for v in bbox))
-            maxx = int(max(v[0] for v in bbox))
-            maxy = int(max(v[1] for v in bbox))
-            ridx.insert(bbid_counter, (minx, miny, maxx, maxy))
-            finding = {
-                "text": text,
-                "confidence": round(float(prob), 4),
-                "bbox": (minx, miny, maxx, maxy)
-            }
-            out[bbid_counter] = finding
-            bbid_counter += 1
-            
-        return out, ridx
\ No newline at end of file
+    def model_stats() -> List[Dict[str, Any]]:
+        """Load time and resident memory of the models loaded in this process.
+
+        Returns:
+            list: one dict per loaded model
+        """
+        return registry.stats()
@@ -0,0 +1,92 @@
+"""Decoded upload shared by the whole validation pipeline.
+
+An upload is decoded once. The OCR backend, the box drawing and the encoder
+all work on the same pixel buffer, and the original bytes are kept for
+anything that needs them (hashing, replay fixtures).
+"""
+from typing import List, Optional, Tuple, Union
+from functools import cached_property
+
+import cv2
+import numpy as np
+
+# formats the encoder takes a quality for
+QUALITY_PARAMS = {
+    '.jpg': cv2.IMWRITE_JPEG_QUALITY,
+    '.webp': cv2.IMWRITE_WEBP_QUALITY
+}
+
+
+class DecodedImage:
+    """An uploaded image decoded once.
+
+    Attributes:
+        data (bytes): the original encoded bytes
+        pixels (np.ndarray): BGR pixel buffer, drawn on in place when annotating
+        width (int): image width in pixels
+        height (int): image height in pixels
+    """
+
+    def __init__(self, data: bytes, pixels: np.ndarray):
+        self.data = data
+        self.pixels = pixels
+        self.height, self.width = pixels.shape[:2]
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'DecodedImage':
+        """Decodes encoded image bytes.
+
+        Args:
+            data (bytes): encoded image bytes
+
+        Raises:
+            ValueError: If the bytes are not a decodable image
+
+        Returns:
+            DecodedImage: the decoded image
+        """
+        # frombuffer is a view on the bytes, imdecode makes the only copy
+        pixels = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if pixels is None:
+            raise ValueError("Could not decode image")
+        return cls(data, pixels)
+
+    @classmethod
+    def coerce(cls, image: Union[bytes, 'DecodedImage']) -> 'DecodedImage':
+        """Returns image as a DecodedImage, decoding it only if it is still bytes."""
+        if isinstance(image, DecodedImage):
+            return image
+        return cls.from_bytes(image)
+
+    @cached_property
+    def gray(self) -> np.ndarray:
+        """Grayscale copy of the pixels, converted on first use (recognition works on gray)."""
+        return cv2.cvtColor(self.pixels, cv2.COLOR_BGR2GRAY)
+
+    @property
+    def rgb(self) -> np.ndarray:
+        """RGB copy of the pixels for engines that take arrays as RGB, converted on every use (not kept next to the pixels)."""
+        return cv2.cvtColor(self.pixels, cv2.COLOR_BGR2RGB)
+
+    def draw_boxes(self, boxes: List[Tuple[int, int, int, int]], color: Tuple[int, int, int] = (0, 255, 0), thickness: int = 2):
+        """Draws (minx, miny, maxx, maxy) boxes onto the pixel buffer in place."""
+        for box in boxes:
+            cv2.rectangle(self.pixels, (box[0], box[1]), (box[2], box[3]), color=color, thickness=thickness)
+
+    def encode(self, ext: str = '.jpg', quality: Optional[int] = None) -> bytes:
+        """Encodes the pixel buffer.
+
+        Args:
+            ext (str): cv2 format extension
+            quality (int): 1-100 for .jpg and .webp, ignored for lossless formats; None for cv2's default
+
+        Returns:
+            bytes: encoded image
+        """
+        params = []
+        if quality is not None and ext in QUALITY_PARAMS:
+            params = [QUALITY_PARAMS[ext], int(quality)]
+        ok, buffer = cv2.imencode(ext, self.pixels, params)
+        if not ok:
+            raise ValueError(f"Could not encode image as {ext}")
+        return buffer.tobytes()
@@ -0,0 +1,240 @@
+"""Lines and reading order of an image's boxes, built once.
+
+OCR splits a label's phrases over boxes whenever the words are spaced,
+differently sized or broken over lines, and a check looking for "SAMUEL
+ADAMS" or "GOVERNMENT WARNING" one box at a time misses them. Searching
+around each candidate box for the next word costs a geometric query per
+token per check. Layout instead groups the boxes once per image:
+
+    lines    boxes overlapping vertically, left to right, split where the
+             gap between two boxes is wider than a few characters (columns)
+    blocks   lines stacked directly under each other (a phrase broken over
+             lines), in reading order
+
+Each line and block carries its boxes' cleaned text joined by spaces, with
+the offset at which every box starts, so a multi-box phrase is found with
+one fuzzy alignment against the block texts and mapped back to its boxes.
+
+Boxes of rotated re-scans are laid out in the frame they were read in, and
+boxes much taller than wide as text running up the label, so sideways text
+forms lines of its own.
+"""
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence
+import logging
+
+import numpy as np
+from rapidfuzz import fuzz as rfuzz
+
+try:
+    from .ocr_result import OCRResult
+    from .metrics import metrics
+except ImportError:
+    from ocr_result import OCRResult
+    from metrics import metrics
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# boxes on one line overlap vertically by at least this share of the lower one
+LINE_OVERLAP = 0.5
+# a gap wider than this many line heights starts a new line (next column)
+COLUMN_GAP = 1.5
+# a line starts no further than this many line heights under the one above it to continue its block
+BLOCK_GAP = 0.8
+# an unrotated box this many times taller than wide holds sideways text
+VERTICAL_ASPECT = 2
+
+
+class Span:
+    """Boxes read as one string: a line or a block.
+
+    Attributes:
+        ids (List[int]): rdix ids in reading order
+        text (str): the boxes' cleaned text joined by spaces
+        starts (List[int]): offset of each box's text in text
+    """
+
+    def __init__(self, ids: Sequence[int], texts: Sequence[str]):
+        self.ids = list(ids)
+        self.starts = []
+        offset = 0
+        for text in texts:
+            self.starts.append(offset)
+            offset += len(text) + 1
+        self.text = ' '.join(texts)
+
+    def boxes_at(self, start: int, end: int) -> List[int]:
+        """rdix ids of the boxes covering text[start:end]."""
+        first = max(bisect_right(self.starts, start) - 1, 0)
+        last = max(bisect_right(self.starts, max(end - 1, start)) - 1, 0)
+        return self.ids[first:last + 1]
+
+    def __repr__(self):
+        return f'Span({self.text!r})'
+
+
+def _upright(bounds: np.ndarray, rotation: int) -> np.ndarray:
+    """Boxes in the frame of an image turned clockwise by rotation, where their text reads left to right."""
+    minx, miny, maxx, maxy = bounds.T
+    match rotation % 360:
+        case 90:
+            # (x, y) goes to (-y, x)
+            return np.stack([-maxy, minx, -miny, maxx], axis=1)
+        case 180:
+            return np.stack([-maxx, -maxy, -minx, -miny], axis=1)
+        case 270:
+            # (x, y) goes to (y, -x)
+            return np.stack([miny, -maxx, maxy, -minx], axis=1)
+        case _:
+            return bounds
+
+
+class Layout:
+    """Lines, blocks and the neighbor graph of one image's boxes.
+
+    Attributes:
+        lines (List[Span]): every line, in reading order per rotation
+        blocks (List[Span]): lines stacked into blocks, in reading order per rotation
+        right (Dict[int, int]): rdix id to the next box on its line
+        below (Dict[int, int]): rdix id to the most overlapping box on the next line of its block
+        line_of (Dict[int, int]): rdix id to its line's index in lines
+        block_of (Dict[int, int]): rdix id to its block's index in blocks
+    """
+
+    def __init__(self, result: OCRResult):
+        self.lines: List[Span] = []
+        self.blocks: List[Span] = []
+        self.right: Dict[int, int] = {}
+        self.below: Dict[int, int] = {}
+        self.line_of: Dict[int, int] = {}
+        self.block_of: Dict[int, int] = {}
+        self._clean = result.clean
+        ids = [i for i in result.ids if result.clean[i]]
+        if not ids:
+            return
+        bounds = np.array([result[i]['bbox'] for i in ids], dtype=np.float64)
+        rotations = np.array([result[i].get('rotation', 0) % 360 for i in ids])
+        # sideways text the model read as is: a word or more in a box much taller than wide
+        lengths = np.array([result.lengths[i] for i in ids])
+        tall = (bounds[:, 3] - bounds[:, 1] > VERTICAL_ASPECT * (bounds[:, 2] - bounds[:, 0])) & (lengths >= 3)
+        rotations[(rotations == 0) & tall] = 90
+        for rotation in np.unique(rotations):
+            rows = np.flatnonzero(rotations == rotation)
+            self._layout([ids[row] for row in rows], _upright(bounds[rows], int(rotation)))
+
+    @classmethod
+    def of(cls, result: OCRResult) -> 'Layout':
+        """The layout of an image's boxes, built on first use and kept until boxes are added."""
+        if result.layout is None:
+            with metrics.time('ocr_stage_seconds', stage='layout'):
+                result.layout = cls(result)
+        return result.layout
+
+    def _layout(self, ids: List[int], bounds: np.ndarray):
+        heights = bounds[:, 3] - bounds[:, 1]
+        centers = (bounds[:, 1] + bounds[:, 3]) / 2
+        # lines: boxes by vertical center, joining the current line while they overlap it enough
+        rows_by_line: List[List[int]] = []
+        top = bottom = None
+        for row in np.argsort(centers, kind='stable'):
+            if top is not None:
+                overlap = min(bottom, bounds[row, 3]) - max(top, bounds[row, 1])
+                if overlap >= LINE_OVERLAP * min(bottom - top, heights[row]):
+                    rows_by_line[-1].append(row)
+                    continue
+            rows_by_line.append([row])
+            top, bottom = bounds[row, 1], bounds[row, 3]
+        # split lines into columns where the gap is too wide, left to right within each
+        segments = []
+        for rows in rows_by_line:
+            rows.sort(key=lambda row: bounds[row, 0])
+            height = float(np.median(heights[rows]))
+            current = [rows[0]]
+            for prev, row in zip(rows, rows[1:]):
+                if bounds[row, 0] - bounds[prev, 2] > COLUMN_GAP * max(height, 1):
+                    segments.append(current)
+                    current = []
+                current.append(row)
+            segments.append(current)
+        # reading order: top to bottom, left to right
+        extents = [(bounds[rows, 0].min(), bounds[rows, 1].min(), bounds[rows, 2].max(), bounds[rows, 3].max(), float(np.median(heights[rows])))
+                   for rows in segments]
+        order = sorted(range(len(segments)), key=lambda n: (extents[n][1], extents[n][0]))
+        first_line = len(self.lines)
+        for n in order:
+            rows = segments[n]
+            for a, b in zip(rows, rows[1:]):
+                self.right[ids[a]] = ids[b]
+            for row in rows:
+                self.line_of[ids[row]] = len(self.lines)
+            self.lines.append(Span([ids[row] for row in rows], [self._clean[ids[row]] for row in rows]))
+        extents = [extents[n] for n in order]
+        segments = [segments[n] for n in order]
+        # blocks: each line continues into the first later line directly under it, of a similar height
+        continues: Dict[int, int] = {}
+        continued = set()
+        for a in range(len(segments)):
+            minx, _, maxx, bottom, height = extents[a]
+            for b in range(a + 1, len(segments)):
+                bminx, btop, bmaxx, _, bheight = extents[b]
+                if btop - bottom > BLOCK_GAP * height:
+                    break
+                if b in continued or btop < bottom - 0.5 * height or min(maxx, bmaxx) <= max(minx, bminx):
+                    continue
+                if 0.5 <= bheight / max(height, 1) <= 2:
+                    continues[a] = b
+                    continued.add(b)
+                    break
+        for a, b in continues.items():
+            for row in segments[a]:
+                # the box of the next line most overlapping this one horizontally
+                overlaps = [min(bounds[row, 2], bounds[other, 2]) - max(bounds[row, 0], bounds[other, 0]) for other in segments[b]]
+                best = int(np.argmax(overlaps))
+                if overlaps[best] > 0:
+                    self.below[ids[row]] = ids[segments[b][best]]
+        for a in range(len(segments)):
+            if a in continued:
+                continue
+            chain = [a]
+            while chain[-1] in continues:
+                chain.append(continues[chain[-1]])
+            block_ids = [i for n in chain for i in self.lines[first_line + n].ids]
+            for i in block_ids:
+                self.block_of[i] = len(self.blocks)
+            self.blocks.append(Span(block_ids, [self._clean[i] for i in block_ids]))
+
+    def find(self, target: str, threshold: float = 85, min_boxes: int = 2) -> Optional[List[int]]:
+        """Finds a phrase spread over boxes with one fuzzy alignment per block.
+
+        Args:
+            target (str): cleaned, uppercase phrase
+            threshold (float): partial_ratio the best alignment needs
+            min_boxes (int): boxes the phrase has to cover; matches inside a single box are the box matchers' job
+
+        Returns:
+            List[int]: rdix ids of the boxes the phrase was found on, in reading order; None if not found
+        """
+        best, best_ids = threshold, None
+        for span in self.blocks:
+            if len(span.ids) < min_boxes or len(span.text) < len(target) * threshold / 100:
+                continue
+            alignment = rfuzz.partial_ratio_alignment(target, span.text, score_cutoff=best)
+            if alignment is None or (best_ids is not None and alignment.score <= best):
+                continue
+            found = span.boxes_at(alignment.dest_start, alignment.dest_end)
+            if len(found) >= min_boxes:
+                best, best_ids = alignment.score, found
+                if best == 100:
+                    break
+        return best_ids
+
+    def neighbors(self, i: int) -> List[int]:
+        """rdix ids of the other boxes of box i's block, nearest in reading order first."""
+        if i not in self.block_of:
+            return []
+        ids = self.blocks[self.block_of[i]].ids
+        at = ids.index(i)
+        # outward from box i, the box before it first on a tie
+        order = sorted(range(len(ids)), key=lambda n: (abs(n - at), n))
+        return [ids[n] for n in order if n != at]
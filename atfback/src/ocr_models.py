@@ -0,0 +1,206 @@
+"""Process-wide registry for loaded OCR models.
+
+Loading easyocr weights from disk takes seconds and a few hundred MB, so every
+model is loaded once per process and shared by all OCRChecker instances and
+validate calls. The registry records how long each load took and how much
+resident memory it added so the savings can be observed.
+
+Under a preforking server (gunicorn with preload_app) the model is loaded once
+in the master and the workers share its pages copy-on-write: prepare_fork runs
+in the master before each fork, configure_worker_threads in each worker after.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import gc
+import os
+import sys
+import threading
+import time
+import logging
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+
+def current_rss() -> int:
+    """Returns the resident set size of this process in bytes.
+
+    Returns:
+        int: resident memory in bytes, 0 if it cannot be determined
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is the peak in KB on linux, close enough without /proc
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+def memory_usage() -> Dict[str, int]:
+    """Memory of this process in bytes, split by what forked workers share.
+
+    rss counts pages shared with the master and the other workers in full, pss
+    divides them among the processes sharing them and private is what only
+    this process holds, i.e. what one more worker costs.
+
+    Returns:
+        dict: rss, pss, shared and private bytes; only rss (from current_rss) without /proc/self/smaps_rollup
+    """
+    fields = {'Rss': 'rss', 'Pss': 'pss', 'Shared_Clean': 'shared', 'Shared_Dirty': 'shared',
+              'Private_Clean': 'private', 'Private_Dirty': 'private'}
+    usage: Dict[str, int] = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in fields:
+                    # values are in kB
+                    usage[fields[name]] = usage.get(fields[name], 0) + int(value.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        usage = {}
+    if 'rss' not in usage:
+        usage = {'rss': current_rss()}
+    return usage
+
+
+def format_memory(usage: Dict[str, int]) -> str:
+    """memory_usage() as one log friendly line in MB."""
+    return ', '.join(f'{name} {value / (1024*1024):.1f} MB' for name, value in usage.items())
+
+
+def prepare_fork():
+    """Readies a process that has loaded its models for forking workers.
+
+    Moves everything allocated so far (the model objects included) to the
+    permanent generation, so the workers' garbage collection never writes to
+    those pages and they stay shared instead of being copied into every worker.
+    """
+    gc.collect()
+    gc.freeze()
+
+
+def configure_worker_threads(threads: int):
+    """Sets the intra-op thread count of a forked worker.
+
+    Every worker otherwise runs torch on all cores and they fight over them.
+    The environment covers a torch imported later (no preload), set_num_threads
+    one already imported in the master.
+
+    Args:
+        threads (int): threads for this worker, at least 1
+    """
+    threads = max(int(threads), 1)
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(threads)
+    logger.info(f'Worker {os.getpid()} using {threads} torch thread(s)')
+
+
+def worker_threads(workers: int, threads: Optional[int] = None) -> int:
+    """Torch threads per worker: threads if given, otherwise the cores split between the workers."""
+    if threads:
+        return max(int(threads), 1)
+    return max((os.cpu_count() or 1) // max(int(workers), 1), 1)
+
+
+def _load_easyocr(quantize: bool = True, model_storage_directory: str = "./EasyOCR", download_enabled: bool = False, gpu: bool = False):
+    # easyocr pulls in torch, only import it when the model is actually needed
+    import easyocr
+    return easyocr.Reader(['en'], gpu=gpu, quantize=quantize, model_storage_directory=model_storage_directory, download_enabled=download_enabled)
+
+
+class LoadedModel:
+    """A model held by the registry along with what it cost to load."""
+
+    def __init__(self, name: str, config: Dict[str, Any], model: Any, load_seconds: float, rss_bytes: int):
+        self.name = name
+        self.config = config
+        self.model = model
+        self.load_seconds = load_seconds
+        self.rss_bytes = rss_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'config': dict(self.config),
+            'load_seconds': round(self.load_seconds, 3),
+            'rss_bytes': self.rss_bytes
+        }
+
+
+class ModelRegistry:
+    """Loads each (model name, config) pair once and hands out the shared instance."""
+
+    def __init__(self):
+        self._loaders: Dict[str, Callable[..., Any]] = {'easyocr': _load_easyocr}
+        self._models: Dict[Tuple, LoadedModel] = {}
+        self._lock = threading.Lock()
+
+    def register_loader(self, name: str, loader: Callable[..., Any]):
+        """Registers a loader function for a model name.
+
+        Args:
+            name (str): model name used in get()
+            loader (Callable): called with the model config as keyword arguments
+        """
+        self._loaders[name] = loader
+
+    @staticmethod
+    def _key(name: str, config: Dict[str, Any]) -> Tuple:
+        return (name, tuple(sorted(config.items())))
+
+    def get(self, name: str, **config) -> Any:
+        """Returns the loaded model for name and config, loading it on first use.
+
+        Args:
+            name (str): model name
+            **config: keyword arguments passed to the loader
+
+        Raises:
+            ValueError: If no loader is registered for the name
+
+        Returns:
+            Any: the shared model instance
+        """
+        key = self._key(name, config)
+        loaded = self._models.get(key)
+        if loaded is not None:
+            return loaded.model
+        if name not in self._loaders:
+            raise ValueError(f"Unsupported OCR model: {name}")
+        # Held while loading so concurrent first calls don't load twice
+        with self._lock:
+            loaded = self._models.get(key)
+            if loaded is None:
+                rss_before = current_rss()
+                start = time.perf_counter()
+                model = self._loaders[name](**config)
+                load_seconds = time.perf_counter() - start
+                rss_bytes = max(current_rss() - rss_before, 0)
+                loaded = LoadedModel(name, config, model, load_seconds, rss_bytes)
+                self._models[key] = loaded
+                logger.info(f'Loaded OCR model {name} in {load_seconds:.2f}s (+{rss_bytes / (1024*1024):.1f} MB RSS)')
+        return loaded.model
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Load time and resident memory for every loaded model.
+
+        Returns:
+            list: one dict per loaded model
+        """
+        return [loaded.stats() for loaded in self._models.values()]
+
+    def clear(self):
+        """Drops all loaded models (mostly for tests)."""
+        with self._lock:
+            self._models.clear()
+
+
+# Shared by everything in this process
+registry = ModelRegistry()
@@ -0,0 +1,131 @@
+"""Cheap text orientation estimate and the rotations needed to re-scan sideways text.
+
+Labels often carry text running up or down the side (government warning,
+ABV, bottling statement), and the OCR engines only read text upright. Rather
+than reading every label in all four orientations, text_directions measures
+how much of the ink forms horizontal versus vertical lines, and rotation_plan
+turns that into the rotations worth a re-scan. OCRChecker only runs those
+while a field is still missing, and maps the new boxes back onto the upload.
+
+Rotations are in degrees clockwise, applied to the upload to make text upright.
+"""
+from typing import List, Tuple
+import logging
+
+import cv2
+import numpy as np
+
+try:
+    from .ocr_image import DecodedImage
+    from .ocr_preprocess import estimate_text_height
+except ImportError:
+    from ocr_image import DecodedImage
+    from ocr_preprocess import estimate_text_height
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+_CV2_ROTATIONS = {
+    90: cv2.ROTATE_90_CLOCKWISE,
+    180: cv2.ROTATE_180,
+    270: cv2.ROTATE_90_COUNTERCLOCKWISE
+}
+
+
+def text_directions(pixels: np.ndarray, sample_side: int = 1024) -> Tuple[int, int]:
+    """Measures how much text runs horizontally and vertically on an image.
+
+    Letter edges are smeared along x and then along y by about a letter's
+    height; runs of letters become long thin blobs in the direction the text
+    runs. The area of the blobs that are line shaped and line sized is summed
+    for each direction.
+
+    Args:
+        pixels (np.ndarray): BGR image
+        sample_side (int): the measure runs on a copy shrunk to this longest side
+
+    Returns:
+        tuple: (horizontal, vertical) text area in sample pixels
+    """
+    height, width = pixels.shape[:2]
+    factor = min(1.0, sample_side / max(height, width))
+    gray = cv2.cvtColor(pixels, cv2.COLOR_BGR2GRAY) if pixels.ndim == 3 else pixels
+    if factor < 1.0:
+        gray = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    letter = max(3, int(estimate_text_height(gray) or 12))
+    edges = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, np.ones((3, 3), np.uint8))
+    _, edges = cv2.threshold(edges, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    areas = []
+    for kernel in (np.ones((1, letter), np.uint8), np.ones((letter, 1), np.uint8)):
+        lines = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(lines)
+        w, h = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT]
+        # along: the direction the kernel smeared, across: the line's thickness
+        along, across = (w, h) if kernel.shape[1] > 1 else (h, w)
+        is_line = (along >= 4 * across) & (across >= letter / 2) & (across <= 4 * letter)
+        areas.append(int((w * h)[is_line].sum()))
+    return areas[0], areas[1]
+
+
+def rotation_plan(pixels: np.ndarray, min_share: float = 0.1, upside_down: bool = False) -> List[int]:
+    """Rotations worth re-scanning an image at, most likely first.
+
+    Which way vertical text reads cannot be told from its shape, so both
+    quarter turns are planned when there is any; clockwise first, as side
+    text on labels mostly reads bottom to top. Upside down text looks like
+    upright text, so 180 is only planned on request.
+
+    Args:
+        pixels (np.ndarray): BGR image
+        min_share (float): share of the text area that has to run vertically to plan quarter turns
+        upside_down (bool): also plan a half turn
+
+    Returns:
+        List[int]: clockwise rotations in degrees, empty if nothing but upright text was seen
+    """
+    horizontal, vertical = text_directions(pixels)
+    logger.debug(f'Text area horizontal {horizontal}, vertical {vertical}')
+    plan = []
+    if vertical and vertical >= min_share * (horizontal + vertical):
+        plan += [90, 270]
+    if upside_down:
+        plan.append(180)
+    return plan
+
+
+def rotate(image: DecodedImage, degrees: int) -> DecodedImage:
+    """Rotates an image clockwise by a multiple of 90 degrees.
+
+    The result has no encoded bytes, it is not the upload and nothing may look it up by content.
+    """
+    if degrees % 360 == 0:
+        return image
+    return DecodedImage(b'', cv2.rotate(image.pixels, _CV2_ROTATIONS[degrees % 360]))
+
+
+def unrotate_bbox(bbox: Tuple[int, int, int, int], degrees: int, width: int, height: int) -> Tuple[int, int, int, int]:
+    """Maps a (minx, miny, maxx, maxy) box found on a rotated image back onto the original.
+
+    Args:
+        bbox (tuple): box on the rotated image
+        degrees (int): clockwise rotation that was applied
+        width (int): original image width
+        height (int): original image height
+
+    Returns:
+        tuple: the box on the original image
+    """
+    minx, miny, maxx, maxy = bbox
+    match degrees % 360:
+        case 0:
+            return bbox
+        case 90:
+            # original (x, y) went to (height - y, x)
+            return (miny, height - maxx, maxy, height - minx)
+        case 180:
+            return (width - maxx, height - maxy, width - minx, height - miny)
+        case 270:
+            # original (x, y) went to (y, width - x)
+            return (width - maxy, minx, width - miny, maxx)
+        case _:
+            raise ValueError(f"Unsupported rotation: {degrees}")
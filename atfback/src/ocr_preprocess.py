@@ -0,0 +1,259 @@
+"""Adaptive downscaling and tiling ahead of OCR.
+
+OCR time grows with pixel count, but detection only needs the text to be a
+couple dozen pixels tall. The Preprocessor estimates how tall the small text
+on a label is, scales the image down until that text is target_text_height
+pixels tall (never up), and when the result is still larger than max_side it
+splits it into overlapping tiles. Boxes found on the scaled tiles are mapped
+back to original image coordinates and merged, so ocrdata, the box index and the
+drawn boxes all stay in the coordinates of the upload.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+import cv2
+import numpy as np
+
+try:
+    from .ocr_image import DecodedImage
+except ImportError:
+    from ocr_image import DecodedImage
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# (bbox, text, prob) results as returned by OCRBackend.readtext
+ReadText = Callable[[DecodedImage], list]
+
+
+def estimate_text_height(pixels: np.ndarray, percentile: float = 25.0, sample_side: int = 1024, min_components: int = 20) -> Optional[float]:
+    """Estimates the height of the smaller characters on an image.
+
+    Characters are taken to be the letter shaped connected components of an
+    adaptive threshold, dark on light and light on dark. A low percentile is
+    used so the small print (government warning, net contents) decides the
+    scale rather than the brand name.
+
+    Args:
+        pixels (np.ndarray): BGR image
+        percentile (float): which percentile of character heights to report
+        sample_side (int): the estimate runs on a copy shrunk to this longest side
+        min_components (int): fewer character like components than this gives no estimate
+
+    Returns:
+        float: character height in original pixels, None if the image has too little text to tell
+    """
+    height, width = pixels.shape[:2]
+    factor = min(1.0, sample_side / max(height, width))
+    gray = cv2.cvtColor(pixels, cv2.COLOR_BGR2GRAY) if pixels.ndim == 3 else pixels
+    if factor < 1.0:
+        gray = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    heights = []
+    for mode in (cv2.THRESH_BINARY_INV, cv2.THRESH_BINARY):
+        binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, mode, 25, 10)
+        _, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+        w, h, area = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT], stats[1:, cv2.CC_STAT_AREA]
+        # letters: a few pixels up to a third of the image, not too wide, and not a solid block or a hairline
+        letters = (h >= 4) & (h <= gray.shape[0] / 3) & (w <= 1.5 * h) & (w * 5 >= h) & (area >= 0.15 * w * h) & (area <= 0.9 * w * h)
+        heights.append(h[letters])
+    heights = np.concatenate(heights)
+    if len(heights) < min_components:
+        return None
+    return float(np.percentile(heights, percentile)) / factor
+
+
+class Tile:
+    """A piece of the working image and how to map it back to the original.
+
+    Attributes:
+        pixels (np.ndarray): the scaled tile
+        x (int): left edge in scaled image coordinates
+        y (int): top edge in scaled image coordinates
+        scale (float): scaled / original size
+        interior (Tuple[bool, bool, bool, bool]): left, top, right, bottom edges that cut through the image
+    """
+
+    def __init__(self, pixels: np.ndarray, x: int, y: int, scale: float, interior: Tuple[bool, bool, bool, bool]):
+        self.pixels = pixels
+        self.x = x
+        self.y = y
+        self.scale = scale
+        self.interior = interior
+
+    def to_original(self, bbox) -> List[List[float]]:
+        """Maps [x, y] points on the tile to the original image."""
+        return [[(v[0] + self.x) / self.scale, (v[1] + self.y) / self.scale] for v in bbox]
+
+    def cut(self, bbox, margin: int) -> bool:
+        """Whether a box on the tile touches an edge shared with another tile, and so may be cut short."""
+        xs, ys = [v[0] for v in bbox], [v[1] for v in bbox]
+        height, width = self.pixels.shape[:2]
+        left, top, right, bottom = self.interior
+        return ((left and min(xs) <= margin) or (top and min(ys) <= margin)
+                or (right and max(xs) >= width - margin) or (bottom and max(ys) >= height - margin))
+
+
+def _spans(length: int, size: int, overlap: int) -> List[int]:
+    if length <= size:
+        return [0]
+    step = size - overlap
+    count = int(np.ceil((length - overlap) / step))
+    # spread evenly so the last tile is not a sliver
+    return [round(i * (length - size) / (count - 1)) for i in range(count)]
+
+
+def _rect(bbox) -> Tuple[float, float, float, float]:
+    xs, ys = [v[0] for v in bbox], [v[1] for v in bbox]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _overlap(a: Tuple[float, float, float, float], b: Tuple[float, float, float, float]) -> float:
+    """Intersection over the smaller box's area."""
+    w = min(a[2], b[2]) - max(a[0], b[0])
+    h = min(a[3], b[3]) - max(a[1], b[1])
+    if w <= 0 or h <= 0:
+        return 0.0
+    smaller = min((a[2] - a[0]) * (a[3] - a[1]), (b[2] - b[0]) * (b[3] - b[1]))
+    return w * h / smaller if smaller > 0 else 0.0
+
+
+def _join_text(left: str, right: str, min_shared: int = 3) -> str:
+    """Joins the texts of two pieces of a line, dropping what both read where they overlap."""
+    for k in range(min(len(left), len(right)), min_shared - 1, -1):
+        if left[-k:] == right[:k]:
+            return left + right[k:]
+    return left + ' ' + right
+
+
+def _stitch(pieces: list) -> list:
+    """Joins pieces of the same line cut by tile edges, left to right, into one result."""
+    lines: list = []
+    for bbox, text, prob in sorted(pieces, key=lambda f: _rect(f[0])[0]):
+        rect = _rect(bbox)
+        for n, (lrect, ltext, lprob) in enumerate(lines):
+            shared = min(rect[3], lrect[3]) - max(rect[1], lrect[1])
+            # same line: touching or overlapping along x, and mostly sharing the same rows
+            if rect[0] <= lrect[2] and shared > 0.5 * min(rect[3] - rect[1], lrect[3] - lrect[1]):
+                union = (min(rect[0], lrect[0]), min(rect[1], lrect[1]), max(rect[2], lrect[2]), max(rect[3], lrect[3]))
+                lines[n] = (union, _join_text(ltext, text), min(prob, lprob))
+                break
+        else:
+            lines.append((rect, text, prob))
+    return [([[r[0], r[1]], [r[2], r[1]], [r[2], r[3]], [r[0], r[3]]], text, prob) for r, text, prob in lines]
+
+
+class Preprocessor:
+    """Scales and tiles an image for OCR and maps the results back."""
+
+    def __init__(self, target_text_height: int = 20, max_side: int = 2560, tile_overlap: Optional[int] = None, min_scale: float = 0.25, min_pixels: int = 1_000_000):
+        """
+        Args:
+            target_text_height (int): height in pixels the small text is scaled down to
+            max_side (int): longest side OCR sees in one pass, larger working images are tiled
+            tile_overlap (int): pixels shared by neighbouring tiles, defaults to a few lines of target height text
+            min_scale (float): never scale below this, in case the estimate is off
+            min_pixels (int): images this small are read as they are, OCR on them is cheap already
+        """
+        self.target_text_height = target_text_height
+        self.max_side = max_side
+        self.tile_overlap = tile_overlap if tile_overlap is not None else 8 * target_text_height
+        self.min_scale = min_scale
+        self.min_pixels = min_pixels
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        """Settings that change the OCR output, part of the OCR cache key."""
+        return {
+            'target_text_height': self.target_text_height,
+            'max_side': self.max_side,
+            'tile_overlap': self.tile_overlap,
+            'min_scale': self.min_scale,
+            'min_pixels': self.min_pixels
+        }
+
+    def scale_for(self, image: DecodedImage) -> float:
+        """Working scale for an image, 1.0 when the text is already small or cannot be measured."""
+        if image.width * image.height <= self.min_pixels:
+            return 1.0
+        text_height = estimate_text_height(image.pixels)
+        if text_height is None or text_height <= self.target_text_height:
+            return 1.0
+        return max(self.target_text_height / text_height, self.min_scale)
+
+    def tiles(self, image: DecodedImage, scale: Optional[float] = None) -> List[Tile]:
+        """Scales an image and splits it into overlapping tiles no larger than max_side.
+
+        Args:
+            image (DecodedImage): the upload
+            scale (float): working scale, estimated if not given
+
+        Returns:
+            List[Tile]: one tile when the scaled image fits max_side
+        """
+        if scale is None:
+            scale = self.scale_for(image)
+        pixels = image.pixels
+        if scale < 1.0:
+            pixels = cv2.resize(pixels, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            # the size is rounded to whole pixels, map back with the scale actually applied
+            scale = pixels.shape[1] / image.width
+        height, width = pixels.shape[:2]
+        xs = _spans(width, self.max_side, self.tile_overlap)
+        ys = _spans(height, self.max_side, self.tile_overlap)
+        tiles = []
+        for y in ys:
+            for x in xs:
+                tile = pixels[y:y + self.max_side, x:x + self.max_side]
+                interior = (x > 0, y > 0, x + tile.shape[1] < width, y + tile.shape[0] < height)
+                tiles.append(Tile(tile, x, y, min(scale, 1.0), interior))
+        return tiles
+
+    def read(self, readtext: ReadText, image: DecodedImage) -> list:
+        """Runs OCR over the scaled tiles of an image.
+
+        Args:
+            readtext (Callable): OCRBackend.readtext
+            image (DecodedImage): the upload
+
+        Returns:
+            list: (bbox, text, prob) tuples in original image coordinates
+        """
+        tiles = self.tiles(image)
+        if len(tiles) == 1 and tiles[0].scale == 1.0:
+            return readtext(image)
+        logger.debug(f'OCR on {len(tiles)} tile(s) at scale {tiles[0].scale:.3f}')
+        whole, cut = [], []
+        for tile in tiles:
+            # tiles are not the uploaded bytes, nothing may look them up by content
+            for (bbox, text, prob) in readtext(DecodedImage(b'', np.ascontiguousarray(tile.pixels))):
+                found = (tile.to_original(bbox), text, prob)
+                (cut if tile.cut(bbox, margin=2) else whole).append(found)
+        return self.merge(whole, cut)
+
+    @staticmethod
+    def merge(whole: list, cut: list, duplicate: float = 0.5) -> list:
+        """Drops the copies of text read twice where tiles overlap.
+
+        Lines longer than the overlap are cut on every tile they cross, those
+        pieces are stitched back together first.
+
+        Args:
+            whole (list): results clear of the tile edges
+            cut (list): results touching an edge shared with another tile, possibly cut short
+            duplicate (float): overlap (of the smaller box) above which two results are the same text
+
+        Returns:
+            list: merged (bbox, text, prob) results
+        """
+        found = whole + _stitch(cut)
+        kept: List[int] = []
+        rects: list = []
+        # uncut first and longest text first, so a line read whole wins over the pieces of it
+        for n in sorted(range(len(found)), key=lambda n: (n < len(whole), len(found[n][1]), found[n][2]), reverse=True):
+            rect = _rect(found[n][0])
+            if any(_overlap(rect, other) > duplicate for other in rects):
+                continue
+            kept.append(n)
+            rects.append(rect)
+        # back in the order OCR returned them
+        return [found[n] for n in sorted(kept)]
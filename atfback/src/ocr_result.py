@@ -0,0 +1,194 @@
+"""OCR result normalized once per image, and matchers compiled once per form field.
+
+Every check used to clean every box's text again (two regex substitutions and
+an upper() per box per check). OCRResult does that once when the OCR output is
+ingested; TextMatcher holds a form field's uppercased target and thresholds so
+the same submission never rebuilds them.
+
+Fuzzy scores are not computed pair by pair either: OCRResult builds the
+(boxes x targets) ratio and partial_ratio matrices with rapidfuzz's cdist in
+one native call per scorer, and matchers read their thresholds off them.
+"""
+from typing import Any, Dict, Iterable, List, Optional
+from functools import lru_cache
+
+import numpy as np
+import regex
+from rapidfuzz import fuzz as rfuzz, process
+
+_UNWANTED = regex.compile(r"[^a-zA-Z0-9\s\-%&]")
+_WHITESPACE = regex.compile(r'\s+')
+
+# below this many cells thread startup costs more than the scoring
+CDIST_PARALLEL_MIN = 20000
+
+
+def clean_text(text: str) -> str:
+    """Cleans the text by removing unwanted characters and normalizing whitespace.
+    Args:
+        text (str): string to clean
+
+    Returns:
+        str: string cleaned
+    """
+    # Remove unwanted characters (keep alphanumeric and basic punctuation, '&' included)
+    cleaned = _UNWANTED.sub('', text)
+    # Normalize whitespace
+    cleaned = _WHITESPACE.sub(' ', cleaned).strip()
+    return cleaned.upper()
+
+
+class OCRResult(dict):
+    """ocrdata (rdix id -> {'text', 'confidence', 'bbox'}) with every box normalized at ingest.
+
+    Still a plain ocrdata dict to anything that indexes it. The normalized forms
+    are looked up by rdix id:
+        upper (Dict[int, str]): raw text uppercase with whitespace normalized, punctuation kept
+        clean (Dict[int, str]): clean_text of the box, uppercase
+        tokens (Dict[int, List[str]]): clean split on whitespace
+        lengths (Dict[int, int]): len of clean
+
+    Fuzzy scores against targets are cached per target as arrays with one
+    entry per box, in the order of ids. layout and quantities hold the
+    ocr_layout.Layout and quantity_index.QuantityIndex of the boxes once a
+    check asked for them; all are dropped when boxes are added.
+    """
+
+    def __init__(self, ocrdata: Optional[Dict[int, Dict[str, Any]]] = None):
+        super().__init__(ocrdata or {})
+        self.upper: Dict[int, str] = {}
+        self.clean: Dict[int, str] = {}
+        self.tokens: Dict[int, List[str]] = {}
+        self.lengths: Dict[int, int] = {}
+        for i, entry in self.items():
+            self._normalize(i, entry)
+        self._reset_scores()
+
+    def _reset_scores(self):
+        self.ids: List[int] = list(self.clean.keys())
+        self.rows: Dict[int, int] = {i: row for row, i in enumerate(self.ids)}
+        self.length_array = np.array([self.lengths[i] for i in self.ids], dtype=np.int32)
+        self._ratio: Dict[str, np.ndarray] = {}
+        self._partial: Dict[str, np.ndarray] = {}
+        self.layout = None
+        self.quantities = None
+
+    def _normalize(self, i: int, entry: Dict[str, Any]):
+        self.upper[i] = _WHITESPACE.sub(' ', entry['text']).strip().upper()
+        ctext = clean_text(entry['text'])
+        self.clean[i] = ctext
+        self.tokens[i] = ctext.split()
+        self.lengths[i] = len(ctext)
+
+    def __setitem__(self, i: int, entry: Dict[str, Any]):
+        super().__setitem__(i, entry)
+        self._normalize(i, entry)
+        self._reset_scores()
+
+    def add_boxes(self, entries: Iterable[Dict[str, Any]]) -> List[int]:
+        """Adds boxes under new ids, normalizing them and dropping cached scores once for the lot.
+
+        Args:
+            entries (Iterable[dict]): {'text', 'confidence', 'bbox'} entries
+
+        Returns:
+            List[int]: the ids given to the entries, to index their boxes under
+        """
+        next_id = max(self.keys(), default=-1) + 1
+        ids = []
+        for i, entry in enumerate(entries, start=next_id):
+            super().__setitem__(i, entry)
+            self._normalize(i, entry)
+            ids.append(i)
+        self._reset_scores()
+        return ids
+
+    def score(self, targets: Iterable[str]):
+        """Scores every box against every target not scored yet, one cdist call per scorer.
+
+        Scores match thefuzz's: rounded to whole numbers, 0 when only one side is empty.
+
+        Args:
+            targets (Iterable[str]): uppercase target strings
+        """
+        missing = list(dict.fromkeys(t for t in targets if t not in self._ratio))
+        if not missing:
+            return
+        choices = [self.clean[i] for i in self.ids]
+        if not choices:
+            for target in missing:
+                self._ratio[target] = self._partial[target] = np.zeros(0, dtype=np.float32)
+            return
+        workers = -1 if len(choices) * len(missing) >= CDIST_PARALLEL_MIN else 1
+        ratio = process.cdist(missing, choices, scorer=rfuzz.ratio, workers=workers)
+        partial = process.cdist(missing, choices, scorer=rfuzz.partial_ratio, workers=workers)
+        for n, target in enumerate(missing):
+            self._ratio[target] = np.rint(ratio[n])
+            self._partial[target] = np.rint(partial[n])
+
+    def ratio_scores(self, target: str) -> np.ndarray:
+        """fuzz.ratio of target against every box, in the order of ids."""
+        self.score([target])
+        return self._ratio[target]
+
+    def partial_scores(self, target: str) -> np.ndarray:
+        """fuzz.partial_ratio of target against every box, in the order of ids."""
+        self.score([target])
+        return self._partial[target]
+
+    @classmethod
+    def wrap(cls, ocrdata: Dict[int, Dict[str, Any]]) -> 'OCRResult':
+        """Returns ocrdata as an OCRResult, normalizing it only if it is still a plain dict."""
+        if isinstance(ocrdata, OCRResult):
+            return ocrdata
+        return cls(ocrdata)
+
+
+class TextMatcher:
+    """Fuzzy matcher for one target string, compiled once.
+
+    A box matches if its cleaned text is close to the whole target
+    (ratio > ratio_threshold), or if it is long enough to contain the
+    target and contains a close copy of it (partial_ratio > partial_threshold).
+    """
+
+    def __init__(self, target: str, ratio_threshold: Optional[int] = 75, partial_threshold: Optional[int] = 85, partial_min_length: Optional[int] = None):
+        """
+        Args:
+            target (str): text to look for, compared uppercase
+            ratio_threshold (int): whole string score needed, None to skip
+            partial_threshold (int): substring score needed, None to skip
+            partial_min_length (int): shortest box text the substring score applies to, defaults to longer than the target
+        """
+        self.target = target.upper()
+        self.ratio_threshold = ratio_threshold
+        self.partial_threshold = partial_threshold
+        self.partial_min_length = len(target) + 1 if partial_min_length is None else partial_min_length
+
+    def match_mask(self, result: OCRResult) -> np.ndarray:
+        """Which boxes match, as a bool array in the order of result.ids."""
+        mask = np.zeros(len(result.ids), dtype=bool)
+        if self.ratio_threshold is not None:
+            mask |= result.ratio_scores(self.target) > self.ratio_threshold
+        if self.partial_threshold is not None:
+            mask |= (result.length_array >= self.partial_min_length) & (result.partial_scores(self.target) > self.partial_threshold)
+        return mask
+
+    def first(self, result: OCRResult, exclude=()) -> Optional[int]:
+        """Returns the rdix id of the first matching box, None if there is none.
+
+        Args:
+            result (OCRResult): normalized OCR data
+            exclude: rdix ids to skip
+        """
+        for row in np.flatnonzero(self.match_mask(result)):
+            i = result.ids[row]
+            if i not in exclude:
+                return i
+        return None
+
+
+@lru_cache(maxsize=256)
+def compile_matcher(target: str, ratio_threshold: Optional[int] = 75, partial_threshold: Optional[int] = 85, partial_min_length: Optional[int] = None) -> TextMatcher:
+    """Returns the TextMatcher for a target, built once and reused across images and checks."""
+    return TextMatcher(target, ratio_threshold, partial_threshold, partial_min_length)
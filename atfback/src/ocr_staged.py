@@ -0,0 +1,175 @@
+"""Detect once, recognize on demand.
+
+Detection finds every text region of an image in one pass; recognition then
+costs a model run per region and is where most of the OCR time goes. Most
+labels verify from a fraction of their regions: brand name and product class
+are the biggest text, and the statements checked near them sit close by.
+StagedRead holds the detected regions and recognizes them a batch at a time,
+biggest text first and regions next to already found fields before anything
+else, so OCRChecker.validate can stop as soon as every check has passed.
+A read that stops early keeps its state() in the OCR cache, and restore()
+resumes it when the same image is submitted again.
+"""
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import logging
+
+try:
+    from .ocr_image import DecodedImage
+    from .ocr_boxes import BoxIndex
+except ImportError:
+    from ocr_image import DecodedImage
+    from ocr_boxes import BoxIndex
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+
+def _plain(value) -> Any:
+    # numpy scalars from the detector as int/float, ints kept ints for the recognizer's crops
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+class Region:
+    """A detected text region, not recognized yet.
+
+    Attributes:
+        kind (str): 'horizontal' for an axis aligned [x_min, x_max, y_min, y_max] box, 'free' for four [x, y] points
+        coords (list): the region as the backend described it, handed back to it for recognition
+        rect (Tuple[float, float, float, float]): (minx, miny, maxx, maxy) on the image it was detected on
+    """
+
+    def __init__(self, kind: str, coords: list):
+        self.kind = kind
+        self.coords = coords
+        if kind == 'horizontal':
+            x_min, x_max, y_min, y_max = coords
+            self.rect = (x_min, y_min, x_max, y_max)
+        else:
+            xs, ys = [p[0] for p in coords], [p[1] for p in coords]
+            self.rect = (min(xs), min(ys), max(xs), max(ys))
+
+    def to_json(self) -> list:
+        """The region as [kind, coords] with plain numbers, for OCRCache."""
+        if self.kind == 'horizontal':
+            return [self.kind, [_plain(v) for v in self.coords]]
+        return [self.kind, [[_plain(x), _plain(y)] for x, y in self.coords]]
+
+    @classmethod
+    def from_json(cls, data: list) -> 'Region':
+        kind, coords = data
+        return cls(kind, coords)
+
+    @property
+    def text_size(self) -> float:
+        """Height of the text in the region: the short side, text may run either way."""
+        return min(self.rect[2] - self.rect[0], self.rect[3] - self.rect[1])
+
+    @property
+    def area(self) -> float:
+        return (self.rect[2] - self.rect[0]) * (self.rect[3] - self.rect[1])
+
+
+class StagedRead:
+    """Detected regions of one image, recognized in priority order a batch at a time.
+
+    Only one batch may run at a time; boost() is called between batches.
+    """
+
+    def __init__(self, recognize: Callable[[DecodedImage, List[Region]], list], image: DecodedImage, regions: Sequence[Region],
+                 to_original: Optional[Callable[[list], list]] = None, batch_size: int = 8):
+        """
+        Args:
+            recognize (Callable): OCRBackend.recognize, returns (bbox, text, prob) for the regions given
+            image (DecodedImage): image the regions were detected on (possibly scaled)
+            regions (Sequence[Region]): detected regions
+            to_original (Callable): maps [x, y] points on image to the upload, None if image is the upload
+            batch_size (int): regions recognized per next_batch call
+        """
+        self._recognize = recognize
+        self.image = image
+        self.regions = list(regions)
+        self.to_original = to_original or (lambda points: points)
+        self.batch_size = batch_size
+        # biggest text first, larger regions first among the same size
+        self._order = sorted(range(len(self.regions)), key=lambda n: (self.regions[n].text_size, self.regions[n].area), reverse=True)
+        self._boosted: List[int] = []
+        self._done = set()
+        # (bbox, text, prob) in upload coordinates of every region recognized so far
+        self.recognized: List[tuple] = []
+        # recognized by an earlier read, handed out by the first next_batch
+        self._restored: List[tuple] = []
+        self._index = BoxIndex(range(len(self.regions)), [self._original_rect(region) for region in self.regions])
+
+    def _original_rect(self, region: Region) -> Tuple[float, float, float, float]:
+        (x0, y0), (x1, y1) = self.to_original([[region.rect[0], region.rect[1]], [region.rect[2], region.rect[3]]])
+        return (x0, y0, x1, y1)
+
+    @property
+    def remaining(self) -> int:
+        """Regions not recognized yet."""
+        return len(self.regions) - len(self._done)
+
+    @property
+    def finished(self) -> bool:
+        return self.remaining == 0 and not self._restored
+
+    def boost(self, bbox: Tuple[int, int, int, int], pad: Optional[float] = None):
+        """Moves the regions around a box (upload coordinates) to the front of the queue.
+
+        Args:
+            bbox (tuple): (minx, miny, maxx, maxy) of something found
+            pad (float): how far around it to look, defaults to three times the box's short side
+        """
+        if pad is None:
+            pad = 3 * min(bbox[2] - bbox[0], bbox[3] - bbox[1])
+        area = (bbox[0] - pad, bbox[1] - pad, bbox[2] + pad, bbox[3] + pad)
+        near = set(self._index.intersection(area)) - self._done - set(self._boosted)
+        # keep the size order among the boosted ones
+        self._boosted += [n for n in self._order if n in near]
+
+    def state(self) -> Dict[str, Any]:
+        """What was detected and recognized so far, JSON serializable, for resuming with restore()."""
+        return {
+            'regions': [region.to_json() for region in self.regions],
+            'done': sorted(self._done),
+            'recognized': [[[[_plain(x), _plain(y)] for x, y in bbox], text, float(prob)] for bbox, text, prob in self.recognized]
+        }
+
+    def restore(self, state: Dict[str, Any]):
+        """Picks up where an earlier read of the same image (same regions) stopped.
+
+        The regions it recognized are not recognized again, its results come back from the next next_batch call.
+        """
+        self._done.update(state['done'])
+        self._restored = [tuple(record) for record in state['recognized']]
+        self.recognized = list(self._restored)
+
+    def _take(self) -> List[int]:
+        batch = []
+        for queue in (self._boosted, self._order):
+            for n in queue:
+                if len(batch) == self.batch_size:
+                    return batch
+                if n not in self._done and n not in batch:
+                    batch.append(n)
+        return batch
+
+    def next_batch(self) -> list:
+        """Recognizes the next batch of regions.
+
+        Returns:
+            list: (bbox, text, prob) tuples in upload coordinates, empty once everything is recognized
+        """
+        if self._restored:
+            restored, self._restored = self._restored, []
+            return restored
+        batch = self._take()
+        if not batch:
+            return []
+        self._done.update(batch)
+        self._boosted = [n for n in self._boosted if n not in self._done]
+        logger.debug(f'Recognizing {len(batch)} region(s), {self.remaining} left')
+        found = [(self.to_original(bbox), text, prob) for (bbox, text, prob) in self._recognize(self.image, [self.regions[n] for n in batch])]
+        self.recognized += found
+        return found
@@ -0,0 +1,55 @@
+"""Headless OCR worker: takes validation jobs from a JobQueue and pushes the results back.
+
+Runs the same validation the web server does, without serving anything, so
+audits can be spread over as many worker processes/machines as needed. Jobs
+are manifest entries (see audit.py), results are what audit.py writes.
+"""
+from typing import Optional
+import os
+import socket
+import threading
+import time
+import logging
+
+try:
+    from .ocr_checker import OCRChecker
+    from .job_queue import JobQueue
+    from .audit import validate_entry
+except ImportError:
+    from ocr_checker import OCRChecker
+    from job_queue import JobQueue
+    from audit import validate_entry
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+
+def run_worker(queue: JobQueue, checker: OCRChecker, worker_name: Optional[str] = None, poll_interval: float = 1.0,
+               max_jobs: Optional[int] = None, stop: Optional[threading.Event] = None) -> int:
+    """Takes jobs from the queue until stopped.
+
+    Args:
+        queue (JobQueue): queue to take jobs from
+        checker (OCRChecker): checker to validate with
+        worker_name (str): name recorded on taken jobs, defaults to host:pid
+        poll_interval (float): seconds to sleep when the queue is empty
+        max_jobs (int): stop after this many jobs, None to run until stopped
+        stop (threading.Event): set to stop after the current job
+
+    Returns:
+        int: number of jobs processed
+    """
+    worker_name = worker_name or f'{socket.gethostname()}:{os.getpid()}'
+    stop = stop or threading.Event()
+    processed = 0
+    logger.info(f'OCR worker {worker_name} waiting for jobs')
+    while not stop.is_set() and (max_jobs is None or processed < max_jobs):
+        job = queue.take(worker_name)
+        if job is None:
+            stop.wait(poll_interval)
+            continue
+        result = validate_entry(checker, job)
+        queue.complete(job['id'], result)
+        processed += 1
+        logger.info(f"Job {job['id']} done in {result['seconds']}s")
+    return processed
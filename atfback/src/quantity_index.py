@@ -0,0 +1,225 @@
+"""Every quantity printed on a label, parsed once per image.
+
+check_net_contents used to format the submitted amount and unit into one
+string ("750 ML") and fuzzy match it against every box, with a branch per
+unit, and ABVMatcher ran its number pattern over every box again for each
+submitted value. QuantityIndex reads every number-plus-unit statement (ml,
+cl, L, liters, fl oz) off the image's lines once, normalized to milliliters,
+and every number-plus-% statement per box. Both checks then look the
+submitted value up, so 1.5 L on the label verifies a submitted 1500 ml and
+12 fl oz verifies 355 ml.
+
+Metric units convert exactly, so a metric amount has to be the printed one
+exactly: 745 ml does not verify a label saying 750 ML. Only between fl oz and
+the metric units is the amount allowed to differ, by the rounding of the
+converted figure: half the last printed digit of either side, with a fl oz
+figure taken to be given to a tenth at least.
+
+Volumes are read off the layout's lines rather than single boxes, so an
+amount and its unit OCR'd as separate boxes ("750" "ML") still parse.
+"""
+from typing import List, Optional
+import logging
+
+import numpy as np
+import regex
+
+try:
+    from .ocr_result import OCRResult
+    from .ocr_layout import Layout, Span
+    from .metrics import metrics
+except ImportError:
+    from ocr_result import OCRResult
+    from ocr_layout import Layout, Span
+    from metrics import metrics
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# milliliters per unit
+UNITS_ML = {
+    'ml': 1.0,
+    'cl': 10.0,
+    'l': 1000.0,
+    'fl oz': 29.5735295625
+}
+# how a unit may be written in the form, lowercase with dots dropped
+_UNIT_ALIASES = {
+    'ml': 'ml', 'milliliter': 'ml', 'milliliters': 'ml', 'millilitre': 'ml', 'millilitres': 'ml',
+    'cl': 'cl', 'centiliter': 'cl', 'centiliters': 'cl', 'centilitre': 'cl', 'centilitres': 'cl',
+    'l': 'l', 'liter': 'l', 'liters': 'l', 'litre': 'l', 'litres': 'l', 'ltr': 'l',
+    'fl oz': 'fl oz', 'floz': 'fl oz', 'fluid ounce': 'fl oz', 'fluid ounces': 'fl oz', 'oz': 'fl oz'
+}
+
+_NUMBER = r'(?<![\d.,])(\d+(?:[.,]\d+)?)'
+# longest spellings first; OCR reads the O of OZ as a zero often enough to accept it
+_VOLUME = regex.compile(_NUMBER + r'\s*(MILLILIT(?:ER|RE)S?|ML|CENTILIT(?:ER|RE)S?|CL|LIT(?:ER|RE)S?|LTRS?|L'
+                        r'|FL\.?\s*[O0]Z\.?|FLUID\s+OUNCES?|FL\.?\s*OUNCES?|[O0]Z\.?)(?![A-Z0-9])')
+# the decimal point is read as a comma often enough to accept both
+_PERCENT = regex.compile(r'(?<![\d.,])(\d{1,2}(?:[.,]\d{1,2})?)\s*%')
+
+# units converting into each other exactly, an amount in one has to match the other's to the last digit
+METRIC_UNITS = frozenset(('ml', 'cl', 'l'))
+# fl oz conversions of metric amounts are printed to a tenth, so a whole number of fl oz is as precise as that
+FL_OZ_DECIMALS = 1
+# float noise allowed on top of an exact match, relative
+_EXACT_RTOL = 1e-9
+
+
+def parse_number(text: str) -> Optional[float]:
+    """Parses an amount as printed or typed: "750", "1.5", "1,5", "1,000".
+
+    Returns:
+        float: the number, None if it is not one
+    """
+    text = text.strip().replace(' ', '')
+    head, sep, tail = text.rpartition(',')
+    if sep and '.' not in text:
+        # a comma before exactly three digits groups thousands, otherwise it is the decimal point
+        text = head + tail if len(tail) == 3 and head.strip('0') else head + '.' + tail
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def decimals(text: str) -> int:
+    """Digits printed after the decimal point of an amount, read the way parse_number reads it."""
+    text = text.strip().replace(' ', '')
+    if '.' in text:
+        return len(text.rpartition('.')[2])
+    head, sep, tail = text.rpartition(',')
+    if not sep or (len(tail) == 3 and head.strip('0')):
+        return 0
+    return len(tail)
+
+
+def rounding(unit: str, places: int) -> float:
+    """Milliliters an amount in unit printed with places decimals may be off by from rounding."""
+    if unit not in METRIC_UNITS:
+        places = max(places, FL_OZ_DECIMALS)
+    return 0.5 * 10.0 ** -places * UNITS_ML[unit]
+
+
+def normalize_unit(unit: str) -> Optional[str]:
+    """The UNITS_ML key of a unit as written, None if it is not a volume unit."""
+    if unit is None:
+        return None
+    return _UNIT_ALIASES.get(' '.join(unit.lower().replace('.', ' ').split()))
+
+
+def to_ml(amount: str, unit: str) -> Optional[float]:
+    """An amount and unit (as submitted) in milliliters, None if either does not parse."""
+    value = parse_number(amount or '')
+    key = normalize_unit(unit)
+    if value is None or key is None:
+        return None
+    return value * UNITS_ML[key]
+
+
+def _label_unit(unit: str) -> str:
+    """The UNITS_ML key of a unit as matched by _VOLUME on a label."""
+    unit = unit.replace('.', '').replace(' ', '')
+    if unit.startswith('MILLI') or unit == 'ML':
+        return 'ml'
+    if unit.startswith('CENTI') or unit == 'CL':
+        return 'cl'
+    if unit.startswith('L'):
+        return 'l'
+    return 'fl oz'
+
+
+class Quantity:
+    """A volume statement read off a label.
+
+    Attributes:
+        value (float): the amount as printed
+        unit (str): UNITS_ML key of the printed unit
+        ml (float): the amount in milliliters
+        rounding (float): milliliters the amount may be off by from being rounded to its printed digits
+        ids (List[int]): rdix ids of the boxes it was read from
+        text (str): the statement as read
+    """
+
+    def __init__(self, value: float, unit: str, ids: List[int], text: str, places: int = 0):
+        self.value = value
+        self.unit = unit
+        self.ml = value * UNITS_ML[unit]
+        self.rounding = rounding(unit, places)
+        self.ids = ids
+        self.text = text
+
+    def __repr__(self):
+        return f'Quantity({self.value:g} {self.unit} = {self.ml:g} ml, {self.text!r})'
+
+
+class QuantityIndex:
+    """Volumes (in ml) and percentages on one image, looked up with a tolerance.
+
+    Attributes:
+        volumes (List[Quantity]): every volume statement, in reading order
+    """
+
+    def __init__(self, result: OCRResult):
+        self.volumes: List[Quantity] = []
+        layout = Layout.of(result)
+        for line in layout.lines:
+            span = Span(line.ids, [result.upper[i] for i in line.ids])
+            for m in _VOLUME.finditer(span.text):
+                value = parse_number(m.group(1))
+                if value is not None:
+                    self.volumes.append(Quantity(value, _label_unit(m.group(2)), span.boxes_at(m.start(), m.end()), m.group(0),
+                                                 decimals(m.group(1))))
+        self._ml = np.array([q.ml for q in self.volumes], dtype=np.float64)
+        self._metric = np.array([q.unit in METRIC_UNITS for q in self.volumes], dtype=bool)
+        self._rounding = np.array([q.rounding for q in self.volumes], dtype=np.float64)
+        # percentages per box, in the order of the boxes
+        percent_values, percent_ids = [], []
+        for i, text in result.upper.items():
+            # most boxes have no % at all, skip the pattern for those
+            if '%' not in text:
+                continue
+            for m in _PERCENT.finditer(text):
+                value = parse_number(m.group(1))
+                if value is not None:
+                    percent_values.append(value)
+                    percent_ids.append(i)
+        self._percent = np.array(percent_values, dtype=np.float64)
+        self._percent_ids = percent_ids
+
+    @classmethod
+    def of(cls, result: OCRResult) -> 'QuantityIndex':
+        """The quantities of an image's boxes, parsed on first use and kept until boxes are added."""
+        if result.quantities is None:
+            with metrics.time('ocr_stage_seconds', stage='quantities'):
+                result.quantities = cls(result)
+        return result.quantities
+
+    def find_volume(self, value: float, unit: str, places: int = 0) -> List[Quantity]:
+        """Volume statements of the same amount: exactly within the metric units, to the rounding of a conversion to or from fl oz.
+
+        Args:
+            value (float): the amount as submitted
+            unit (str): UNITS_ML key of the submitted unit, statements in it come first
+            places (int): decimals the amount was submitted with
+
+        Returns:
+            List[Quantity]: the matching statements, in reading order after the unit preference
+        """
+        if not self.volumes:
+            return []
+        ml = value * UNITS_ML[unit]
+        difference = np.abs(self._ml - ml)
+        exact = difference <= _EXACT_RTOL * ml
+        # same unit, or metric units on both sides: nothing was converted, so nothing was rounded
+        converted = self._metric != (unit in METRIC_UNITS)
+        rows = np.flatnonzero(exact | (converted & (difference <= np.maximum(self._rounding, rounding(unit, places)))))
+        found = [self.volumes[row] for row in rows]
+        return sorted(found, key=lambda q: q.unit != unit)
+
+    def find_percent(self, value: float) -> List[int]:
+        """rdix ids of the boxes stating value followed by %, without repeats."""
+        if len(self._percent) == 0:
+            return []
+        rows = np.flatnonzero(np.abs(self._percent - value) < 1e-6)
+        return list(dict.fromkeys(self._percent_ids[row] for row in rows))
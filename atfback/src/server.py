@@ -1,11 +1,11 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory
 from flask_httpauth import HTTPBasicAuth
 from bcrypt import hashpw, gensalt, checkpw
 import os
 from datetime import datetime, timedelta
 from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity
 from flask_cors import CORS
-import threading
+import io
 import time
 from pathlib import Path
 import logging
@@ -19,9 +19,52 @@ except ImportError:
     logging.warning("dotenv not installed, proceeding without loading .env file")
     pass  # Will use defaults if dotenv not available
 
-from ocr_checker import OCRChecker
+from ocr_checker import OCRChecker, settings_from_env
+from ocr_cache import OCRCache
+from ocr_models import memory_usage
+from image_header import UploadRejected, admit_all
+from metrics import metrics
+from warmup import WarmUp
+from jobs import JobExecutor, JobStore, QueueFull, attach, current_job, default_workers, report_progress
 
-ocrchecker = OCRChecker(modelSelect=os.environ.get('OCR_MODEL', 'easyocr'))
+# Validations run on a bounded worker pool sharing the loaded model. Workers default to
+# what the cores and OCR_JOB_MEMORY_MB per running validation allow
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', 0)) or default_workers(int(os.environ.get('OCR_JOB_MEMORY_MB', 512)))
+
+# /metrics adds up every gunicorn worker's numbers kept in OCR_METRICS_DIR (gunicorn_config.py sets one up);
+# without it, only the numbers of the worker answering
+metrics.configure(os.environ.get('OCR_METRICS_DIR') or None)
+
+# Resubmitted images reuse their OCR result: OCR_CACHE_SIZE in memory, OCR_CACHE_DIR on disk if set
+OCR_CACHE_SIZE = int(os.environ.get('OCR_CACHE_SIZE', 256))
+OCR_CACHE_DIR = os.environ.get('OCR_CACHE_DIR') or None
+# the disk tier is kept under OCR_CACHE_DISK_MB, entries unused for OCR_CACHE_MAX_AGE_HOURS go first
+OCR_CACHE_DISK_MB = float(os.environ.get('OCR_CACHE_DISK_MB', 1024))
+OCR_CACHE_MAX_AGE_HOURS = float(os.environ.get('OCR_CACHE_MAX_AGE_HOURS', 168))
+ocr_cache = OCRCache(
+    OCR_CACHE_SIZE, OCR_CACHE_DIR,
+    max_disk_bytes=int(OCR_CACHE_DISK_MB * 2**20) if OCR_CACHE_DISK_MB > 0 else None,
+    max_age=OCR_CACHE_MAX_AGE_HOURS * 3600 if OCR_CACHE_MAX_AGE_HOURS > 0 else None,
+) if OCR_CACHE_SIZE > 0 or OCR_CACHE_DIR else None
+# model, preprocessing, rotations, staged recognition and warning text come from the OCR_* settings
+# (see settings_from_env), the benchmark reads the same ones
+ocrchecker = OCRChecker(
+    **settings_from_env(),
+    cache=ocr_cache,
+    # images of a submission are read in parallel; the pool is shared by all validations, so the
+    # memory bound on concurrent reads is the same as the one on workers
+    image_workers=int(os.environ.get('OCR_IMAGE_WORKERS', 0)) or OCR_WORKERS
+)
+
+# one inference on a synthetic label per serving process before /ready says so; gunicorn_config.py starts it
+# in each worker (after the fork), python server.py before serving. OCR_WARMUP=0 is ready right away
+warmup = WarmUp(ocrchecker, enabled=os.environ.get('OCR_WARMUP', '1') != '0')
+
+# Uploads are admitted from their header alone, before anything is decoded: at most OCR_MAX_PIXELS per image,
+# OCR_MAX_SUBMISSION_PIXELS for all images of a submission together and OCR_MAX_FRAMES frames/pages (0 for no limit)
+OCR_MAX_PIXELS = int(os.environ.get('OCR_MAX_PIXELS', 40_000_000))
+OCR_MAX_SUBMISSION_PIXELS = int(os.environ.get('OCR_MAX_SUBMISSION_PIXELS', 80_000_000))
+OCR_MAX_FRAMES = int(os.environ.get('OCR_MAX_FRAMES', 1))
 
 # Configure Flask to serve React static files
 # BUILD_PATH can be set via environment variable for Docker/production
@@ -36,16 +79,35 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
+app.logger.info(f"OCR models loaded: {OCRChecker.model_stats()}")
+
 CORS(app)  # Enable CORS
 auth = HTTPBasicAuth()
 
-# Processing status tracking
-is_processing = False  # Simple flag to prevent concurrent submissions
-last_result = None  # Store result for client to retrieve
-oimages = None  # Store processed images for client to retrieve
-
 OCR_TIMEOUT = int(os.environ.get('OCR_TIMEOUT', 60))  # 60 seconds timeout for OCR processing
 
+OCR_QUEUE_SIZE = int(os.environ.get('OCR_QUEUE_SIZE', 16))
+OCR_QUEUE_WAIT = float(os.environ.get('OCR_QUEUE_WAIT', 5))  # seconds to wait for queue space before a 503
+OCR_RESULT_TTL = float(os.environ.get('OCR_RESULT_TTL', 600))  # seconds a /jobs result can be fetched
+# ?images= on a submission: embed returns the annotated images as base64 jpgs, boxes only where the fields were found
+IMAGE_MODES = ('embed', 'boxes')
+# ?format= of /jobs/<job_id>/images/<index>: cv2 extension and mimetype
+IMAGE_FORMATS = {
+    'jpg': ('.jpg', 'image/jpeg'),
+    'png': ('.png', 'image/png'),
+    'webp': ('.webp', 'image/webp')
+}
+# /jobs polls may reach any gunicorn worker: jobs are shared through the OCR_JOB_STORE SQLite file
+# (gunicorn_config.py sets one up); without it, only the process that took the job knows it
+OCR_JOB_STORE = os.environ.get('OCR_JOB_STORE') or None
+executor = JobExecutor(
+    workers=OCR_WORKERS,
+    queue_size=OCR_QUEUE_SIZE,
+    submit_timeout=OCR_QUEUE_WAIT,
+    result_ttl=OCR_RESULT_TTL,
+    store=JobStore(OCR_JOB_STORE) if OCR_JOB_STORE else None
+)
+
 # Configuration from environment variables
 FLASK_ENV = os.environ.get('FLASK_ENV', 'development')
 SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
@@ -88,6 +150,32 @@ def verify_token():
     current_user_identity = get_jwt_identity()
     return jsonify(valid=True, user=current_user_identity, message="Token is valid"), 200
 
+@app.route('/ready', methods=['GET'])
+def get_ready():
+    """
+    Readiness probe for the load balancer, no login needed.
+    
+    Returns:
+    - 200 once this worker's model is warmed up, 503 until then (or if warm-up failed)
+    - ready, status (starting, warming, ready or failed), seconds the warm-up took, error
+    """
+    return jsonify(warmup.to_dict()), 200 if warmup.ready() else 503
+
+@app.after_request
+def flush_metrics(response):
+    """
+    Writes what a request recorded to OCR_METRICS_DIR before the next scrape can miss it.
+    """
+    metrics.flush(changed_only=True)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Stage latency histograms and counters of every worker, in the Prometheus text format.
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/processing-status', methods=['GET'])
 @jwt_required()
 def get_processing_status():
@@ -95,37 +183,36 @@ def get_processing_status():
     Check if server is currently processing.
     
     Returns:
-    - busy: boolean indicating if processing is active
+    - busy: boolean indicating if every worker is processing
+    - workers/running/queued/queue_size: executor load
+    - cache: OCR cache entries and hits, null if caching is off
+    - memory: this worker's rss/pss/shared/private bytes (shared is mostly the preloaded model)
     """
-    global is_processing
+    stats = executor.stats()
     return jsonify({
-        'busy': is_processing
+        'busy': executor.busy(),
+        **stats,
+        'cache': ocrchecker.cache.stats() if ocrchecker.cache else None,
+        'memory': memory_usage()
     }), 200
 
 
-@app.route('/submit-product', methods=['POST'])
-@jwt_required()
-def submit_product():
+def _queue_submission():
     """
-    Submit product information with images for validation.
-    Expects multipart/form-data with:
-    - brandName (text)
-    - productClass (text)
-    - alcoholContent (text/number)
-    - netContents (text/number)
-    - netContentsUnit (text)
-    - images (allows multiple files)
-    """
-    global is_processing, last_result
+    Check the uploaded images and queue the submission on the job executor.
+    Expects the multipart/form-data described in submit_product.
     
-    # Check if already processing
-    if is_processing:
-        return jsonify({
-            'success': False,
-            'error': 'Server is busy processing another submission. Please wait.'
-        }), 503
-        
+    Returns:
+    - (job, None) when queued, (None, (response, status)) when rejected
+    """
     MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 5 MB in bytes
+    image_mode = request.args.get('images', 'embed')
+    if image_mode not in IMAGE_MODES:
+        metrics.inc('ocr_rejections_total', reason='bad_request')
+        return None, (jsonify({
+            'success': False,
+            'error': f'images must be one of {", ".join(IMAGE_MODES)}'
+        }), 400)
     image_files = request.files.getlist('images')
     
     #check sizes of all images
@@ -137,32 +224,72 @@ def submit_product():
             image_file.seek(0)  # Reset file pointer
             
             if file_size > MAX_IMAGE_SIZE:
-                is_processing = False
-                return jsonify({
+                metrics.inc('ocr_rejections_total', reason='too_large')
+                return None, (jsonify({
                     'success': False,
                     'error': f'Image "{image_file.filename}" exceeds 5 MB limit. Size: {file_size / (1024*1024):.2f} MB'
-                }), 413
-    #TODO: proper file type checking
-        
-    # Mark as processing
-    is_processing = True
-    last_result = None
-    
-    # Start processing in a background thread
-    thread = threading.Thread(
-        target=_process_product,
-        args=(request.form, request.files, get_jwt_identity())
-    )
-    thread.daemon = True
-    thread.start()
-    thread.join(timeout=OCR_TIMEOUT + 5)  # Wait for thread to complete
+                }), 413)
+    
+    # Read everything out of the request here, the job outlives the request
+    form_data = request.form.to_dict()
+    images = _read_images(image_files)
+    
+    # Sniff the type and dimensions from the headers; a few KB of PNG can decode to gigabytes
+    names = [image_file.filename for image_file in image_files if image_file and image_file.filename]
+    try:
+        admit_all(zip(names, images), OCR_MAX_PIXELS, OCR_MAX_SUBMISSION_PIXELS, OCR_MAX_FRAMES)
+    except UploadRejected as e:
+        metrics.inc('ocr_rejections_total', reason=e.reason)
+        return None, (jsonify({
+            'success': False,
+            'error': str(e)
+        }), e.status)
+    user = get_jwt_identity()
+    
+    # Queue on the worker pool; waits for space for a while before giving up
+    try:
+        job = executor.submit(_process_product, form_data, images, user, image_mode, owner=user)
+    except QueueFull:
+        metrics.inc('ocr_rejections_total', reason='busy')
+        return None, (jsonify({
+            'success': False,
+            'error': 'Server is busy processing other submissions. Please wait.'
+        }), 503)
+    return job, None
+
+
+@app.route('/submit-product', methods=['POST'])
+@jwt_required()
+def submit_product():
+    """
+    Submit product information with images for validation and wait for the result.
+    Expects multipart/form-data with:
+    - brandName (text)
+    - productClass (text)
+    - alcoholContent (text/number)
+    - netContents (text/number)
+    - netContentsUnit (text)
+    - images (allows multiple files)
+    
+    Query parameters:
+    - images: embed (default) to get the annotated images back as base64 jpgs, boxes to get
+      the found boxes and image sizes instead (annotated images from /jobs/<job_id>/images/<index>)
+    """
+    job, rejected = _queue_submission()
+    if rejected:
+        return rejected
     
-    # Get result and reset flag
-    result = last_result
-    is_processing = False
-    last_result = None  # Clear last result after retrieval
+    if not job.wait(timeout=OCR_TIMEOUT + 5):  # Wait for the job to complete
+        # still running, its result will never be asked for
+        executor.abandon(job.id)
+        result = None
+    else:
+        result = job.result
+        if not job.attachments:
+            executor.discard(job.id)  # result is handed out here, nobody polls for it
     
     if result is None:
+        metrics.inc('ocr_timeouts_total')
         return jsonify({
             'success': False,
             'error': 'Processing timeout'
@@ -171,15 +298,147 @@ def submit_product():
     if 'error' in result:
         return jsonify(result), 500
     
-    return jsonify(result), 200 if result.get('success') else 200
+    return _serialize(result), 200 if result.get('success') else 200
+
+
+@app.route('/jobs', methods=['POST'])
+@jwt_required()
+def submit_job():
+    """
+    Queue product information with images for validation without waiting.
+    Expects the same multipart/form-data as /submit-product.
+    
+    Returns:
+    - job_id: id to poll /jobs/<job_id> and fetch /jobs/<job_id>/result with
+    
+    Jobs are shared through OCR_JOB_STORE, polls may reach any server process.
+    """
+    job, rejected = _queue_submission()
+    if rejected:
+        return rejected
+    
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status
+    }), 202
+
+
+def _get_own_job(job_id):
+    """
+    Look up a job submitted by the current user, None if there is none.
+    """
+    job = executor.get(job_id)
+    if job is None or job.owner != get_jwt_identity():
+        return None
+    return job
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """
+    Status and progress of a queued validation.
+    
+    Returns:
+    - status: queued, running, done or failed
+    - progress: image (index), images (count) and check currently running
+    """
+    job = _get_own_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 200
+
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+@jwt_required()
+def get_job_result(job_id):
+    """
+    Result of a finished validation, same body as /submit-product.
+    Returns 202 with the job status while it is still queued or running.
+    """
+    job = _get_own_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    if not job.done():
+        return jsonify(job.to_dict()), 202
+    
+    result = job.result
+    if result is None:
+        return jsonify({
+            'success': False,
+            'error': job.error or 'Processing failed'
+        }), 500
+    
+    if 'error' in result:
+        return jsonify(result), 500
+    
+    return _serialize(result), 200
+
+
+def _serialize(result):
+    """
+    jsonify a validation result, timed as the serialize stage.
+    """
+    with metrics.time('ocr_stage_seconds', stage='serialize'):
+        return jsonify(result)
+
+
+@app.route('/jobs/<job_id>/images/<int:index>', methods=['GET'])
+@jwt_required()
+def get_job_image(job_id, index):
+    """
+    An uploaded image of a finished ?images=boxes validation with the found boxes drawn on,
+    rendered on request.
+    
+    Query parameters:
+    - format: jpg (default), png or webp
+    - quality: 1-100 for jpg and webp
+    """
+    job = _get_own_job(job_id)
+    if job is None or not job.done() or 'images' not in job.attachments:
+        return jsonify({'success': False, 'error': 'Image not found'}), 404
+    images, geometry = job.attachments['images'], job.attachments['geometry']
+    if index >= len(images):
+        return jsonify({'success': False, 'error': 'Image not found'}), 404
+    
+    image_format = request.args.get('format', 'jpg').lower()
+    if image_format not in IMAGE_FORMATS:
+        return jsonify({'success': False, 'error': f'format must be one of {", ".join(IMAGE_FORMATS)}'}), 400
+    quality = request.args.get('quality', type=int)
+    if quality is not None and not 1 <= quality <= 100:
+        return jsonify({'success': False, 'error': 'quality must be between 1 and 100'}), 400
+    
+    ext, mimetype = IMAGE_FORMATS[image_format]
+    data = OCRChecker.annotate_image(images[index], geometry[index]['boxes'], ext, quality)
+    return send_file(io.BytesIO(data), mimetype=mimetype, max_age=OCR_RESULT_TTL,
+                     download_name=f'{job_id}-{index}.{image_format}')
 
 
-def _process_product(form_data, files_data, user):
+def _read_images(image_files):
     """
-    Background worker function for OCR processing.
+    Read uploaded images into memory as bytes.
     """
-    global last_result
+    images = []
+    for image_file in image_files:
+        if image_file and image_file.filename:
+            # Read image into memory as bytes
+            images.append(image_file.read())
+    return images
+
+
+def _process_product(form_data, images, user, image_mode='embed'):
+    """
+    Worker function for OCR processing. Runs on the job executor and
+    returns the result for this job only.
     
+    With image_mode boxes, the uploads are kept with the job for
+    /jobs/<job_id>/images/<index> instead of being annotated here.
+    """
+    job = current_job()
+    if job is not None and job.started is not None:
+        metrics.observe('ocr_queue_wait_seconds', job.started - job.created)
     try:
         # Get form fields
         brand_name = form_data.get('brandName')
@@ -188,16 +447,6 @@ def _process_product(form_data, files_data, user):
         net_contents = form_data.get('netContents')
         net_contents_unit = form_data.get('netContentsUnit')
         
-        # Get images (kept in memory as binary data)
-        image_files = files_data.getlist('images')
-        images = []
-        
-        for image_file in image_files:
-            if image_file and image_file.filename:
-                # Read image into memory as bytes
-                image_data = image_file.read()
-                images.append(image_data)
-        
         app.logger.info("Received the following data for validation:")
         app.logger.info(f"Brand Name: {brand_name}")
         app.logger.info(f"Product Class: {product_class}")
@@ -206,6 +455,9 @@ def _process_product(form_data, files_data, user):
         app.logger.info(f"Net Contents Unit: {net_contents_unit}")
         app.logger.info(f"Number of images received: {len(images)}")
         
+        if image_mode == 'boxes':
+            return _locate_product(images, user, brand_name, product_class, alcohol_content, net_contents, net_contents_unit)
+        
         # Perform OCR validation
         validation_results, oimages = ocrchecker.validate(
             images=images,
@@ -213,7 +465,8 @@ def _process_product(form_data, files_data, user):
             product_class=product_class,
             alcohol_content=alcohol_content,
             net_contents=net_contents,
-            net_contents_unit=net_contents_unit
+            net_contents_unit=net_contents_unit,
+            progress=report_progress
         )
         
         app.logger.info(f"Validation results: {validation_results}")
@@ -223,28 +476,61 @@ def _process_product(form_data, files_data, user):
         # Convert images to base64 for JSON response
         import base64
         images_base64 = []
-        for img_data in oimages:
-            img_b64 = base64.b64encode(img_data).decode('utf-8')
-            images_base64.append(f"data:image/jpeg;base64,{img_b64}")
+        with metrics.time('ocr_stage_seconds', stage='serialize_images'):
+            for img_data in oimages:
+                img_b64 = base64.b64encode(img_data).decode('utf-8')
+                images_base64.append(f"data:image/jpeg;base64,{img_b64}")
+        
+        app.logger.info("Processing completed successfully")
         
-        # Store result
-        last_result = {
+        return {
             'success': all_valid,
             'validations': validation_results,
             'user': user,
             'images': images_base64
         }
         
-        
-        
-        app.logger.info("Processing completed successfully")
-        
     except Exception as e:
-        last_result = {
+        app.logger.error(f"Error during processing: {e}", exc_info=True)
+        return {
             'success': False,
             'error': str(e)
         }
-        app.logger.error(f"Error during processing: {e}", exc_info=True)
+    finally:
+        # a job's stage timings reach OCR_METRICS_DIR when it ends, whichever worker is scraped next
+        metrics.flush(changed_only=True)
+
+
+def _locate_product(images, user, brand_name, product_class, alcohol_content, net_contents, net_contents_unit):
+    """
+    The boxes half of _process_product: where each field was found, per image.
+    """
+    validation_results, geometry = ocrchecker.locate(
+        images=images,
+        brand_name=brand_name,
+        product_class=product_class,
+        alcohol_content=alcohol_content,
+        net_contents=net_contents,
+        net_contents_unit=net_contents_unit,
+        progress=report_progress
+    )
+    app.logger.info(f"Validation results: {validation_results}")
+    
+    # kept for rendering annotated images on request, expires with the job
+    attach(images=images, geometry=geometry)
+    job_id = current_job().id if current_job() else None
+    for index, entry in enumerate(geometry):
+        entry['url'] = f'/jobs/{job_id}/images/{index}' if job_id else None
+    
+    app.logger.info("Processing completed successfully")
+    
+    return {
+        'success': all(validation_results.values()),
+        'validations': validation_results,
+        'user': user,
+        'job_id': job_id,
+        'geometry': geometry
+    }
 
 # ============================================
 # React Frontend Serving Routes
@@ -259,7 +545,7 @@ def serve_react(path):
     """
     # List of API routes that should not be served as React
     api_routes = [
-        'login', 'verify-token', 'submit-product', 'processing-status',
+        'login', 'verify-token', 'submit-product', 'processing-status', 'jobs', 'ready', 'metrics',
         'api/', 'protected'
     ]
     
@@ -291,4 +577,5 @@ if __name__ == '__main__':
     app.logger.info(f"Debug: {debug}")
     app.logger.info(f"{'='*60}")
     
+    warmup.start()
     app.run(host=host, port=port, debug=debug)
\ No newline at end of file
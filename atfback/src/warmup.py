@@ -0,0 +1,163 @@
+"""Model warm-up and readiness.
+
+Loading the weights is only part of a cold start: the first inference in a
+process also pays for torch's kernel selection and allocator growth, and
+would do so inside the first real submission's timeout. WarmUp runs one
+inference on a built-in synthetic label in each serving process and tracks
+whether that finished, so /ready can keep traffic away until it has.
+
+It runs a whole validation the way a submission does (preprocessing, staged
+detection and recognition, the checks), so everything built lazily on that
+path is ready too. Only the OCR cache is left out, so the model always runs
+and no process leaves an entry behind that nothing will ever read.
+
+The warm-up has to run in the process that serves, after any fork: torch's
+thread pools do not survive one, so warming up a preforking master helps
+none of its workers.
+"""
+from typing import Any, Dict, Optional
+import os
+import threading
+import time
+import logging
+
+import cv2
+import numpy as np
+
+try:
+    from .ocr_checker import OCRChecker
+    from .ocr_image import DecodedImage
+except ImportError:
+    from ocr_checker import OCRChecker
+    from ocr_image import DecodedImage
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+STARTING = 'starting'
+WARMING = 'warming'
+READY = 'ready'
+FAILED = 'failed'
+
+# what the synthetic label says, and the fields to check it with
+LABEL_FIELDS = {
+    'brand_name': 'WARM UP BREWING',
+    'product_class': 'PALE ALE',
+    'alcohol_content': '5.0',
+    'net_contents': '12',
+    'net_contents_unit': 'fl oz'
+}
+_LINES = [
+    ('WARM UP BREWING', 2.2, 5),
+    ('PALE ALE', 1.6, 4),
+    ('5.0% ALC./VOL.', 1.0, 2),
+    ('12 FL OZ', 1.0, 2),
+    ('GOVERNMENT WARNING: (1) ACCORDING TO THE SURGEON', 0.6, 1),
+    ('GENERAL, WOMEN SHOULD NOT DRINK ALCOHOLIC', 0.6, 1),
+    ('BEVERAGES DURING PREGNANCY BECAUSE OF THE RISK', 0.6, 1),
+    ('OF BIRTH DEFECTS. (2) CONSUMPTION OF ALCOHOLIC', 0.6, 1),
+    ('BEVERAGES IMPAIRS YOUR ABILITY TO DRIVE A CAR OR', 0.6, 1),
+    ('OPERATE MACHINERY, AND MAY CAUSE HEALTH PROBLEMS.', 0.6, 1)
+]
+
+
+def synthetic_label(width: int = 1000, height: int = 560) -> DecodedImage:
+    """A plain label with every checked field printed on it, big text to small print.
+
+    Args:
+        width (int): label width in pixels
+        height (int): label height in pixels
+
+    Returns:
+        DecodedImage: the label, PNG encoded as its data
+    """
+    pixels = np.full((height, width, 3), 255, np.uint8)
+    y = 40
+    for text, scale, thickness in _LINES:
+        (_, text_height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+        y += text_height + baseline + 20
+        cv2.putText(pixels, text, (40, y), cv2.FONT_HERSHEY_SIMPLEX, scale, (0, 0, 0), thickness, cv2.LINE_AA)
+    ok, buffer = cv2.imencode('.png', pixels)
+    if not ok:
+        raise ValueError("Could not encode the warm-up label")
+    return DecodedImage(buffer.tobytes(), pixels)
+
+
+class WarmUp:
+    """Warms up a checker's model once per process and reports readiness.
+
+    Attributes:
+        status (str): starting until run, then warming, ready or failed
+        seconds (float): how long the warm-up took, None until it finished
+        verifications (dict): what the checks found on the synthetic label
+        error (str): why it failed
+    """
+
+    def __init__(self, checker: OCRChecker, enabled: bool = True):
+        """
+        Args:
+            checker (OCRChecker): the checker requests will use
+            enabled (bool): False to report ready without warming up
+        """
+        self.checker = checker
+        self.enabled = enabled
+        self.status = STARTING if enabled else READY
+        self.seconds: Optional[float] = None
+        self.verifications: Optional[Dict[str, bool]] = None
+        self.error: Optional[str] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        if not enabled:
+            self._done.set()
+
+    def run(self):
+        """Runs the warm-up in this thread. Failures are recorded, not raised."""
+        self.status = WARMING
+        start = time.perf_counter()
+        try:
+            self.verifications = self.checker.warm_up(synthetic_label(), **LABEL_FIELDS)
+            self.status = READY
+            # a miss only means the model reads this font badly, the inference ran either way
+            logger.info(f'Model warm-up took {time.perf_counter() - start:.2f}s, found {self.verifications}')
+        except Exception as e:
+            self.error = str(e)
+            self.status = FAILED
+            logger.error(f'Model warm-up failed: {e}', exc_info=True)
+        finally:
+            self.seconds = time.perf_counter() - start
+            self._done.set()
+
+    def start(self) -> Optional[threading.Thread]:
+        """Starts the warm-up on a background thread, once per process.
+
+        Returns:
+            threading.Thread: the warm-up thread, None if warm-up is disabled
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            # started before a fork: the thread stayed behind in the parent, this process needs its own
+            if self._thread is None or self._pid != os.getpid():
+                self.status, self.seconds, self.error = STARTING, None, None
+                self._done.clear()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self.run, name='ocr-warmup', daemon=True)
+                self._thread.start()
+            return self._thread
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Waits for the warm-up to finish, True if it did."""
+        return self._done.wait(timeout)
+
+    def ready(self) -> bool:
+        return self.status == READY
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'ready': self.ready(),
+            'status': self.status,
+            'seconds': round(self.seconds, 3) if self.seconds is not None else None,
+            'error': self.error
+        }
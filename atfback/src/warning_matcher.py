@@ -0,0 +1,226 @@
+"""Government warning verification over the image's reading-ordered text.
+
+The check used to accept any box scoring above 80 against "GOVERNMENT
+WARNING" and never looked at the mandated statement (27 CFR 16.21), which is
+long, set in small print and split over many boxes. WarningMatcher checks the
+heading and both clauses:
+
+    GOVERNMENT WARNING: (1) According to the Surgeon General, women should
+    not drink alcoholic beverages during pregnancy because of the risk of
+    birth defects. (2) Consumption of alcoholic beverages impairs your
+    ability to drive a car or operate machinery, and may cause health
+    problems.
+
+Every word of the statement (and both halves of the longer ones, so a word
+with a misread letter still counts for part of its length) goes into one
+Aho-Corasick automaton, compiled once. A single pass over the cleaned text
+of the image's blocks, in reading order, finds every occurrence of every
+word at once, also inside words OCR ran together. Each clause is then
+verified from its own hits: the best chain of words in the clause's order,
+with limited text between them, has to cover CLAUSE_COVERAGE of the clause's
+letters. A hit can only follow hits that end at most GAP_PER_WORD characters
+per word of the clause before it, so each hit looks back over a window of
+the text, not over every earlier hit: a label printing the statement many
+times costs linear time, not quadratic. The hits map back to the boxes each
+clause was read from.
+"""
+from bisect import bisect_left, bisect_right
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+import logging
+
+try:
+    from .ocr_result import OCRResult
+    from .ocr_layout import Layout, Span
+except ImportError:
+    from ocr_result import OCRResult
+    from ocr_layout import Layout, Span
+
+# Set up logger for this module
+logger = logging.getLogger(__name__)
+
+# (name, text) of every part of the statement, as clean_text leaves it
+WARNING_CLAUSES: Tuple[Tuple[str, str], ...] = (
+    ('heading', 'GOVERNMENT WARNING'),
+    ('pregnancy', 'ACCORDING TO THE SURGEON GENERAL WOMEN SHOULD NOT DRINK ALCOHOLIC BEVERAGES DURING PREGNANCY BECAUSE OF THE RISK OF BIRTH DEFECTS'),
+    ('machinery', 'CONSUMPTION OF ALCOHOLIC BEVERAGES IMPAIRS YOUR ABILITY TO DRIVE A CAR OR OPERATE MACHINERY AND MAY CAUSE HEALTH PROBLEMS')
+)
+# share of a clause's letters its best chain of words has to cover
+CLAUSE_COVERAGE = 0.75
+# words shorter than this are too common to place a clause, they neither count nor match
+MIN_WORD = 3
+# words this long are also matched by halves
+SPLIT_WORD = 6
+# characters allowed between two matched words per word of the clause between them
+GAP_PER_WORD = 20
+# digits OCR reads in place of letters; the statement has none but the clause numbers
+_CONFUSABLES = str.maketrans({'0': 'O', '1': 'I', '5': 'S'})
+
+
+class AhoCorasick:
+    """Multi-pattern string automaton: all occurrences of all patterns in one pass over a text."""
+
+    def __init__(self, patterns: Sequence[str]):
+        """
+        Args:
+            patterns (Sequence[str]): strings to find, reported by their index
+        """
+        self.lengths = [len(pattern) for pattern in patterns]
+        self._goto: List[Dict[str, int]] = [{}]
+        self._out: List[List[int]] = [[]]
+        for n, pattern in enumerate(patterns):
+            state = 0
+            for char in pattern:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._out.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._out[state].append(n)
+        # failure links breadth first, each state's outputs include those of its failure state
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find_all(self, text: str) -> List[Tuple[int, int]]:
+        """Every (start, pattern index) occurrence in text, by end position."""
+        found = []
+        state = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for end, char in enumerate(text, start=1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for n in out[state]:
+                found.append((end - self.lengths[n], n))
+        return found
+
+
+class ClauseMatch:
+    """How well one clause of the warning was found.
+
+    Attributes:
+        name (str): the clause's name in WARNING_CLAUSES
+        coverage (float): share of the clause's letters found in order
+        ids (List[int]): rdix ids of the boxes it was read from, in reading order
+    """
+
+    def __init__(self, name: str, coverage: float, ids: List[int]):
+        self.name = name
+        self.coverage = coverage
+        self.ids = ids
+
+    @property
+    def found(self) -> bool:
+        return self.coverage >= CLAUSE_COVERAGE
+
+    def __repr__(self):
+        return f'ClauseMatch({self.name}, {self.coverage:.2f}, found={self.found})'
+
+
+class WarningMatcher:
+    """The warning's clauses compiled into one automaton."""
+
+    def __init__(self, clauses: Sequence[Tuple[str, str]] = WARNING_CLAUSES):
+        self.names = [name for name, _ in clauses]
+        # per clause, the letters of the words that count
+        self.totals = []
+        # per clause, the most text there can be between two hits of one chain
+        self._max_gaps = []
+        patterns: List[str] = []
+        # per pattern: (clause, word position in the clause, letters it is worth)
+        self._targets: List[List[Tuple[int, int, int]]] = []
+        index: Dict[str, int] = {}
+
+        def add(pattern: str, target: Tuple[int, int, int]):
+            if pattern not in index:
+                index[pattern] = len(patterns)
+                patterns.append(pattern)
+                self._targets.append([])
+            self._targets[index[pattern]].append(target)
+
+        for c, (_, text) in enumerate(clauses):
+            words = text.split()
+            self.totals.append(sum(len(word) for word in words if len(word) >= MIN_WORD))
+            self._max_gaps.append(GAP_PER_WORD * len(words))
+            for w, word in enumerate(words):
+                if len(word) < MIN_WORD:
+                    continue
+                add(word, (c, w, len(word)))
+                if len(word) >= SPLIT_WORD:
+                    half = len(word) // 2
+                    add(word[:half], (c, w, half))
+                    add(word[half:], (c, w, len(word) - half))
+        self._automaton = AhoCorasick(patterns)
+
+    def match(self, span: Span) -> Dict[str, ClauseMatch]:
+        """Finds every clause in a span's text.
+
+        Args:
+            span (Span): the image's boxes in reading order
+
+        Returns:
+            dict: clause name to its ClauseMatch
+        """
+        text = span.text.translate(_CONFUSABLES)
+        # per clause: (start, end, word position, letters) of every hit
+        hits: List[List[Tuple[int, int, int, int]]] = [[] for _ in self.names]
+        for start, n in self._automaton.find_all(text):
+            end = start + self._automaton.lengths[n]
+            for c, w, credit in self._targets[n]:
+                hits[c].append((start, end, w, credit))
+        return {name: self._chain(c, hits[c], span) for c, name in enumerate(self.names)}
+
+    def _chain(self, c: int, hits: List[Tuple[int, int, int, int]], span: Span) -> ClauseMatch:
+        # best chain of hits in text order with rising word positions and bounded gaps between them
+        if not hits or not self.totals[c]:
+            return ClauseMatch(self.names[c], 0.0, [])
+        hits.sort()
+        best = [credit for _, _, _, credit in hits]
+        back = [-1] * len(hits)
+        # hits by end, so the ones a hit can follow are found by bisection; all of them start earlier, so come first in hits
+        by_end = sorted(range(len(hits)), key=lambda k: hits[k][1])
+        ends = [hits[k][1] for k in by_end]
+        for j, (start, _, w, credit) in enumerate(hits):
+            for k in by_end[bisect_left(ends, start - self._max_gaps[c]):bisect_right(ends, start)]:
+                _, kend, kw, _ = hits[k]
+                if kw < w and start - kend <= GAP_PER_WORD * (w - kw) and best[k] + credit > best[j]:
+                    best[j] = best[k] + credit
+                    back[j] = k
+        j = max(range(len(hits)), key=best.__getitem__)
+        coverage = min(best[j] / self.totals[c], 1.0)
+        chain = []
+        while j != -1:
+            chain.append(hits[j])
+            j = back[j]
+        chain.reverse()
+        ids = span.boxes_at(chain[0][0], chain[-1][1])
+        return ClauseMatch(self.names[c], coverage, ids)
+
+    def verify(self, result: OCRResult) -> Dict[str, ClauseMatch]:
+        """Finds every clause of the warning on an image, in one pass over its blocks.
+
+        Args:
+            result (OCRResult): normalized OCR data
+
+        Returns:
+            dict: clause name to its ClauseMatch
+        """
+        blocks = Layout.of(result).blocks
+        ids = [i for block in blocks for i in block.ids]
+        return self.match(Span(ids, [result.clean[i] for i in ids]))
+
+
+@lru_cache(maxsize=1)
+def compile_warning_matcher() -> WarningMatcher:
+    """Returns the WarningMatcher of the statement, built once per process."""
+    return WarningMatcher()
@@ -0,0 +1,75 @@
+"""
+Tests for the alcohol content matcher
+"""
+import pytest
+
+from src.abv_matcher import ABVMatcher, has_abv_context, parse_abv
+from src.ocr_backends import build_ocr_index
+
+
+def _box(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+
+
+def _ocr(*boxes):
+    return build_ocr_index([(bbox, text, 0.9) for bbox, text in boxes])
+
+
+class TestABVMatcher:
+    """Tests for ABVMatcher"""
+
+    @pytest.mark.parametrize("text,value", [
+        ("40% ALCOHOL BY VOLUME", "40"),
+        ("Alc 13.5% by Vol", "13.5"),
+        ("5.8% ALC./VOL.", "5.8"),
+        ("5,8% alc/vol", "5.8"),
+        ("12.5% ABV", "12.5%"),
+        ("40 % Alc0hol by Volume", "40"),
+    ])
+    def test_single_box(self, text, value):
+        ocrdata, _ = _ocr((_box(10, 10, 300, 40), text))
+        found, boxes = ABVMatcher(value).find(ocrdata)
+        assert found is True
+        assert boxes == [(10, 10, 300, 40)]
+
+    @pytest.mark.parametrize("text,value", [
+        ("40% ALCOHOL BY VOLUME", "4"),
+        ("140% ALCOHOL BY VOLUME", "40"),
+        ("40% OFF EVERYTHING", "40"),
+        ("40 ALCOHOL BY VOLUME", "40"),
+        ("40% ALCOHOL BY VOLUME", "not a number"),
+    ])
+    def test_no_match(self, text, value):
+        ocrdata, _ = _ocr((_box(10, 10, 300, 40), text))
+        found, boxes = ABVMatcher(value).find(ocrdata)
+        assert found is False
+        assert boxes == []
+
+    def test_split_boxes(self):
+        """Number and wording in neighbouring boxes"""
+        ocrdata, _ = _ocr(
+            (_box(10, 10, 60, 40), "ALC."),
+            (_box(70, 10, 130, 40), "12.5%"),
+            (_box(140, 10, 260, 40), "BY VOL."),
+            (_box(600, 600, 700, 630), "BY VOLUME"),
+        )
+        found, boxes = ABVMatcher("12.5").find(ocrdata)
+        assert found is True
+        assert boxes[0] == (70, 10, 130, 40)
+        assert set(boxes[1:]) == {(10, 10, 60, 40), (140, 10, 260, 40)}
+
+    def test_split_context_must_be_near(self):
+        ocrdata, _ = _ocr(
+            (_box(10, 10, 60, 40), "12.5%"),
+            (_box(800, 800, 990, 830), "ALC BY VOL"),
+        )
+        assert ABVMatcher("12.5").find(ocrdata) == (False, [])
+
+    def test_parse_abv(self):
+        assert parse_abv("12.5%") == 12.5
+        assert parse_abv(" 40 ") == 40.0
+        assert parse_abv("") is None
+
+    def test_context(self):
+        assert has_abv_context("ALCOHOL BY VOLUME")
+        assert not has_abv_context("ALCOHOLIC BEVERAGES")
@@ -0,0 +1,58 @@
+"""
+Tests for the batch audit runner, using the replay OCR backend
+"""
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from src.audit import read_manifest, run_audit
+
+FIXTURE_PATH = str(Path(__file__).parent / "fixtures" / "replay_ocr.json")
+TEST_IMAGE_PATH = Path(__file__).parent.parent.parent / "examples" / "2white christmas.png"
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    """CSV manifest with one matching and one mismatching label"""
+    if not TEST_IMAGE_PATH.exists():
+        pytest.skip(f"Test image not found at {TEST_IMAGE_PATH}")
+    path = tmp_path / "manifest.csv"
+    path.write_text(
+        "id,images,brand_name,product_class,alcohol_content,net_contents,net_contents_unit\n"
+        f"sam,{TEST_IMAGE_PATH},Samuel Adams,Ale,5.8,12,fl oz\n"
+        f"goose,{TEST_IMAGE_PATH},Grey Goose,Vodka,40,750,ml\n"
+        "missing,nope.png,Grey Goose,Vodka,40,750,ml\n"
+    )
+    return str(path)
+
+
+class TestAudit:
+    """Tests for the audit runner"""
+
+    def test_read_csv_manifest(self, manifest):
+        entries = list(read_manifest(manifest))
+        assert [e['id'] for e in entries] == ['sam', 'goose', 'missing']
+        assert entries[0]['images'] == [str(TEST_IMAGE_PATH)]
+        assert entries[0]['net_contents_unit'] == 'fl oz'
+
+    def test_read_jsonl_manifest(self, tmp_path):
+        path = tmp_path / "manifest.jsonl"
+        path.write_text(json.dumps({'images': ['a.png', 'b.png'], 'brand_name': 'X'}) + '\n')
+        entry = next(read_manifest(str(path)))
+        assert entry['id'] == '0'
+        assert entry['images'] == [str(tmp_path / 'a.png'), str(tmp_path / 'b.png')]
+        assert entry['alcohol_content'] == ''
+
+    def test_run_audit_streams_results(self, manifest):
+        output = io.StringIO()
+        summary = run_audit(manifest, output, workers=2, model='replay', fixture_path=FIXTURE_PATH)
+        results = {r['id']: r for r in map(json.loads, output.getvalue().splitlines())}
+        assert set(results) == {'sam', 'goose', 'missing'}
+        assert results['sam']['validations']['brand_name'] is True
+        assert results['goose']['validations']['brand_name'] is False
+        assert 'error' in results['missing']
+        assert summary['labels'] == 3
+        assert summary['errors'] == 1
+        assert summary['labels_per_minute'] > 0
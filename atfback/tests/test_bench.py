@@ -0,0 +1,72 @@
+"""
+Tests for the per-stage benchmark, in replay mode
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+from src.bench import STAGES, bench_checker, compare, main, run_benchmark
+from src.audit import read_manifest
+from src.ocr_checker import OCRChecker
+
+
+FIXTURE_PATH = str(Path(__file__).parent / "fixtures" / "replay_ocr.json")
+EXAMPLES = Path(__file__).parent.parent.parent / "examples"
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    """Manifest of the label the replay fixture has"""
+    if not (EXAMPLES / "2white christmas.png").exists():
+        pytest.skip("Test image not found")
+    path = tmp_path / "manifest.csv"
+    path.write_text("id,images,brand_name,product_class,alcohol_content,net_contents,net_contents_unit\n"
+                    f"wc,{EXAMPLES / '2white christmas.png'},Samuel Adams,Ale,5.8,12,fl oz\n")
+    return str(path)
+
+
+def report_with(wall, rss_delta=0):
+    return {'stages': {'ocr': {'wall': wall, 'cpu': wall, 'rss': 2**30, 'rss_delta': rss_delta}}}
+
+
+class TestBench:
+    """Tests for run_benchmark and compare"""
+
+    def test_every_stage_is_timed(self, manifest):
+        checker = OCRChecker(modelSelect='replay', fixture_path=FIXTURE_PATH)
+        report = run_benchmark(checker, list(read_manifest(manifest)), repeat=2)
+        assert report['meta']['model'] == 'replay' and report['meta']['images'] == 1
+        (image,) = report['images']
+        assert list(image['stages']) == STAGES
+        for row in report['stages'].values():
+            assert row['wall'] >= 0 and row['cpu'] >= 0 and row['rss'] > 0
+
+    def test_regressions_past_the_tolerance(self):
+        baseline = report_with(0.1)
+        assert compare(report_with(0.12), baseline, tolerance=0.25) == []
+        assert len(compare(report_with(0.2), baseline, tolerance=0.25)) == 1
+        # tiny stages are all noise
+        assert compare(report_with(0.003), report_with(0.001), tolerance=0.25, min_seconds=0.005) == []
+        # a stage holding on to 8 MB more than it used to, but not a stage that stayed within the noise floor
+        assert len(compare(report_with(0.1, rss_delta=8 * 2**20), baseline, rss_tolerance=0.1)) == 1
+        assert compare(report_with(0.1, rss_delta=2**19), baseline, rss_tolerance=0.1, min_rss=2**20) == []
+
+    def test_validate_runs_like_the_server(self, monkeypatch):
+        monkeypatch.setenv('OCR_RECOGNIZE_BATCH', '3')
+        checker = bench_checker('replay', FIXTURE_PATH)
+        assert checker.modelname == 'replay' and checker.cache is None
+        assert checker.recognize_batch == 3
+
+    def test_cli_fails_on_regression(self, manifest, tmp_path, capsys):
+        output = tmp_path / "report.json"
+        assert main([manifest, '--model', 'replay', '--fixtures', FIXTURE_PATH, '--repeat', '1', '--output', str(output)]) == 0
+        report = json.loads(output.read_text())
+        # a baseline from a much faster machine
+        for row in report['stages'].values():
+            row['wall'] /= 100
+        baseline = tmp_path / "baseline.json"
+        baseline.write_text(json.dumps(report))
+        assert main([manifest, '--model', 'replay', '--fixtures', FIXTURE_PATH, '--repeat', '1', '--output', str(output),
+                     '--baseline', str(baseline)]) == 1
+        assert 'REGRESSION decode' in capsys.readouterr().err
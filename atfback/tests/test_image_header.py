@@ -0,0 +1,113 @@
+"""
+Tests for header-only upload inspection
+"""
+from io import BytesIO
+import struct
+import zlib
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.image_header import UploadRejected, admit, admit_all, read_header
+
+
+def _cv2(ext, width=64, height=48):
+    ok, buffer = cv2.imencode(ext, np.zeros((height, width, 3), np.uint8))
+    assert ok
+    return buffer.tobytes()
+
+
+def _pil(format, width=64, height=48, frames=1, **kwargs):
+    images = [Image.new('RGB', (width, height), (n * 40, 0, 0)) for n in range(frames)]
+    out = BytesIO()
+    images[0].save(out, format, save_all=frames > 1, append_images=images[1:], **kwargs)
+    return out.getvalue()
+
+
+def _png_bomb(side):
+    """A PNG claiming side x side pixels, a few KB of zlib that inflates to all of them"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    row = b'\x00' + b'\x00' * side
+    compressor = zlib.compressobj(9)
+    idat = b''.join(compressor.compress(row) for _ in range(side)) + compressor.flush()
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', side, side, 8, 0, 0, 0, 0))
+            + chunk(b'IDAT', idat) + chunk(b'IEND', b''))
+
+
+class TestReadHeader:
+    """Tests for read_header"""
+
+    @pytest.mark.parametrize('ext,format', [('.png', 'png'), ('.jpg', 'jpeg'), ('.webp', 'webp'), ('.bmp', 'bmp'), ('.tiff', 'tiff')])
+    def test_cv2_formats(self, ext, format):
+        header = read_header(_cv2(ext, 123, 45))
+        assert (header.format, header.width, header.height, header.frames) == (format, 123, 45, 1)
+
+    def test_progressive_jpeg(self):
+        header = read_header(_pil('JPEG', 300, 200, progressive=True))
+        assert (header.format, header.width, header.height) == ('jpeg', 300, 200)
+
+    def test_lossless_webp(self):
+        header = read_header(_pil('WEBP', 77, 33, lossless=True))
+        assert (header.width, header.height) == (77, 33)
+
+    @pytest.mark.parametrize('format', ['PNG', 'WEBP', 'TIFF', 'GIF'])
+    def test_frames(self, format):
+        header = read_header(_pil(format, frames=3))
+        assert header.frames == (1 if format == 'GIF' else 3)
+        assert (header.width, header.height) == (64, 48)
+
+    def test_not_an_image(self):
+        assert read_header(b'%PDF-1.7 not an image') is None
+        assert read_header(b'') is None
+
+    def test_truncated(self):
+        with pytest.raises(ValueError):
+            read_header(_cv2('.png')[:20])
+        with pytest.raises(ValueError):
+            read_header(b'\xff\xd8\xff\xe0\x00\x10JFIF')
+
+    def test_bomb_read_without_inflating(self):
+        data = _png_bomb(10000)
+        assert len(data) < 1024 * 1024
+        header = read_header(data)
+        assert header.pixels == 100_000_000
+
+
+class TestAdmit:
+    """Tests for admit and admit_all"""
+
+    def test_admits_label(self):
+        assert admit(_cv2('.jpg'), max_pixels=10_000).format == 'jpeg'
+
+    def test_rejects_bomb(self):
+        with pytest.raises(UploadRejected) as e:
+            admit(_png_bomb(10000), max_pixels=40_000_000, name='bomb.png')
+        assert (e.value.reason, e.value.status) == ('too_many_pixels', 413)
+        assert 'bomb.png' in str(e.value)
+
+    def test_rejects_other_files(self):
+        with pytest.raises(UploadRejected) as e:
+            admit(b'<html></html>', max_pixels=0)
+        assert (e.value.reason, e.value.status) == ('bad_image', 415)
+        with pytest.raises(UploadRejected) as e:
+            admit(_pil('GIF'), max_pixels=0)
+        assert (e.value.reason, e.value.status) == ('unsupported_format', 415)
+        with pytest.raises(UploadRejected) as e:
+            admit(_cv2('.png')[:20], max_pixels=0)
+        assert (e.value.reason, e.value.status) == ('bad_image', 400)
+
+    def test_frames(self):
+        with pytest.raises(UploadRejected) as e:
+            admit(_pil('PNG', frames=2), max_pixels=0)
+        assert e.value.reason == 'too_many_frames'
+        assert admit(_pil('PNG', frames=2), max_pixels=0, max_frames=0).frames == 2
+
+    def test_submission_budget(self):
+        uploads = [('front.png', _cv2('.png', 100, 100)), ('back.png', _cv2('.png', 100, 100))]
+        assert len(admit_all(uploads, max_pixels=10_000, max_total_pixels=20_000)) == 2
+        with pytest.raises(UploadRejected) as e:
+            admit_all(uploads, max_pixels=10_000, max_total_pixels=15_000)
+        assert e.value.reason == 'too_many_pixels'
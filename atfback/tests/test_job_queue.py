@@ -0,0 +1,130 @@
+"""
+Tests for the SQLite job queue and the headless worker, using the replay OCR backend
+"""
+import io
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+import pytest
+
+from src.job_queue import SQLiteJobQueue, open_queue
+from src.ocr_worker import run_worker
+from src.ocr_checker import OCRChecker
+from src.audit import run_audit_queued
+
+FIXTURE_PATH = str(Path(__file__).parent / "fixtures" / "replay_ocr.json")
+TEST_IMAGE_PATH = Path(__file__).parent.parent.parent / "examples" / "2white christmas.png"
+
+
+@pytest.fixture
+def job_queue(tmp_path):
+    return open_queue(f"sqlite:///{tmp_path / 'jobs.db'}")
+
+
+class TestSQLiteJobQueue:
+    """Tests for SQLiteJobQueue"""
+
+    def test_put_take_complete(self, job_queue):
+        job_id = job_queue.put({'brand_name': 'X'})
+        job = job_queue.take('w1')
+        assert job['id'] == job_id
+        assert job_queue.take('w2') is None, "a taken job should not be handed out twice"
+        assert job_queue.result(job_id) is None
+        job_queue.complete(job_id, {'id': job_id, 'success': True})
+        assert job_queue.result(job_id) == {'id': job_id, 'success': True}
+        assert job_queue.pending() == 0
+
+    def test_expired_lease_is_handed_out_again(self, tmp_path):
+        q = SQLiteJobQueue(str(tmp_path / 'lease.db'), lease_seconds=0)
+        job_id = q.put({'id': 'a'})
+        assert q.take('w1')['id'] == job_id
+        assert q.take('w2')['id'] == job_id
+
+    def test_concurrent_takes_never_share_a_job(self, job_queue):
+        for n in range(40):
+            job_queue.put({'id': str(n)})
+        taken = []
+        lock = threading.Lock()
+
+        def take_all(name):
+            while True:
+                job = job_queue.take(name)
+                if job is None:
+                    return
+                with lock:
+                    taken.append(job['id'])
+
+        threads = [threading.Thread(target=take_all, args=(f'w{i}',)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert sorted(taken, key=int) == [str(n) for n in range(40)]
+
+    def test_results_of(self, job_queue):
+        ids = [job_queue.put({'n': n}) for n in range(3)]
+        job_queue.take('w1')
+        job_queue.complete(ids[0], {'id': ids[0], 'success': True})
+        assert job_queue.results_of(ids) == {ids[0]: {'id': ids[0], 'success': True}}
+
+    def test_unsupported_queue(self):
+        with pytest.raises(ValueError):
+            open_queue('kafka://broker:9092/labels')
+
+
+class TestWorker:
+    """Runs a queued audit against a headless worker"""
+
+    def test_queued_audit(self, job_queue, tmp_path):
+        if not TEST_IMAGE_PATH.exists():
+            pytest.skip(f"Test image not found at {TEST_IMAGE_PATH}")
+        manifest = tmp_path / "manifest.jsonl"
+        fields = {'images': [str(TEST_IMAGE_PATH)], 'product_class': 'Ale', 'alcohol_content': '5.8', 'net_contents': '12', 'net_contents_unit': 'fl oz'}
+        manifest.write_text(
+            json.dumps({'id': 'sam', 'brand_name': 'Samuel Adams', **fields}) + '\n'
+            + json.dumps({'id': 'goose', 'brand_name': 'Grey Goose', **fields}) + '\n'
+        )
+        checker = OCRChecker(modelSelect='replay', fixture_path=FIXTURE_PATH)
+        stop = threading.Event()
+        worker = threading.Thread(target=run_worker, args=(job_queue, checker), kwargs={'poll_interval': 0.05, 'stop': stop})
+        worker.start()
+        try:
+            output = io.StringIO()
+            summary = run_audit_queued(str(manifest), output, job_queue, poll_interval=0.05)
+        finally:
+            stop.set()
+            worker.join()
+        results = {r['id']: r for r in map(json.loads, output.getvalue().splitlines())}
+        assert results['sam']['validations']['brand_name'] is True
+        assert results['goose']['validations']['brand_name'] is False
+        assert summary['labels'] == 2
+
+    def test_worker_clock_behind(self, job_queue, tmp_path):
+        """A worker whose clock is far behind still has its results collected"""
+        manifest = tmp_path / "manifest.jsonl"
+        manifest.write_text(json.dumps({'id': 'late', 'images': [], 'brand_name': 'X'}) + '\n')
+
+        def slow_worker():
+            job = None
+            while job is None:
+                job = job_queue.take('w1')
+            job_queue.complete(job['id'], {'id': job['id'], 'success': True})
+            # stamped as finished long before the producer started polling
+            with sqlite3.connect(job_queue.path) as conn:
+                conn.execute("UPDATE jobs SET finished = 1000 WHERE id = ?", (job['id'],))
+
+        worker = threading.Thread(target=slow_worker)
+        worker.start()
+        output = io.StringIO()
+        summary = run_audit_queued(str(manifest), output, job_queue, poll_interval=0.05, timeout=5)
+        worker.join()
+        assert summary['labels'] == 1 and summary['outstanding'] == []
+
+    def test_gives_up_on_outstanding_jobs(self, job_queue, tmp_path):
+        """Without workers the audit stops after the timeout and reports what never came back"""
+        manifest = tmp_path / "manifest.jsonl"
+        manifest.write_text(json.dumps({'id': 'a', 'images': []}) + '\n' + json.dumps({'id': 'b', 'images': []}) + '\n')
+        summary = run_audit_queued(str(manifest), io.StringIO(), job_queue, poll_interval=0.05, timeout=0.2)
+        assert summary['labels'] == 0 and summary['outstanding'] == ['a', 'b']
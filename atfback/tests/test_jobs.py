@@ -0,0 +1,198 @@
+"""
+Tests for the in-process job executor
+"""
+import os
+import threading
+
+import pytest
+
+from src.jobs import JobExecutor, JobStore, QueueFull, DONE, FAILED, attach, default_workers, report_progress
+
+
+class TestJobExecutor:
+    """Tests for JobExecutor"""
+
+    def test_each_job_gets_its_own_result(self):
+        """Concurrent jobs should never see each other's results"""
+        executor = JobExecutor(workers=4, queue_size=32)
+        jobs = [executor.submit(lambda n: n * n, n) for n in range(20)]
+        for n, job in enumerate(jobs):
+            assert job.wait(timeout=5)
+            assert job.status == DONE
+            assert job.result == n * n
+
+    def test_jobs_run_concurrently(self):
+        """Two workers should run two jobs at the same time"""
+        executor = JobExecutor(workers=2, queue_size=4)
+        barrier = threading.Barrier(2, timeout=5)
+        jobs = [executor.submit(barrier.wait) for _ in range(2)]
+        for job in jobs:
+            assert job.wait(timeout=5)
+            assert job.status == DONE
+
+    def test_failed_job_records_error(self):
+        """Exceptions should mark the job failed instead of killing the worker"""
+        executor = JobExecutor(workers=1, queue_size=4)
+
+        def boom():
+            raise RuntimeError("bad label")
+
+        job = executor.submit(boom)
+        assert job.wait(timeout=5)
+        assert job.status == FAILED
+        assert job.error == "bad label"
+        # worker is still alive
+        assert executor.submit(lambda: 1).wait(timeout=5)
+
+    def test_full_queue_rejects_after_waiting(self):
+        """Submitting to a full queue should wait then raise QueueFull"""
+        executor = JobExecutor(workers=1, queue_size=1, submit_timeout=0.1)
+        release = threading.Event()
+        running = executor.submit(release.wait)
+        queued = executor.submit(lambda: None)
+        # the worker may not have picked up the first job yet
+        with pytest.raises(QueueFull):
+            executor.submit(lambda: None)
+            executor.submit(lambda: None)
+        release.set()
+        assert running.wait(timeout=5)
+        assert queued.wait(timeout=5)
+
+    def test_progress_and_lookup(self):
+        """Progress reported from inside a job should show up on that job"""
+        executor = JobExecutor(workers=1, queue_size=4)
+
+        def work():
+            report_progress(image=0, images=2, check='brand_name')
+            return 'ok'
+
+        job = executor.submit(work, owner='user')
+        assert job.wait(timeout=5)
+        assert executor.get(job.id) is job
+        assert job.owner == 'user'
+        assert job.to_dict()['progress'] == {'image': 0, 'images': 2, 'check': 'brand_name'}
+        executor.discard(job.id)
+        assert executor.get(job.id) is None
+
+    def test_default_workers(self):
+        assert default_workers() >= 1
+        assert default_workers(job_memory_mb=10**9) == 1
+
+    @pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs fork")
+    def test_runs_jobs_in_a_forked_child(self):
+        """A preforked server worker gets worker threads of its own"""
+        executor = JobExecutor(workers=1, queue_size=4)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                job = executor.submit(lambda: 42)
+                os._exit(0 if job.wait(timeout=5) and job.result == 42 else 1)
+            except BaseException:
+                os._exit(2)
+        _, status = os.waitpid(pid, 0)
+        assert os.WEXITSTATUS(status) == 0
+        # the parent's executor is untouched
+        assert executor.submit(lambda: 1).wait(timeout=5)
+
+
+
+class TestJobStore:
+    """Tests for jobs shared between processes through a JobStore"""
+
+    def test_job_polled_through_another_executor(self, tmp_path):
+        """A job submitted to one server process should be found by another"""
+        path = str(tmp_path / 'jobs.db')
+        submitting = JobExecutor(workers=1, queue_size=4, store=JobStore(path))
+        polling = JobExecutor(workers=1, queue_size=4, store=JobStore(path))
+
+        def work():
+            report_progress(image=0, images=1)
+            attach(images=[b'png'])
+            return {'success': True}
+
+        job = submitting.submit(work, owner='user')
+        assert job.wait(timeout=5)
+        found = polling.get(job.id)
+        assert found is not None and found is not job
+        assert found.owner == 'user' and found.done()
+        assert found.to_dict() == job.to_dict()
+        assert found.result == {'success': True}
+        assert list(found.attachments['images']) == [b'png']
+        polling.discard(job.id)
+        assert polling.get(job.id) is None
+
+    def test_queued_and_failed_jobs_are_shared(self, tmp_path):
+        path = str(tmp_path / 'jobs.db')
+        submitting = JobExecutor(workers=1, queue_size=4, store=JobStore(path))
+        polling = JobExecutor(workers=1, queue_size=4, store=JobStore(path))
+        release = threading.Event()
+        running = submitting.submit(release.wait)
+
+        def boom():
+            raise RuntimeError("bad label")
+
+        failed = submitting.submit(boom)
+        assert not polling.get(failed.id).done()
+        release.set()
+        assert running.wait(timeout=5) and failed.wait(timeout=5)
+        found = polling.get(failed.id)
+        assert found.status == FAILED and found.error == "bad label" and found.result is None
+
+    def test_expired_jobs_are_dropped(self, tmp_path):
+        path = str(tmp_path / 'jobs.db')
+        submitting = JobExecutor(workers=1, queue_size=4, store=JobStore(path), result_ttl=0)
+        job = submitting.submit(lambda: 1)
+        assert job.wait(timeout=5)
+        assert JobExecutor(workers=1, queue_size=4, store=JobStore(path), result_ttl=0).get(job.id) is None
+
+    def test_abandoned_running_job_is_not_stored(self, tmp_path):
+        """A submission that timed out should not come back into the store when its job finishes"""
+        path = str(tmp_path / 'jobs.db')
+        executor = JobExecutor(workers=1, queue_size=4, store=JobStore(path))
+        release = threading.Event()
+        job = executor.submit(release.wait)
+        executor.abandon(job.id)
+        release.set()
+        assert job.wait(timeout=5) and job.status == DONE
+        assert executor.get(job.id) is None
+        assert JobStore(path).load(job.id) is None
+
+    def test_progress_writes_are_throttled(self, tmp_path):
+        store = JobStore(str(tmp_path / 'jobs.db'))
+        executor = JobExecutor(workers=1, queue_size=4, store=store)
+        saved = []
+        save = store.save
+        store.save = lambda job: saved.append(job.status) or save(job)
+
+        def work():
+            for n in range(100):
+                report_progress(check=n)
+
+        job = executor.submit(work)
+        assert job.wait(timeout=5)
+        # queued, running and done, the progress in between at most once a second
+        assert saved[:2] == ['queued', 'running'] and saved[-1] == DONE
+        assert len(saved) <= 4
+        assert store.load(job.id).progress == {'check': 99}
+
+    def test_uploads_are_files_and_the_rest_json(self, tmp_path):
+        """A boxes submission's uploads are kept as files next to the database, read back one at a time"""
+        path = str(tmp_path / 'jobs.db')
+        executor = JobExecutor(workers=1, queue_size=4, store=JobStore(path))
+
+        def work():
+            attach(images=[b'front' * 1000, b'back'], geometry=[{'width': 10, 'boxes': {}}])
+            return {'success': True, 'geometry': [{'width': 10}]}
+
+        job = executor.submit(work)
+        assert job.wait(timeout=5)
+        for name in ('jobs.db', 'jobs.db-wal'):
+            if (tmp_path / name).exists():
+                assert b'front' not in (tmp_path / name).read_bytes()
+        assert (tmp_path / 'jobs.db.files' / job.id / 'images-0').read_bytes() == b'front' * 1000
+        found = JobStore(path).load(job.id)
+        assert len(found.attachments['images']) == 2 and found.attachments['images'][1] == b'back'
+        assert found.attachments['geometry'] == [{'width': 10, 'boxes': {}}]
+        assert found.result == {'success': True, 'geometry': [{'width': 10}]}
+        executor.discard(job.id)
+        assert not (tmp_path / 'jobs.db.files' / job.id).exists()
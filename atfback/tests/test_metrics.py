@@ -0,0 +1,121 @@
+"""
+Tests for the latency histograms and counters
+"""
+import json
+import multiprocessing
+import time
+
+from src.metrics import LATENCY_BUCKETS, Metrics
+
+
+def _burst_worker(directory, recorded, stop):
+    # another gunicorn worker: a burst of requests, then idle while still alive
+    worker = Metrics(directory, flush_interval=0.2)
+    for _ in range(50):
+        worker.inc('ocr_images_total')
+        worker.observe('ocr_stage_seconds', 0.01, stage='ocr')
+    recorded.set()
+    stop.wait(10)
+
+
+class TestMetrics:
+    """Tests for Metrics"""
+
+    def test_histogram_renders_cumulative_buckets(self):
+        metrics = Metrics()
+        metrics.observe('ocr_stage_seconds', 0.003, stage='decode')
+        metrics.observe('ocr_stage_seconds', 0.2, stage='decode')
+        metrics.observe('ocr_stage_seconds', 100, stage='decode')
+        text = metrics.render()
+        assert '# TYPE ocr_stage_seconds histogram' in text
+        assert 'ocr_stage_seconds_bucket{stage="decode",le="0.001"} 0' in text
+        assert 'ocr_stage_seconds_bucket{stage="decode",le="0.005"} 1' in text
+        assert 'ocr_stage_seconds_bucket{stage="decode",le="0.25"} 2' in text
+        assert f'ocr_stage_seconds_bucket{{stage="decode",le="{LATENCY_BUCKETS[-1]}"}} 2' in text
+        assert 'ocr_stage_seconds_bucket{stage="decode",le="+Inf"} 3' in text
+        assert 'ocr_stage_seconds_count{stage="decode"} 3' in text
+
+    def test_counters_and_timer(self):
+        metrics = Metrics()
+        metrics.inc('ocr_timeouts_total')
+        metrics.inc('ocr_rejections_total', reason='busy')
+        metrics.inc('ocr_rejections_total', 2, reason='busy')
+        try:
+            with metrics.time('ocr_stage_seconds', stage='ocr'):
+                raise ValueError("bad image")
+        except ValueError:
+            pass
+        text = metrics.render()
+        assert 'ocr_timeouts_total 1' in text
+        assert 'ocr_rejections_total{reason="busy"} 3' in text
+        assert 'ocr_stage_seconds_count{stage="ocr"} 1' in text
+
+    def test_workers_add_up_through_the_directory(self, tmp_path):
+        worker = Metrics(str(tmp_path))
+        worker.inc('ocr_images_total', 2)
+        worker.observe('ocr_boxes_per_image', 30)
+        worker.flush()
+        # what another worker process wrote
+        (tmp_path / '99999999.json').write_text(json.dumps({
+            'counters': {'ocr_images_total': {'': 3}},
+            'histograms': {'ocr_boxes_per_image': {'': {'buckets': [0, 0, 0, 0, 1, 0, 0, 0, 0, 0], 'sum': 40, 'count': 1}}}
+        }))
+        text = worker.render()
+        assert 'ocr_images_total 5' in text
+        assert 'ocr_boxes_per_image_bucket{le="50"} 2' in text
+        assert 'ocr_boxes_per_image_sum 70' in text
+
+    def test_forked_worker_starts_from_zero(self):
+        metrics = Metrics()
+        metrics.inc('ocr_images_total')
+        metrics._after_fork()
+        assert metrics.snapshot() == {'counters': {}, 'histograms': {}}
+
+    def test_trailing_burst_reaches_another_process(self, tmp_path):
+        context = multiprocessing.get_context('spawn')
+        recorded, stop = context.Event(), context.Event()
+        worker = context.Process(target=_burst_worker, args=(str(tmp_path), recorded, stop))
+        worker.start()
+        try:
+            assert recorded.wait(30)
+            # the scrape comes after the burst, on a worker that saw none of it
+            time.sleep(0.6)
+            text = Metrics(str(tmp_path)).render()
+            assert 'ocr_images_total 50' in text
+            assert 'ocr_stage_seconds_count{stage="ocr"} 50' in text
+        finally:
+            stop.set()
+            worker.join(10)
+
+    def test_flush_skips_unchanged(self, tmp_path):
+        metrics = Metrics(str(tmp_path), flush_interval=60)
+        metrics.flush(changed_only=True)
+        assert list(tmp_path.iterdir()) == []
+        metrics.inc('ocr_timeouts_total')
+        metrics.flush(changed_only=True)
+        assert len(list(tmp_path.glob('*.json'))) == 1
+
+    def test_reused_pid_gets_a_file_of_its_own(self, tmp_path):
+        """A worker given an exited worker's pid must not overwrite what that one recorded"""
+        first, second = Metrics(str(tmp_path)), Metrics(str(tmp_path))
+        first.inc('ocr_images_total', 2)
+        first.flush()
+        second.inc('ocr_images_total', 3)
+        second.flush()
+        assert len(list(tmp_path.glob('*.json'))) == 2
+        assert 'ocr_images_total 5' in Metrics(str(tmp_path)).render()
+
+    def test_exiting_worker_is_folded_into_retired_totals(self, tmp_path):
+        for count in (2, 3):
+            worker = Metrics(str(tmp_path))
+            worker.inc('ocr_images_total', count)
+            worker.observe('ocr_boxes_per_image', 30)
+            worker.flush()
+            worker.retire()
+            # the atexit flush after worker_exit writes nothing
+            worker.inc('ocr_images_total')
+            worker.flush()
+        assert [path.name for path in tmp_path.glob('*.json')] == ['retired.json']
+        text = Metrics(str(tmp_path)).render()
+        assert 'ocr_images_total 5' in text
+        assert 'ocr_boxes_per_image_count 2' in text
@@ -0,0 +1,161 @@
+"""
+Tests for the OCR backends using the replay backend, no model is loaded
+"""
+import cv2
+import numpy as np
+import pytest
+
+from src.ocr_image import DecodedImage
+from src.ocr_models import registry
+from src.ocr_backends import EasyOCRBackend, ReplayBackend, TesseractBackend, create_backend, image_key, record_fixtures
+from src.ocr_checker import OCRChecker
+from pathlib import Path
+
+
+FIXTURE_PATH = str(Path(__file__).parent / "fixtures" / "replay_ocr.json")
+
+
+@pytest.fixture(scope="module")
+def test_image_data():
+    """Load test image once for all tests"""
+    test_image_path = Path(__file__).parent.parent.parent / "examples" / "2white christmas.png"
+    if not test_image_path.exists():
+        pytest.skip(f"Test image not found at {test_image_path}")
+    with open(test_image_path, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture(scope="module")
+def replay_checker():
+    """OCRChecker running on recorded results"""
+    return OCRChecker(modelSelect='replay', fixture_path=FIXTURE_PATH)
+
+
+class TestReplayBackend:
+    """Tests for the replay backend"""
+
+    def test_replays_fixture(self, test_image_data):
+        """Known images should return the recorded boxes"""
+        ocrdata, rdix = ReplayBackend(FIXTURE_PATH).read(test_image_data)
+        assert len(ocrdata) > 0
+        count = len(list(rdix.intersection((-float('inf'), -float('inf'), float('inf'), float('inf')))))
+        assert count == len(ocrdata), "Rtree should contain same number of boxes as ocrdata"
+
+    def test_unknown_image_is_empty(self):
+        """Images without a fixture have no text"""
+        _, blank = cv2.imencode('.png', np.zeros((10, 10, 3), np.uint8))
+        ocrdata, _ = ReplayBackend(FIXTURE_PATH).read(blank.tobytes())
+        assert ocrdata == {}
+
+    def test_undecodable_image_raises(self):
+        """Bytes that are not an image should raise ValueError"""
+        with pytest.raises(ValueError):
+            ReplayBackend(FIXTURE_PATH).read(b'not an image')
+
+    def test_decoded_image_is_shared(self, test_image_data):
+        """A decoded image is passed through without decoding again"""
+        image = DecodedImage.from_bytes(test_image_data)
+        assert DecodedImage.coerce(image) is image
+        assert (image.width, image.height) == (1536, 1224)
+
+    def test_record_round_trip(self, test_image_data, tmp_path):
+        """Recorded fixtures should replay the same results"""
+        path = str(tmp_path / "recorded.json")
+        record_fixtures(ReplayBackend(FIXTURE_PATH), [test_image_data], path)
+        original, _ = ReplayBackend(FIXTURE_PATH).read(test_image_data)
+        replayed, _ = ReplayBackend(path).read(test_image_data)
+        assert original == replayed
+
+    def test_image_key_is_stable(self, test_image_data):
+        assert image_key(test_image_data) == image_key(bytes(test_image_data))
+
+    def test_unsupported_backend(self):
+        """Unknown model names should raise ValueError"""
+        with pytest.raises(ValueError):
+            create_backend('nope')
+
+
+
+class FakeEasyOCR:
+    """Stands in for an easyocr Reader, keeping the arrays it is given"""
+
+    def __init__(self):
+        self.seen = []
+
+    def readtext(self, pixels):
+        self.seen.append(pixels)
+        return []
+
+    def detect(self, pixels):
+        self.seen.append(pixels)
+        return [[]], [[]]
+
+
+class TestEngineInput:
+    """The engines get pixels in the channel order they expect"""
+
+    @pytest.fixture
+    def blue_image(self):
+        pixels = np.zeros((4, 4, 3), np.uint8)
+        # BGR, as cv2 decodes it
+        pixels[:, :, 0] = 255
+        return DecodedImage(b'', pixels)
+
+    def test_easyocr_gets_rgb(self, monkeypatch, blue_image):
+        reader = FakeEasyOCR()
+        monkeypatch.setattr(registry, 'get', lambda name, **kwargs: reader)
+        backend = EasyOCRBackend()
+        backend.readtext(blue_image)
+        backend.detect(blue_image)
+        for pixels in reader.seen:
+            assert pixels[0, 0].tolist() == [0, 0, 255]
+        # the shared buffer is left as decoded
+        assert blue_image.pixels[0, 0].tolist() == [255, 0, 0]
+
+    def test_tesseract_gets_rgb(self, monkeypatch, blue_image):
+        seen = []
+
+        class FakeTesseract:
+            class Output:
+                DICT = 'dict'
+
+            @staticmethod
+            def image_to_data(pixels, output_type):
+                seen.append(pixels)
+                return {key: [] for key in ('text', 'conf', 'block_num', 'par_num', 'line_num', 'left', 'top', 'width', 'height')}
+
+        monkeypatch.setattr(registry, 'get', lambda name, **kwargs: FakeTesseract)
+        assert TesseractBackend().readtext(blue_image) == []
+        assert seen[0][0, 0].tolist() == [0, 0, 255]
+
+class TestReplayPipeline:
+    """Runs the full validate pipeline on replayed OCR"""
+
+    def test_validate_all_fields(self, test_image_data, replay_checker):
+        validations, images = replay_checker.validate(
+            images=[test_image_data],
+            brand_name="Samuel Adams",
+            product_class="Ale",
+            alcohol_content="5.8",
+            net_contents="12",
+            net_contents_unit="fl oz"
+        )
+        assert validations['brand_name'] is True
+        assert validations['product_class'] is True
+        assert validations['alcohol_content'] is True
+        assert validations['net_contents'] is True
+        assert validations['gov_warn'] is True
+        assert len(images) == 1
+
+    def test_validate_wrong_brand(self, test_image_data, replay_checker):
+        validations, _ = replay_checker.validate(
+            images=[test_image_data],
+            brand_name="Grey Goose",
+            product_class="Vodka",
+            alcohol_content="40",
+            net_contents="750",
+            net_contents_unit="ml"
+        )
+        assert validations['brand_name'] is False
+        assert validations['alcohol_content'] is False
+        assert validations['gov_warn'] is True
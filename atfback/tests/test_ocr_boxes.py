@@ -0,0 +1,56 @@
+"""
+Tests for the array-backed box index
+"""
+import random
+
+import pytest
+
+from src.ocr_boxes import BoxIndex
+
+
+def _line(*words, y=100, height=30):
+    """Records of words on one line, each word 20px per character with 10px gaps"""
+    records, x = [], 10
+    for word in words:
+        records.append((word, 0.9, (x, y, x + 20 * len(word), y + height)))
+        x += 20 * len(word) + 10
+    return records
+
+
+class TestBoxIndex:
+    """Tests for BoxIndex"""
+
+    def test_intersection_matches_a_box_by_box_check(self):
+        rng = random.Random(7)
+        records = []
+        for _ in range(300):
+            x, y = rng.randint(0, 1500), rng.randint(0, 1200)
+            records.append(('', 1.0, (x, y, x + rng.randint(1, 200), y + rng.randint(1, 40))))
+        index = BoxIndex.from_records(records)
+        for _ in range(50):
+            x, y = rng.randint(-100, 1500), rng.randint(-100, 1200)
+            area = (x, y, x + rng.randint(0, 400), y + rng.randint(0, 300))
+            expected = [i for i, (_, _, (minx, miny, maxx, maxy)) in enumerate(records)
+                        if minx <= area[2] and maxx >= area[0] and miny <= area[3] and maxy >= area[1]]
+            assert index.intersection(area) == expected
+
+    def test_touching_edges_count(self):
+        index = BoxIndex.from_records([('a', 1.0, (0, 0, 10, 10))])
+        assert index.intersection((10, 10, 20, 20)) == [0]
+        assert index.intersection((11, 0, 20, 20)) == []
+
+    def test_insert_and_extend(self):
+        index = BoxIndex.from_records(_line('A', 'B'))
+        for i in range(2, 40):
+            index.insert(i, (i, i, i + 1, i + 1), 0.5)
+        index.extend([100, 101], [(500, 500, 510, 510), (600, 600, 610, 610)])
+        assert len(index) == 42
+        assert index.intersection((495, 495, 505, 505)) == [100]
+        assert index.bbox(39) == (39, 39, 40, 40)
+        assert index.confidence[index.row(39)] == pytest.approx(0.5)
+        assert index.confidence[index.row(101)] == 1
+
+    def test_empty(self):
+        index = BoxIndex.from_records([])
+        assert len(index) == 0
+        assert index.intersection((0, 0, 100, 100)) == []
@@ -0,0 +1,123 @@
+"""
+Tests for the OCR result cache using the replay backend
+"""
+import os
+import time
+
+import pytest
+
+from src.ocr_backends import ReplayBackend
+from src.ocr_cache import OCRCache, cache_key
+from src.ocr_checker import OCRChecker
+from pathlib import Path
+
+
+FIXTURE_PATH = str(Path(__file__).parent / "fixtures" / "replay_ocr.json")
+
+
+@pytest.fixture(scope="module")
+def test_image_data():
+    """Load test image once for all tests"""
+    test_image_path = Path(__file__).parent.parent.parent / "examples" / "2white christmas.png"
+    if not test_image_path.exists():
+        pytest.skip(f"Test image not found at {test_image_path}")
+    with open(test_image_path, 'rb') as f:
+        return f.read()
+
+
+class CountingBackend(ReplayBackend):
+    """Replay backend counting how often OCR actually runs"""
+
+    def __init__(self, fixture_path):
+        super().__init__(fixture_path)
+        self.calls = 0
+
+    def readtext(self, image):
+        self.calls += 1
+        return super().readtext(image)
+
+
+def counting_checker(cache):
+    # a failing field would re-scan rotated copies too, only the upright read is counted here
+    checker = OCRChecker(modelSelect='replay', fixture_path=FIXTURE_PATH, cache=cache, rescan_rotations=False)
+    checker.backend = CountingBackend(FIXTURE_PATH)
+    return checker
+
+
+def validate(checker, image, brand):
+    verifications, _ = checker.validate([image], brand, 'Ale', '5.8', '12', 'fl oz', annotate=False)
+    return verifications
+
+
+class TestOCRCache:
+    """Tests for the memory and disk tiers"""
+
+    def test_key_depends_on_backend_config(self):
+        """The same image read by differently configured backends is cached separately"""
+        assert cache_key(b'image', 'easyocr:{"quantize": true}') != cache_key(b'image', 'easyocr:{"quantize": false}')
+        assert cache_key(b'image', 'replay:{}') == cache_key(b'image', 'replay:{}')
+
+    def test_resubmission_skips_ocr(self, test_image_data):
+        """Editing a form field and validating again reuses the OCR result"""
+        checker = counting_checker(OCRCache(max_entries=4))
+        assert validate(checker, test_image_data, 'Samuel Adams')['brand_name'] is True
+        assert validate(checker, test_image_data, 'Other Brewery')['brand_name'] is False
+        assert validate(checker, test_image_data, 'Samuel Adams')['brand_name'] is True
+        assert checker.backend.calls == 1
+        assert checker.cache.stats()['hits'] == 2
+
+    def test_hits_are_independent_copies(self, test_image_data):
+        """Changing a returned result does not change what the cache hands out next"""
+        checker = counting_checker(OCRCache(max_entries=4))
+        first, _ = checker.process_image(test_image_data)
+        first[999] = {'text': 'EXTRA', 'confidence': 1.0, 'bbox': (0, 0, 1, 1)}
+        second, rdix = checker.process_image(test_image_data)
+        assert 999 not in second
+        assert second == {i: entry for i, entry in first.items() if i != 999}
+        assert len(list(rdix.intersection((0, 0, 1536, 1224)))) == len(second)
+
+    def test_lru_evicts_oldest(self):
+        """Only max_entries images are kept in memory"""
+        cache = OCRCache(max_entries=2)
+        entry = {0: {'text': 'A', 'confidence': 1.0, 'bbox': (0, 0, 1, 1)}}
+        for key in ('a', 'b'):
+            cache.put(key, entry)
+        cache.get('a')
+        cache.put('c', entry)
+        assert cache.get('b') is None
+        assert cache.get('a') is not None and cache.get('c') is not None
+
+    def test_disk_tier_survives_restart(self, test_image_data, tmp_path):
+        """A new process (new cache) pointed at the same directory skips OCR"""
+        validate(counting_checker(OCRCache(max_entries=4, directory=str(tmp_path))), test_image_data, 'Samuel Adams')
+        checker = counting_checker(OCRCache(max_entries=4, directory=str(tmp_path)))
+        assert validate(checker, test_image_data, 'Samuel Adams')['brand_name'] is True
+        assert checker.backend.calls == 0
+        assert checker.cache.stats()['disk_hits'] == 1
+
+    def test_corrupt_disk_entry_is_a_miss(self, tmp_path):
+        """An unreadable file falls back to running OCR"""
+        cache = OCRCache(max_entries=0, directory=str(tmp_path))
+        cache.put('ab12', {0: {'text': 'A', 'confidence': 1.0, 'bbox': (0, 0, 1, 1)}})
+        Path(cache._path('ab12')).write_text('{not json')
+        assert cache.get('ab12') is None
+
+    def test_disk_tier_is_bounded(self, tmp_path):
+        """Entries past max_age go, then the least recently used until the tier fits max_disk_bytes"""
+        entry = {0: {'text': 'A' * 100, 'confidence': 1.0, 'bbox': (0, 0, 1, 1)}}
+        cache = OCRCache(max_entries=0, directory=str(tmp_path), max_age=3600)
+        for age, key in enumerate(('aa01', 'bb02', 'cc03')):
+            cache.put(key, entry)
+            os.utime(cache._path(key), (time.time() - 3000 * age,) * 2)
+        assert cache.prune() == 1
+        assert cache.get('cc03') is None and cache.get('aa01') is not None
+
+        size = os.path.getsize(cache._path('aa01'))
+        cache.max_age, cache.max_disk_bytes = None, 2 * size
+        os.utime(cache._path('aa01'), (time.time() - 100,) * 2)
+        # a read makes 'aa01' the most recently used again
+        cache.get('aa01')
+        cache.put('dd04', entry)
+        cache.prune()
+        assert cache.get('bb02') is None
+        assert cache.get('aa01') is not None and cache.get('dd04') is not None
@@ -92,8 +92,8 @@ class TestBrandName:
         ])         
     def test_brand_detection(self, processed_image, ocr_checker, brand_name, expected):
         """Test brand name detection with various inputs"""
-        ocrdata, rdix, width, height = processed_image
-        found, boxes = ocr_checker.check_brand_name(ocrdata, rdix, width, height, brand_name)
+        ocrdata, _, width, height = processed_image
+        found, boxes = ocr_checker.check_brand_name(ocrdata, width, height, brand_name)
         # Skip assertion if method not implemented
         if found is None:
             pytest.skip("check_brand_name not implemented")
@@ -115,8 +115,8 @@ class TestProductClass:
     ])
     def test_product_class_detection(self, processed_image, ocr_checker, product_class):
         """Test product class detection"""
-        ocrdata, rdix, width, height = processed_image
-        found, boxes = ocr_checker.check_product_class(ocrdata, rdix, width, height, product_class)
+        ocrdata, _, width, height = processed_image
+        found, boxes = ocr_checker.check_product_class(ocrdata, width, height, product_class)
         if found is None:
             pytest.skip("check_product_class not implemented")
         print(f"Product class '{product_class}' found: {found}, boxes: {boxes}")
@@ -136,8 +136,8 @@ class TestAlcoholContent:
     ])
     def test_alcohol_detection(self, processed_image, ocr_checker, alcohol_content):
         """Test alcohol content detection"""
-        ocrdata, rdix, width, height = processed_image
-        found, boxes = ocr_checker.check_alcohol_content(ocrdata, rdix, width, height, alcohol_content)
+        ocrdata, _, width, height = processed_image
+        found, boxes = ocr_checker.check_alcohol_content(ocrdata, width, height, alcohol_content)
         if found is None:
             pytest.skip("check_alcohol_content not implemented")
         print(f"Alcohol content {alcohol_content}% found: {found}, boxes: {boxes}")
@@ -156,8 +156,8 @@ class TestNetContents:
     ])
     def test_net_contents_detection(self, processed_image, ocr_checker, amount, unit):
         """Test net contents detection"""
-        ocrdata, rdix, width, height = processed_image
-        found, boxes = ocr_checker.check_net_contents(ocrdata, rdix, width, height, amount, unit)
+        ocrdata, _, width, height = processed_image
+        found, boxes = ocr_checker.check_net_contents(ocrdata, width, height, amount, unit)
         if found is None:
             pytest.skip("check_net_contents not implemented")
         print(f"Net contents {amount} {unit} found: {found}, boxes: {boxes}")
@@ -170,8 +170,8 @@ class TestGovernmentWarning:
     
     def test_warning_detection(self, processed_image, ocr_checker):
         """Test government warning detection"""
-        ocrdata, rdix, width, height = processed_image
-        found, boxes = ocr_checker.check_government_warning(ocrdata, rdix, width, height)
+        ocrdata, _, width, height = processed_image
+        found, boxes = ocr_checker.check_government_warning(ocrdata, width, height)
         print(f"Government warning found: {found}, boxes: {boxes}")
         
         assert isinstance(found, bool), "Should return boolean"
@@ -0,0 +1,122 @@
+"""
+Tests for the line and reading order layout of OCR boxes
+"""
+import pytest
+
+from src.ocr_backends import index_boxes
+from src.ocr_checker import OCRChecker
+from src.ocr_layout import Layout
+from src.ocr_result import OCRResult
+
+
+def _ocr(*boxes):
+    return index_boxes([(text, 0.9, bbox) for text, bbox in boxes])
+
+
+@pytest.fixture(scope="module")
+def checker():
+    return OCRChecker(modelSelect='replay')
+
+
+class TestLayout:
+    """Tests for Layout"""
+
+    def test_lines_in_reading_order(self):
+        ocrdata, _ = _ocr(
+            ('ADAMS', (220, 100, 400, 160)),
+            ('BOSTON LAGER', (100, 400, 400, 430)),
+            ('SAMUEL', (10, 105, 200, 158)),
+        )
+        layout = Layout(ocrdata)
+        assert [line.text for line in layout.lines] == ['SAMUEL ADAMS', 'BOSTON LAGER']
+        assert layout.right == {2: 0}
+        assert layout.lines[0].starts == [0, 7]
+
+    def test_columns_split_lines(self):
+        ocrdata, _ = _ocr(
+            ('NET', (10, 100, 70, 130)),
+            ('750 ML', (80, 100, 200, 130)),
+            ('IMPORTED BY', (700, 100, 900, 130)),
+        )
+        layout = Layout(ocrdata)
+        assert [line.text for line in layout.lines] == ['NET 750 ML', 'IMPORTED BY']
+
+    def test_blocks_join_stacked_lines(self):
+        ocrdata, _ = _ocr(
+            ('OLD', (100, 100, 250, 160)),
+            ('TOM', (110, 170, 240, 230)),
+            ('FAR BELOW', (100, 900, 300, 930)),
+        )
+        layout = Layout(ocrdata)
+        assert [block.text for block in layout.blocks] == ['OLD TOM', 'FAR BELOW']
+        assert layout.below == {0: 1}
+        assert layout.find('OLD TOM') == [0, 1]
+
+    def test_sideways_boxes_form_their_own_lines(self):
+        ocrdata, _ = _ocr(
+            ('SAMUEL', (495, 365, 1040, 470)),
+            ('ADAMS', (540, 495, 1000, 610)),
+            ('GOVERNMENT WARNING', (1195, 285, 1225, 945)),
+            ('SHOULD NOT DRINK', (1225, 285, 1255, 945)),
+        )
+        layout = Layout(ocrdata)
+        assert [block.text for block in layout.blocks] == ['SAMUEL ADAMS', 'GOVERNMENT WARNING SHOULD NOT DRINK']
+
+    def test_rotated_rescan_read_in_its_frame(self):
+        ocrdata, _ = _ocr()
+        # read with the image turned 90 degrees clockwise: text runs up the label, next word above
+        ocrdata.add_boxes([
+            {'text': 'BY VOLUME', 'confidence': 0.9, 'bbox': (900, 100, 930, 300), 'rotation': 90},
+            {'text': '40% ALC', 'confidence': 0.9, 'bbox': (900, 310, 930, 450), 'rotation': 90},
+        ])
+        assert Layout(ocrdata).blocks[0].text == '40% ALC BY VOLUME'
+
+    def test_find_needs_several_boxes(self):
+        ocrdata, _ = _ocr(('SAMUEL ADAMS', (10, 10, 300, 60)), ('LAGER', (310, 10, 400, 60)))
+        layout = Layout(ocrdata)
+        assert layout.find('SAMUEL ADAMS') is None
+        assert layout.find('ADAMS LAGER') == [0, 1]
+        assert layout.find('SIERRA NEVADA') is None
+
+    def test_built_once_and_dropped_with_new_boxes(self):
+        ocrdata, _ = _ocr(('A', (0, 0, 10, 10)))
+        layout = Layout.of(ocrdata)
+        assert Layout.of(ocrdata) is layout
+        ocrdata.add_boxes([{'text': 'B', 'confidence': 0.9, 'bbox': (20, 0, 30, 10)}])
+        assert Layout.of(ocrdata) is not layout
+
+    def test_empty(self):
+        layout = Layout(OCRResult())
+        assert layout.lines == [] and layout.find('ANYTHING AT ALL') is None
+
+
+class TestSplitChecks:
+    """Checks matching phrases split over boxes through the layout"""
+
+    def test_brand_name_over_two_lines(self, checker):
+        ocrdata, _ = _ocr(('SAMUEL', (495, 365, 1040, 470)), ('ADAMS', (540, 495, 1000, 610)))
+        assert checker.check_brand_name(ocrdata, 1536, 1224, 'Samuel Adams') == (True, [(495, 365, 1040, 470), (540, 495, 1000, 610)])
+
+    def test_product_class_split(self, checker):
+        ocrdata, _ = _ocr(('AMERICAN', (100, 500, 300, 530)), ('PALE ALE', (310, 500, 470, 530)))
+        found, boxes = checker.check_product_class(ocrdata, 1000, 1000, 'American Pale Ale')
+        assert found is True and len(boxes) == 2
+
+    @pytest.mark.parametrize('amount,unit,texts', [
+        ('750', 'ml', ('750', 'ML')),
+        ('12', 'fl oz', ('12 FL.', 'OZ.')),
+        ('1.5', 'L', ('1.5', 'LITERS')),
+    ])
+    def test_net_contents_split(self, checker, amount, unit, texts):
+        ocrdata, _ = _ocr((texts[0], (100, 800, 160, 830)), (texts[1], (170, 800, 260, 830)))
+        found, boxes = checker.check_net_contents(ocrdata, 1000, 1000, amount, unit)
+        assert found is True and len(boxes) == 2
+
+    def test_government_warning_heading_split(self):
+        checker = OCRChecker(modelSelect='replay', warning_text=False)
+        ocrdata, _ = _ocr(('GOVERNMENT', (100, 900, 300, 920)), ('WARNING:', (310, 900, 450, 920)), ('(1) ACCORDING', (460, 900, 700, 920)))
+        assert checker.check_government_warning(ocrdata, 1000, 1000) == (True, [(100, 900, 300, 920), (310, 900, 450, 920)])
+
+    def test_far_apart_words_do_not_match(self, checker):
+        ocrdata, _ = _ocr(('SAMUEL', (10, 10, 200, 60)), ('ADAMS', (700, 900, 900, 950)))
+        assert checker.check_brand_name(ocrdata, 1000, 1000, 'Samuel Adams') == (False, [])
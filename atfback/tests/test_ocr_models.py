@@ -0,0 +1,97 @@
+"""
+Tests for the process-wide OCR model registry
+"""
+import os
+import threading
+
+import pytest
+
+from src.ocr_models import ModelRegistry, configure_worker_threads, current_rss, memory_usage, worker_threads
+
+
+@pytest.fixture
+def counting_registry():
+    """Registry with a fake loader that counts how often it is called"""
+    calls = []
+
+    def loader(**config):
+        calls.append(config)
+        return object()
+
+    reg = ModelRegistry()
+    reg.register_loader('fake', loader)
+    return reg, calls
+
+
+class TestModelRegistry:
+    """Tests for ModelRegistry"""
+
+    def test_loads_once_per_config(self, counting_registry):
+        """Same name and config should return the same instance without reloading"""
+        reg, calls = counting_registry
+        first = reg.get('fake', quantize=True)
+        second = reg.get('fake', quantize=True)
+        assert first is second
+        assert len(calls) == 1
+
+    def test_different_config_loads_again(self, counting_registry):
+        """A different config is a different model"""
+        reg, calls = counting_registry
+        first = reg.get('fake', quantize=True)
+        second = reg.get('fake', quantize=False)
+        assert first is not second
+        assert len(calls) == 2
+
+    def test_concurrent_first_use_loads_once(self, counting_registry):
+        """Threads racing on the first get should share one load"""
+        reg, calls = counting_registry
+        threads = [threading.Thread(target=reg.get, args=('fake',)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(calls) == 1
+
+    def test_unknown_model_raises(self, counting_registry):
+        """Unknown model names should raise ValueError"""
+        reg, _ = counting_registry
+        with pytest.raises(ValueError):
+            reg.get('nope')
+
+    def test_stats_report_load_cost(self, counting_registry):
+        """Stats should include load time and memory for every loaded model"""
+        reg, _ = counting_registry
+        reg.get('fake', quantize=True)
+        stats = reg.stats()
+        assert len(stats) == 1
+        assert stats[0]['name'] == 'fake'
+        assert stats[0]['load_seconds'] >= 0
+        assert stats[0]['rss_bytes'] >= 0
+
+    def test_current_rss(self):
+        """Resident memory should be readable"""
+        assert current_rss() > 0
+
+
+class TestForkedWorkers:
+    """Tests for running under a preforking server"""
+
+    def test_memory_usage_splits_shared_and_private(self):
+        usage = memory_usage()
+        assert usage['rss'] > 0
+        if 'pss' in usage:
+            assert usage['private'] <= usage['rss']
+            assert usage['private'] + usage['shared'] == usage['rss']
+
+    def test_cores_split_between_workers(self):
+        cores = os.cpu_count() or 1
+        assert worker_threads(1) == cores
+        assert worker_threads(cores * 2) == 1
+        assert worker_threads(4, threads=3) == 3
+
+    def test_thread_count_reaches_torch_imported_later(self, monkeypatch):
+        monkeypatch.setenv('OMP_NUM_THREADS', 'unset')
+        monkeypatch.setenv('MKL_NUM_THREADS', 'unset')
+        configure_worker_threads(2)
+        assert os.environ['OMP_NUM_THREADS'] == '2'
+
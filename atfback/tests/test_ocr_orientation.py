@@ -0,0 +1,108 @@
+"""
+Tests for orientation estimates and rotated re-scans in validate
+"""
+import cv2
+import numpy as np
+import pytest
+
+from src.ocr_backends import OCRBackend
+from src.ocr_checker import OCRChecker
+from src.ocr_image import DecodedImage
+from src.ocr_orientation import rotate, rotation_plan, text_directions, unrotate_bbox
+from pathlib import Path
+
+
+FIXTURE_PATH = str(Path(__file__).parent / "fixtures" / "replay_ocr.json")
+
+
+def text_block(lines, width=900):
+    block = np.full((70 * len(lines) + 40, width, 3), 255, np.uint8)
+    for n, line in enumerate(lines):
+        cv2.putText(block, line, (20, 70 + 70 * n), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (0, 0, 0), 3)
+    return block
+
+
+@pytest.fixture
+def sideways_label():
+    """1300x1000 label, upright brand at the top and the warning running up the right side"""
+    page = np.full((1000, 1300, 3), 255, np.uint8)
+    page[40:220, 50:950] = text_block(['SAMUEL ADAMS', 'ALE BREWED WITH SPICES'])
+    side = cv2.rotate(text_block(['GOVERNMENT WARNING ACCORDING TO', 'THE SURGEON GENERAL WOMEN SHOULD', 'NOT DRINK ALCOHOLIC BEVERAGES']), cv2.ROTATE_90_COUNTERCLOCKWISE)
+    page[50:50 + side.shape[0], 1020:1020 + side.shape[1]] = side
+    _, buffer = cv2.imencode('.png', page)
+    return DecodedImage(buffer.tobytes(), page)
+
+
+class UprightBackend(OCRBackend):
+    """Reads the label's text only when it is upright: the brand upright, the warning once turned clockwise"""
+    name = 'upright'
+
+    def __init__(self):
+        self.reads = []
+
+    def readtext(self, image):
+        self.reads.append((image.width, image.height))
+        if image.width == 1300:
+            return [([[50, 40], [950, 40], [950, 250], [50, 250]], 'SAMUEL ADAMS ALE', 0.9)]
+        if image.width == 1000 and image.height == 1300:
+            # the side block sits at x 1020..1270, y 50..950 of the upload, turned clockwise that is x 50..950, y 1020..1270
+            return [([[50, 1020], [950, 1020], [950, 1270], [50, 1270]], 'GOVERNMENT WARNING', 0.8)]
+        return []
+
+
+def upright_checker(**kwargs):
+    checker = OCRChecker(modelSelect='replay', fixture_path=FIXTURE_PATH, **kwargs)
+    checker.backend = UprightBackend()
+    return checker
+
+
+class TestOrientation:
+    """Tests for the cheap orientation estimate"""
+
+    def test_sideways_text_is_seen(self, sideways_label):
+        horizontal, vertical = text_directions(sideways_label.pixels)
+        assert vertical > 0 and horizontal > 0
+        assert rotation_plan(sideways_label.pixels) == [90, 270]
+
+    def test_upright_text_needs_no_rescan(self):
+        page = np.full((600, 1000, 3), 255, np.uint8)
+        page[50:370] = text_block(['SAMUEL ADAMS', 'BOSTON LAGER', 'BREWED IN BOSTON', '12 FL OZ'], width=1000)
+        assert rotation_plan(page) == []
+        assert rotation_plan(page, upside_down=True) == [180]
+
+    @pytest.mark.parametrize("degrees", [90, 180, 270])
+    def test_unrotate_inverts_rotate(self, degrees):
+        pixels = np.zeros((300, 500, 3), np.uint8)
+        pixels[40:60, 100:220] = 255
+        rotated = rotate(DecodedImage(b'', pixels), degrees).pixels
+        ys, xs = np.nonzero(rotated[:, :, 0])
+        found = (xs.min(), ys.min(), xs.max() + 1, ys.max() + 1)
+        assert unrotate_bbox(found, degrees, 500, 300) == (100, 40, 220, 60)
+
+
+class TestRotatedRescan:
+    """Tests for validate re-scanning rotated copies"""
+
+    def test_missing_field_found_sideways(self, sideways_label):
+        # the backend reads only the heading of the warning
+        checker = upright_checker(warning_text=False)
+        verifications, _ = checker.validate([sideways_label], 'Samuel Adams', 'Ale', '5.8', '12', 'fl oz', annotate=False)
+        assert verifications['brand_name'] and verifications['gov_warn']
+        # upright, then both quarter turns since the other fields are still missing
+        assert checker.backend.reads == [(1300, 1000), (1000, 1300), (1000, 1300)]
+
+    def test_rescanned_boxes_land_on_the_upload(self, sideways_label):
+        checker = upright_checker()
+        ocrdata, rdix = checker.process_image(sideways_label)
+        rotated, _ = checker.process_image(sideways_label, rotation=90)
+        ids = checker.merge_boxes(ocrdata, rdix, rotated, 90)
+        assert ocrdata[ids[0]]['bbox'] == (1020, 50, 1270, 950)
+        assert ocrdata[ids[0]]['rotation'] == 90
+        assert ids[0] in rdix.intersection((1100, 500, 1101, 501))
+        assert ocrdata.clean[ids[0]] == 'GOVERNMENT WARNING'
+
+    def test_rescan_can_be_turned_off(self, sideways_label):
+        checker = upright_checker(rescan_rotations=False, warning_text=False)
+        verifications, _ = checker.validate([sideways_label], 'Samuel Adams', 'Ale', '5.8', '12', 'fl oz', annotate=False)
+        assert verifications['brand_name'] and not verifications['gov_warn']
+        assert checker.backend.reads == [(1300, 1000)]
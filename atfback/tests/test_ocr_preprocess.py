@@ -0,0 +1,128 @@
+"""
+Tests for the downscaling/tiling stage, using a stand in backend that "reads" dark blobs
+"""
+import cv2
+import numpy as np
+import pytest
+
+from src.ocr_backends import OCRBackend, ReplayBackend, create_backend
+from src.ocr_image import DecodedImage
+from src.ocr_preprocess import Preprocessor, estimate_text_height
+from pathlib import Path
+
+
+FIXTURE_PATH = str(Path(__file__).parent / "fixtures" / "replay_ocr.json")
+
+
+class BlobBackend(OCRBackend):
+    """Returns one box per dark connected component, recording the size of every image it is handed"""
+    name = 'blob'
+
+    def __init__(self):
+        self.sizes = []
+
+    def readtext(self, image):
+        self.sizes.append((image.width, image.height))
+        gray = cv2.cvtColor(image.pixels, cv2.COLOR_BGR2GRAY)
+        _, binary = cv2.threshold(gray, 128, 255, cv2.THRESH_BINARY_INV)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(binary)
+        result = []
+        for n in range(1, count):
+            x, y, w, h = stats[n, :4]
+            result.append(([[x, y], [x + w, y], [x + w, y + h], [x, y + h]], f'BLOB {w * h}', 0.9))
+        return result
+
+
+def encoded(pixels):
+    _, buffer = cv2.imencode('.png', pixels)
+    return DecodedImage(buffer.tobytes(), pixels)
+
+
+@pytest.fixture
+def blocks():
+    """3000x2000 page with a grid of solid blocks, one of them straddling where tiles meet"""
+    pixels = np.full((2000, 3000, 3), 255, np.uint8)
+    rects = [(100 + 400 * i, 150 + 450 * j, 100 + 400 * i + 180, 150 + 450 * j + 60) for i in range(7) for j in range(4)]
+    rects.append((700, 960, 1500, 1030))
+    for (x0, y0, x1, y1) in rects:
+        cv2.rectangle(pixels, (x0, y0), (x1 - 1, y1 - 1), (0, 0, 0), -1)
+    return encoded(pixels), rects
+
+
+@pytest.fixture
+def big_text():
+    """2400x1800 page of lines of 60 pixel tall text"""
+    pixels = np.full((1800, 2400, 3), 255, np.uint8)
+    for n in range(10):
+        cv2.putText(pixels, 'GOVERNMENT WARNING 12 FL OZ', (60, 150 + 160 * n), cv2.FONT_HERSHEY_SIMPLEX, 2.2, (0, 0, 0), 5)
+    return encoded(pixels)
+
+
+class TestEstimate:
+    """Tests for the text height estimate"""
+
+    def test_measures_letters(self, big_text):
+        height = estimate_text_height(big_text.pixels)
+        assert 40 <= height <= 80
+
+    def test_blank_image_has_no_estimate(self):
+        assert estimate_text_height(np.full((500, 500, 3), 255, np.uint8)) is None
+
+
+class TestPreprocessor:
+    """Tests for scaling, tiling and mapping boxes back"""
+
+    def test_small_images_are_untouched(self, big_text):
+        backend = BlobBackend()
+        backend.preprocessor = Preprocessor(min_pixels=10_000_000)
+        backend.read(big_text)
+        assert backend.sizes == [(2400, 1800)]
+
+    def test_downscales_to_target_height(self, big_text):
+        backend = BlobBackend()
+        full, _ = backend.read(big_text)
+        backend.preprocessor = Preprocessor(target_text_height=20, min_pixels=0)
+        scaled, rdix = backend.read(big_text)
+        width, height = backend.sizes[-1]
+        assert width < 1200 and height < 900
+        # the lines come back where they are on the upload
+        assert max(b['bbox'][2] for b in scaled.values()) == pytest.approx(max(b['bbox'][2] for b in full.values()), abs=6)
+        assert max(b['bbox'][3] for b in scaled.values()) == pytest.approx(max(b['bbox'][3] for b in full.values()), abs=6)
+        assert len(list(rdix.intersection((0, 0, 2400, 1800)))) == len(scaled)
+
+    def test_tiles_cover_image_with_overlap(self, blocks):
+        image, _ = blocks
+        tiles = Preprocessor(max_side=800, tile_overlap=100).tiles(image, scale=1.0)
+        assert all(t.pixels.shape[0] <= 800 and t.pixels.shape[1] <= 800 for t in tiles)
+        xs = sorted({t.x for t in tiles})
+        assert xs[0] == 0 and xs[-1] + 800 == 3000
+        assert all(b - a <= 700 for a, b in zip(xs, xs[1:]))
+
+    def test_tiled_boxes_map_back_once(self, blocks):
+        image, rects = blocks
+        backend = BlobBackend()
+        backend.preprocessor = Preprocessor(max_side=800, tile_overlap=100, min_pixels=0)
+        ocrdata, _ = backend.read(image)
+        assert len(backend.sizes) > 1
+        found = sorted(tuple(b['bbox']) for b in ocrdata.values())
+        assert found == sorted(rects)
+
+    def test_merge_prefers_whole_reads(self):
+        line = ([[0, 0], [400, 0], [400, 20], [0, 20]], 'GOVERNMENT WARNING', 0.9)
+        piece = ([[300, 0], [400, 0], [400, 20], [300, 20]], 'NING', 0.99)
+        assert Preprocessor.merge([line], [piece]) == [line]
+
+    def test_replay_is_never_preprocessed(self):
+        backend = create_backend('replay', fixture_path=FIXTURE_PATH, preprocessor=Preprocessor())
+        assert isinstance(backend, ReplayBackend)
+        assert backend.preprocessor is None
+
+    def test_preprocessing_changes_cache_key(self):
+        plain, tiled = BlobBackend(), BlobBackend()
+        tiled.preprocessor = Preprocessor()
+        assert plain.cache_key() != tiled.cache_key()
+
+    def test_merge_stitches_long_lines(self):
+        left = ([[0, 0], [300, 0], [300, 20], [0, 20]], 'GOVERNMENT WAR', 0.9)
+        right = ([[200, 1], [500, 1], [500, 21], [200, 21]], 'WARNING', 0.8)
+        assert Preprocessor.merge([], [left, right]) == [([[0, 0], [500, 0], [500, 21], [0, 21]], 'GOVERNMENT WARNING', 0.8)]
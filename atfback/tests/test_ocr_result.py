@@ -0,0 +1,81 @@
+"""
+Tests for the normalized OCR result and compiled text matchers
+"""
+import pytest
+from thefuzz import fuzz
+
+from src.ocr_result import OCRResult, TextMatcher, clean_text, compile_matcher
+
+
+@pytest.fixture
+def ocr_result():
+    return OCRResult({
+        0: {'text': 'Samuel  Adams!', 'confidence': 0.9, 'bbox': (0, 0, 100, 20)},
+        1: {'text': 'the boston beer company', 'confidence': 0.8, 'bbox': (0, 30, 100, 40)},
+        2: {'text': '12 FL. OZ', 'confidence': 0.7, 'bbox': (0, 50, 40, 60)},
+    })
+
+
+class TestOCRResult:
+    """Tests for OCRResult"""
+
+    def test_normalized_once_at_ingest(self, ocr_result):
+        assert ocr_result.clean[0] == 'SAMUEL ADAMS'
+        assert ocr_result.tokens[1] == ['THE', 'BOSTON', 'BEER', 'COMPANY']
+        assert ocr_result.lengths[2] == len('12 FL OZ')
+
+    def test_still_plain_ocrdata(self, ocr_result):
+        assert ocr_result[0]['bbox'] == (0, 0, 100, 20)
+        assert list(ocr_result.keys()) == [0, 1, 2]
+
+    def test_added_boxes_are_normalized(self, ocr_result):
+        ocr_result[3] = {'text': 'ale, brewed', 'confidence': 0.5, 'bbox': (0, 0, 1, 1)}
+        assert ocr_result.clean[3] == 'ALE BREWED'
+
+    def test_wrap(self, ocr_result):
+        assert OCRResult.wrap(ocr_result) is ocr_result
+        assert OCRResult.wrap({}).clean == {}
+
+    def test_clean_text(self):
+        assert clean_text(' 5.8%  alc/vol ') == '58% ALCVOL'
+
+
+class TestTextMatcher:
+    """Tests for TextMatcher"""
+
+    @pytest.mark.parametrize("target,text", [
+        ("Samuel Adams", "SAMUEL ADAMS"),
+        ("Samuel Adams", "SAMUEL ADAMS BOSTON LAGER"),
+        ("Adams", "SAMUEL ADAMS"),
+        ("Vodka", "VODKO"),
+        ("Grey Goose", "SAMUEL ADAMS"),
+        ("Ale", "AL"),
+    ])
+    def test_same_rule_as_inline_fuzz(self, target, text):
+        """Compiled matching should agree with the ratio/partial_ratio rule the checks used inline"""
+        expected = fuzz.ratio(target.upper(), text) > 75 or (len(text) > len(target) and fuzz.partial_ratio(target.upper(), text) > 85)
+        result = OCRResult({0: {'text': text, 'confidence': 1.0, 'bbox': (0, 0, 1, 1)}})
+        assert (TextMatcher(target).first(result) == 0) == expected
+
+    def test_first_match(self, ocr_result):
+        assert compile_matcher("Boston Beer Company").first(ocr_result) == 1
+        assert compile_matcher("Grey Goose").first(ocr_result) is None
+        assert compile_matcher("Samuel Adams").first(ocr_result, exclude={0}) is None
+
+    def test_matrix_agrees_with_thefuzz(self):
+        """Scores read off the cdist matrix should equal thefuzz's pairwise scores"""
+        texts = ['SAMUEL ADAMS', 'THE BOSTON BEER COMPANY', '', 'ALE BREWED WITH SPICES', 'WHITE CHRISTMAS', '12 FL OZ', 'A']
+        result = OCRResult({n: {'text': t, 'confidence': 1.0, 'bbox': (0, 0, 1, 1)} for n, t in enumerate(texts)})
+        targets = ['SAMUEL ADAMS', 'ALE', 'BOSTON', '']
+        result.score(targets)
+        for target in targets:
+            for row, i in enumerate(result.ids):
+                assert result.ratio_scores(target)[row] == fuzz.ratio(target, result.clean[i])
+                assert result.partial_scores(target)[row] == fuzz.partial_ratio(target, result.clean[i])
+            matcher = TextMatcher(target)
+            expected = [i for i in result.ids if fuzz.ratio(target, result.clean[i]) > 75
+                        or (result.lengths[i] > len(target) and fuzz.partial_ratio(target, result.clean[i]) > 85)]
+            assert [result.ids[row] for row in matcher.match_mask(result).nonzero()[0]] == expected
+
+    def test_compiled_once(self):
+        assert compile_matcher("Samuel Adams") is compile_matcher("Samuel Adams")
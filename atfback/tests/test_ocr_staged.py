@@ -0,0 +1,155 @@
+"""
+Tests for detect once, recognize on demand, using recorded results split into detection and recognition
+"""
+import pytest
+
+from src.ocr_backends import ReplayBackend
+from src.ocr_cache import OCRCache
+from src.ocr_checker import OCRChecker
+from src.ocr_staged import Region, StagedRead
+from pathlib import Path
+
+
+FIXTURE_PATH = Path(__file__).parent / "fixtures" / "replay_ocr.json"
+FIELDS = ('Samuel Adams', 'Ale', '5.8', '12', 'fl oz')
+
+
+@pytest.fixture(scope="module")
+def test_image_data():
+    """Load test image once for all tests"""
+    test_image_path = Path(__file__).parent.parent.parent / "examples" / "2white christmas.png"
+    if not test_image_path.exists():
+        pytest.skip(f"Test image not found at {test_image_path}")
+    with open(test_image_path, 'rb') as f:
+        return f.read()
+
+
+def rect(points):
+    xs, ys = [p[0] for p in points], [p[1] for p in points]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+class StagedReplayBackend(ReplayBackend):
+    """Replay backend that detects the recorded boxes plus small print nobody checks, and recognizes them on request"""
+    staged = True
+
+    def __init__(self, fixture_path, noise=20):
+        super().__init__(str(fixture_path))
+        self.noise = [[[20 * n, 1150], [20 * n + 15, 1150], [20 * n + 15, 1160], [20 * n, 1160]] for n in range(noise)]
+        self.recognized = []
+
+    def _recorded(self, image):
+        found = self.reader.readtext(image.data)
+        return found + [(points, 'small print', 0.5) for points in self.noise]
+
+    def detect(self, image):
+        return [Region('horizontal', [r[0], r[2], r[1], r[3]]) for r in (rect(points) for points, _, _ in self._recorded(image))]
+
+    def recognize(self, image, regions):
+        texts = {rect(points): (text, prob) for points, text, prob in self._recorded(image)}
+        self.recognized += regions
+        result = []
+        for region in regions:
+            text, prob = texts[region.rect]
+            x0, y0, x1, y1 = region.rect
+            result.append(([[x0, y0], [x1, y0], [x1, y1], [x0, y1]], text, prob))
+        return result
+
+
+def staged_checker(**kwargs):
+    checker = OCRChecker(modelSelect='replay', fixture_path=str(FIXTURE_PATH), rescan_rotations=False, **kwargs)
+    checker.backend = StagedReplayBackend(FIXTURE_PATH)
+    return checker
+
+
+class TestStagedRead:
+    """Tests for the recognition order"""
+
+    def regions(self):
+        return [Region('horizontal', [0, 100, 0, 10]), Region('horizontal', [0, 300, 100, 160]),
+                Region('free', [[500, 500], [520, 500], [520, 530], [500, 530]]), Region('horizontal', [0, 200, 200, 230])]
+
+    def test_biggest_text_first(self):
+        seen = []
+        staged = StagedRead(lambda image, regions: seen.append(regions) or [], None, self.regions(), batch_size=2)
+        staged.next_batch()
+        staged.next_batch()
+        assert [r.rect for r in seen[0]] == [(0, 100, 300, 160), (0, 200, 200, 230)]
+        assert staged.finished
+
+    def test_boost_brings_neighbours_forward(self):
+        seen = []
+        staged = StagedRead(lambda image, regions: seen.append(regions) or [], None, self.regions(), batch_size=1)
+        staged.boost((490, 490, 530, 540), pad=5)
+        staged.next_batch()
+        assert seen[0][0].kind == 'free'
+        assert staged.remaining == 3
+
+    def test_boxes_map_to_the_upload(self):
+        staged = StagedRead(lambda image, regions: [([[1, 2], [3, 2], [3, 4], [1, 4]], 'A', 0.9)], None,
+                            self.regions()[:1], to_original=lambda points: [[2 * x, 2 * y] for x, y in points])
+        assert staged.next_batch() == [([[2, 4], [6, 4], [6, 8], [2, 8]], 'A', 0.9)]
+        assert staged.next_batch() == []
+
+
+class TestRecognizeOnDemand:
+    """Tests for validate with a staged backend"""
+
+    def test_stops_recognizing_once_verified(self, test_image_data):
+        checker = staged_checker(recognize_batch=4)
+        verifications, _ = checker.validate([test_image_data], *FIELDS, annotate=False)
+        assert all(verifications.values())
+        # the small print left over is never read
+        assert 0 < len(checker.backend.recognized) < 14 + 20
+
+    def test_same_verifications_as_reading_everything(self, test_image_data):
+        staged, _ = staged_checker().validate([test_image_data], 'Samuel Adams', 'Lager', '5.8', '12', 'fl oz', annotate=False)
+        full, _ = staged_checker(recognize_on_demand=False).validate([test_image_data], 'Samuel Adams', 'Lager', '5.8', '12', 'fl oz', annotate=False)
+        assert staged == full
+        assert staged['product_class'] is False
+
+    def test_full_reads_are_cached(self, test_image_data):
+        checker = staged_checker(cache=OCRCache(max_entries=4))
+        checker.validate([test_image_data], 'Samuel Adams', 'Lager', '5.8', '12', 'fl oz', annotate=False)
+        recognized = len(checker.backend.recognized)
+        assert recognized == 14 + 20
+        verifications, _ = checker.validate([test_image_data], *FIELDS, annotate=False)
+        assert all(verifications.values())
+        assert len(checker.backend.recognized) == recognized
+
+    def test_partial_reads_are_resumed(self, test_image_data, tmp_path):
+        checker = staged_checker(recognize_batch=4, cache=OCRCache(max_entries=4, directory=str(tmp_path)))
+        detected = []
+        detect = checker.backend.detect
+        checker.backend.detect = lambda image: detected.append(image) or detect(image)
+        checker.validate([test_image_data], *FIELDS, annotate=False)
+        first = len(checker.backend.recognized)
+        assert 0 < first < 14 + 20
+        # the same label again: nothing detected or recognized twice
+        verifications, _ = checker.validate([test_image_data], *FIELDS, annotate=False)
+        assert all(verifications.values())
+        assert len(detected) == 1 and len(checker.backend.recognized) == first
+        # a field that needs the rest of the label only recognizes what is left
+        checker.cache.clear()
+        staged, _ = checker.validate([test_image_data], 'Samuel Adams', 'Lager', '5.8', '12', 'fl oz', annotate=False)
+        assert staged['product_class'] is False
+        assert len(detected) == 1 and len(checker.backend.recognized) == 14 + 20
+        assert len({region.rect for region in checker.backend.recognized}) == 14 + 20
+
+
+class TestStagedState:
+    """Tests for saving and restoring a partial read"""
+
+    def test_state_round_trip(self):
+        regions = [Region('horizontal', [0, 100, 0, 10]), Region('free', [[500, 500], [520, 500], [520, 530], [500, 530]])]
+        recognize = lambda image, batch: [([[0, 0], [1, 0], [1, 1], [0, 1]], 'TEXT', 0.9) for _ in batch]
+        staged = StagedRead(recognize, None, regions, batch_size=1)
+        staged.next_batch()
+        state = staged.state()
+        resumed = StagedRead(recognize, None, [Region.from_json(region) for region in state['regions']], batch_size=1)
+        resumed.restore(state)
+        assert resumed.remaining == 1 and not resumed.finished
+        assert resumed.next_batch() == [([[0, 0], [1, 0], [1, 1], [0, 1]], 'TEXT', 0.9)]
+        assert [r.rect for r in resumed.regions] == [r.rect for r in regions]
+        resumed.next_batch()
+        assert resumed.finished
@@ -0,0 +1,119 @@
+"""
+Tests for the quantity index behind the net contents and ABV checks
+"""
+import pytest
+
+from src.ocr_backends import index_boxes
+from src.ocr_checker import OCRChecker
+from src.quantity_index import QuantityIndex, decimals, normalize_unit, parse_number, to_ml
+
+
+def _ocr(*boxes):
+    return index_boxes([(text, 0.9, bbox) for text, bbox in boxes])
+
+
+@pytest.fixture(scope="module")
+def checker():
+    return OCRChecker(modelSelect='replay')
+
+
+class TestParsing:
+    """Tests for the number and unit parsing"""
+
+    @pytest.mark.parametrize("text,value", [
+        ("750", 750.0), ("1.5", 1.5), ("1,5", 1.5), ("1,000", 1000.0), ("0,750", 0.75), (" 12 ", 12.0), ("twelve", None), ("", None)
+    ])
+    def test_parse_number(self, text, value):
+        assert parse_number(text) == value
+
+    @pytest.mark.parametrize("text,places", [("750", 0), ("1.5", 1), ("1,75", 2), ("1,000", 0), ("0,750", 3), ("25.40", 2)])
+    def test_decimals(self, text, places):
+        assert decimals(text) == places
+
+    @pytest.mark.parametrize("unit,key", [
+        ("ml", "ml"), ("mL", "ml"), ("L", "l"), ("Liters", "l"), ("fl oz", "fl oz"), ("Fl. Oz.", "fl oz"), ("cl", "cl"), ("", None), ("kg", None), (None, None)
+    ])
+    def test_normalize_unit(self, unit, key):
+        assert normalize_unit(unit) == key
+
+    def test_to_ml(self):
+        assert to_ml("1.5", "L") == 1500
+        assert to_ml("75", "cl") == 750
+        assert to_ml("12", "fl oz") == pytest.approx(354.88, abs=0.01)
+        assert to_ml("12", "gallons") is None
+
+
+class TestQuantityIndex:
+    """Tests for QuantityIndex"""
+
+    def test_reads_every_volume_once(self):
+        ocrdata, _ = _ocr(
+            ('12 FL. OZ. (355 mL)', (10, 10, 300, 40)),
+            ('1.5L', (10, 100, 80, 130)),
+            ('75cl', (10, 200, 80, 230)),
+            ('2 LAGERS 40 LITERS', (10, 300, 400, 330)),
+        )
+        index = QuantityIndex.of(ocrdata)
+        assert [(q.value, q.unit) for q in index.volumes] == [(12, 'fl oz'), (355, 'ml'), (1.5, 'l'), (75, 'cl'), (40, 'l')]
+        assert QuantityIndex.of(ocrdata) is index
+
+    def test_amount_and_unit_in_separate_boxes(self):
+        ocrdata, _ = _ocr(('750', (100, 800, 160, 830)), ('ML', (170, 800, 220, 830)))
+        [quantity] = QuantityIndex.of(ocrdata).volumes
+        assert quantity.ml == 750 and quantity.ids == [0, 1]
+
+    def test_find_volume_across_fl_oz(self):
+        ocrdata, _ = _ocr(('12 FL OZ', (10, 10, 200, 40)), ('355 ML', (10, 100, 200, 130)))
+        index = QuantityIndex.of(ocrdata)
+        assert [q.text for q in index.find_volume(355, 'ml')] == ['355 ML', '12 FL OZ']
+        assert [q.text for q in index.find_volume(12, 'fl oz')] == ['12 FL OZ', '355 ML']
+        assert index.find_volume(370, 'ml') == []
+        # a tenth of a fl oz is the rounding of a conversion, more is another amount
+        assert [q.text for q in index.find_volume(12.1, 'fl oz', 1)] == []
+
+    def test_converted_figure_to_its_printed_digits(self):
+        ocrdata, _ = _ocr(('750 ML (25.4 FL OZ)', (10, 10, 300, 40)))
+        index = QuantityIndex.of(ocrdata)
+        assert [q.text for q in index.find_volume(750, 'ml')] == ['750 ML', '25.4 FL OZ']
+        assert [q.text for q in index.find_volume(25.4, 'fl oz', 1)] == ['25.4 FL OZ', '750 ML']
+        # in the printed unit it has to be the printed figure, the 750 ML it was converted from still matches
+        assert [q.text for q in index.find_volume(25.36, 'fl oz', 2)] == ['750 ML']
+        assert [q.text for q in index.find_volume(25.3, 'fl oz', 1)] == []
+
+    def test_metric_amounts_match_exactly(self):
+        ocrdata, _ = _ocr(('750 ML', (10, 10, 200, 40)), ('1.75 LITERS', (10, 100, 200, 130)))
+        index = QuantityIndex.of(ocrdata)
+        assert [q.text for q in index.find_volume(75, 'cl')] == ['750 ML']
+        assert [q.text for q in index.find_volume(1750, 'ml')] == ['1.75 LITERS']
+        for value, unit, places in [(745, 'ml', 0), (755, 'ml', 0), (1.74, 'l', 2), (1.76, 'l', 2), (1760, 'ml', 0)]:
+            assert index.find_volume(value, unit, places) == []
+
+    def test_find_percent(self):
+        ocrdata, _ = _ocr(('5.8% ALC/VOL', (10, 10, 200, 40)), ('5,8 %', (10, 100, 200, 130)), ('100% MALT', (10, 200, 200, 230)))
+        index = QuantityIndex.of(ocrdata)
+        assert index.find_percent(5.8) == [0, 1]
+        assert index.find_percent(100) == []
+
+
+class TestNetContents:
+    """check_net_contents through the quantity index"""
+
+    @pytest.mark.parametrize("amount,unit,found", [("750", "ml", True), ("745", "ml", False), ("755", "ml", False), ("75", "cl", True)])
+    def test_metric_amount_must_match(self, checker, amount, unit, found):
+        ocrdata, _ = _ocr(('750 ML', (10, 10, 200, 40)))
+        assert checker.check_net_contents(ocrdata, 1000, 1000, amount, unit)[0] is found
+
+    @pytest.mark.parametrize("amount,unit", [("1.74", "L"), ("1.76", "L"), ("1760", "ml")])
+    def test_wrong_liters_fail(self, checker, amount, unit):
+        ocrdata, _ = _ocr(('1.75 LITERS', (10, 10, 200, 40)))
+        assert checker.check_net_contents(ocrdata, 1000, 1000, amount, unit) == (False, [])
+
+    @pytest.mark.parametrize("amount,unit", [("1500", "ml"), ("1.5", "L"), ("150", "cl")])
+    def test_units_are_equivalent(self, checker, amount, unit):
+        ocrdata, _ = _ocr(('1.5 LITERS', (10, 10, 200, 40)))
+        assert checker.check_net_contents(ocrdata, 1000, 1000, amount, unit) == (True, [(10, 10, 200, 40)])
+
+    @pytest.mark.parametrize("amount,unit", [("750", "ml"), ("1", "L"), ("", "ml"), ("12", ""), ("12", "gallons"), ("1.49", "L"), ("1510", "ml")])
+    def test_not_found_is_false(self, checker, amount, unit):
+        ocrdata, _ = _ocr(('1.5 LITERS', (10, 10, 200, 40)))
+        assert checker.check_net_contents(ocrdata, 1000, 1000, amount, unit) == (False, [])
@@ -0,0 +1,181 @@
+"""
+Tests for the job API of the Flask server, running on the replay OCR backend
+"""
+import io
+import os
+import struct
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+FIXTURE_PATH = str(Path(__file__).parent / "fixtures" / "replay_ocr.json")
+TEST_IMAGE_PATH = Path(__file__).parent.parent.parent / "examples" / "2white christmas.png"
+
+
+@pytest.fixture(scope="module")
+def client():
+    """Flask test client with the server running on replayed OCR"""
+    os.environ['OCR_MODEL'] = 'replay'
+    os.environ['OCR_REPLAY_FIXTURES'] = FIXTURE_PATH
+    # server.py imports its siblings the same way wsgi.py sets it up
+    sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+    from server import app
+    return app.test_client()
+
+
+@pytest.fixture(scope="module")
+def auth_headers(client):
+    """JWT for the default user"""
+    import base64
+    creds = base64.b64encode(b"user:password").decode()
+    token = client.post('/login', headers={'Authorization': f'Basic {creds}'}).get_json()['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def _form():
+    if not TEST_IMAGE_PATH.exists():
+        pytest.skip(f"Test image not found at {TEST_IMAGE_PATH}")
+    return {
+        'brandName': 'Samuel Adams',
+        'productClass': 'Ale',
+        'alcoholContent': '5.8',
+        'netContents': '12',
+        'netContentsUnit': 'fl oz',
+        'images': (open(TEST_IMAGE_PATH, 'rb'), TEST_IMAGE_PATH.name)
+    }
+
+
+def _wait_for(client, auth_headers, job_id):
+    for _ in range(100):
+        status = client.get(f'/jobs/{job_id}', headers=auth_headers).get_json()
+        if status['status'] in ('done', 'failed'):
+            return status
+        time.sleep(0.05)
+    pytest.fail("job did not finish")
+
+
+class TestJobApi:
+    """Tests for /jobs"""
+
+    def test_submit_poll_and_fetch(self, client, auth_headers):
+        response = client.post('/jobs', data=_form(), headers=auth_headers, content_type='multipart/form-data')
+        assert response.status_code == 202
+        job_id = response.get_json()['job_id']
+
+        status = _wait_for(client, auth_headers, job_id)
+        assert status['status'] == 'done'
+        assert status['progress']['images'] == 1
+
+        result = client.get(f'/jobs/{job_id}/result', headers=auth_headers)
+        assert result.status_code == 200
+        body = result.get_json()
+        assert body['validations']['brand_name'] is True
+        assert len(body['images']) == 1
+
+    def test_unknown_job(self, client, auth_headers):
+        assert client.get('/jobs/nope', headers=auth_headers).status_code == 404
+        assert client.get('/jobs/nope/result', headers=auth_headers).status_code == 404
+
+    def test_requires_token(self, client):
+        assert client.post('/jobs').status_code == 401
+
+    def test_sync_submit_still_works(self, client, auth_headers):
+        response = client.post('/submit-product', data=_form(), headers=auth_headers, content_type='multipart/form-data')
+        assert response.status_code == 200
+        assert response.get_json()['validations']['gov_warn'] is True
+
+
+class TestBoxesMode:
+    """Tests for ?images=boxes and the annotated image endpoint"""
+
+    def test_returns_geometry_not_images(self, client, auth_headers):
+        response = client.post('/submit-product?images=boxes', data=_form(), headers=auth_headers, content_type='multipart/form-data')
+        assert response.status_code == 200
+        body = response.get_json()
+        assert 'images' not in body
+        (entry,) = body['geometry']
+        assert (entry['width'], entry['height']) == (1536, 1224)
+        assert set(entry['boxes']) == set(body['validations'])
+        for box in entry['boxes']['brand_name']:
+            assert len(box) == 4 and all(isinstance(v, int) for v in box)
+        assert entry['url'] == f"/jobs/{body['job_id']}/images/0"
+
+    def test_annotated_image_on_request(self, client, auth_headers):
+        body = client.post('/submit-product?images=boxes', data=_form(), headers=auth_headers, content_type='multipart/form-data').get_json()
+        url = body['geometry'][0]['url']
+
+        jpg = client.get(url, headers=auth_headers)
+        assert jpg.status_code == 200 and jpg.mimetype == 'image/jpeg'
+        assert jpg.data[:3] == b'\xff\xd8\xff'
+        small = client.get(f'{url}?quality=10', headers=auth_headers)
+        assert len(small.data) < len(jpg.data)
+        png = client.get(f'{url}?format=png', headers=auth_headers)
+        assert png.mimetype == 'image/png' and png.data[:4] == b'\x89PNG'
+
+        assert client.get(f'{url}?format=gif', headers=auth_headers).status_code == 400
+        assert client.get(f'{url}?quality=0', headers=auth_headers).status_code == 400
+        assert client.get(f"/jobs/{body['job_id']}/images/1", headers=auth_headers).status_code == 404
+
+    def test_embed_jobs_have_no_image_endpoint(self, client, auth_headers):
+        job_id = client.post('/jobs', data=_form(), headers=auth_headers, content_type='multipart/form-data').get_json()['job_id']
+        _wait_for(client, auth_headers, job_id)
+        assert client.get(f'/jobs/{job_id}/images/0', headers=auth_headers).status_code == 404
+
+    def test_unknown_mode(self, client, auth_headers):
+        response = client.post('/jobs?images=thumbnails', data=_form(), headers=auth_headers, content_type='multipart/form-data')
+        assert response.status_code == 400
+
+
+class TestReady:
+    """Tests for /ready"""
+
+    def test_ready_after_warm_up(self, client):
+        from server import warmup
+        if not warmup.ready():
+            assert client.get('/ready').status_code == 503
+        warmup.start()
+        assert warmup.wait(timeout=10)
+        response = client.get('/ready')
+        assert response.status_code == 200
+        assert response.get_json()['status'] == 'ready'
+
+
+class TestMetricsEndpoint:
+    """Tests for /metrics"""
+
+    def test_stages_are_timed(self, client, auth_headers):
+        client.post('/submit-product', data=_form(), headers=auth_headers, content_type='multipart/form-data')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        text = response.get_data(as_text=True)
+        for stage in ('decode', 'ocr', 'check_brand_name', 'check_government_warning', 'serialize'):
+            assert f'ocr_stage_seconds_count{{stage="{stage}"}}' in text
+        assert 'ocr_queue_wait_seconds_count' in text
+        assert 'ocr_boxes_per_image_count' in text
+
+    def test_rejections_are_counted(self, client, auth_headers):
+        client.post('/jobs?images=nope', data=_form(), headers=auth_headers, content_type='multipart/form-data')
+        assert 'ocr_rejections_total{reason="bad_request"}' in client.get('/metrics').get_data(as_text=True)
+
+
+class TestUploadAdmission:
+    """Tests for the header check on uploads"""
+
+    def test_rejects_non_image(self, client, auth_headers):
+        form = {**_form(), 'images': (io.BytesIO(b'%PDF-1.7 not a label'), 'label.pdf')}
+        response = client.post('/jobs', data=form, headers=auth_headers, content_type='multipart/form-data')
+        assert response.status_code == 415
+        assert 'label.pdf' in response.get_json()['error']
+        assert 'ocr_rejections_total{reason="bad_image"}' in client.get('/metrics').get_data(as_text=True)
+
+    def test_rejects_over_pixel_budget(self, client, auth_headers):
+        import server
+        # a 60000x60000 PNG header, nothing behind it is ever inflated
+        header = b'\x89PNG\r\n\x1a\n' + struct.pack('>I4sII', 13, b'IHDR', 60000, 60000) + b'\x08\x02\x00\x00\x00'
+        form = {**_form(), 'images': (io.BytesIO(header + b'\x00' * 64), 'bomb.png')}
+        response = client.post('/submit-product', data=form, headers=auth_headers, content_type='multipart/form-data')
+        assert response.status_code == 413
+        assert f'{server.OCR_MAX_PIXELS / 1e6:g} megapixel' in response.get_json()['error']
+        assert 'ocr_rejections_total{reason="too_many_pixels"}' in client.get('/metrics').get_data(as_text=True)
@@ -0,0 +1,118 @@
+"""
+Tests for reading the images of a submission in parallel
+"""
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from src.ocr_backends import ReplayBackend
+from src.ocr_checker import OCRChecker
+from pathlib import Path
+
+
+FIXTURE_PATH = str(Path(__file__).parent / "fixtures" / "replay_ocr.json")
+FIELDS = ('Samuel Adams', 'Ale', '5.8', '12', 'fl oz')
+
+
+@pytest.fixture(scope="module")
+def label():
+    """The label every field is recorded for"""
+    test_image_path = Path(__file__).parent.parent.parent / "examples" / "2white christmas.png"
+    if not test_image_path.exists():
+        pytest.skip(f"Test image not found at {test_image_path}")
+    with open(test_image_path, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture(scope="module")
+def blank():
+    """An image with nothing recorded for it"""
+    _, buffer = cv2.imencode('.png', np.full((200, 300, 3), 255, np.uint8))
+    return buffer.tobytes()
+
+
+class SlowBackend(ReplayBackend):
+    """Replay backend taking a fixed time per read, recording how many reads overlap"""
+
+    def __init__(self, fixture_path, seconds):
+        super().__init__(fixture_path)
+        self.seconds = seconds
+        self.reads = 0
+        self.running = 0
+        self.most_running = 0
+        self._lock = threading.Lock()
+
+    def readtext(self, image):
+        with self._lock:
+            self.reads += 1
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        time.sleep(self.seconds)
+        with self._lock:
+            self.running -= 1
+        return super().readtext(image)
+
+
+def slow_checker(image_workers, seconds=0.3):
+    checker = OCRChecker(modelSelect='replay', fixture_path=FIXTURE_PATH, rescan_rotations=False, image_workers=image_workers)
+    checker.backend = SlowBackend(FIXTURE_PATH, seconds)
+    return checker
+
+
+class TestParallelValidate:
+    """Tests for concurrent reads and early termination"""
+
+    def test_images_are_read_concurrently(self, label, blank):
+        checker = slow_checker(image_workers=2)
+        start = time.perf_counter()
+        verifications, _ = checker.validate([blank, label], *FIELDS, annotate=False)
+        elapsed = time.perf_counter() - start
+        assert all(verifications.values())
+        assert checker.backend.most_running == 2
+        # about the slowest image, not the sum of both
+        assert elapsed < 0.55
+
+    def test_queued_reads_are_dropped_once_verified(self, label, blank):
+        checker = slow_checker(image_workers=1, seconds=0.05)
+        verifications, oimages = checker.validate([label, blank, blank], *FIELDS, annotate=True)
+        assert all(verifications.values())
+        assert checker.backend.reads == 1
+        # only the image that was read is annotated, the rest come back as uploaded
+        assert oimages[0][:3] == b'\xff\xd8\xff' and oimages[1:] == [blank, blank]
+
+    def test_fields_found_across_images(self, label, blank):
+        checker = slow_checker(image_workers=3, seconds=0.01)
+        verifications, oimages = checker.validate([blank, blank, label], *FIELDS, annotate=True)
+        assert all(verifications.values())
+        assert len(oimages) == 3
+
+    def test_bad_image_raises(self, label):
+        checker = slow_checker(image_workers=2, seconds=0.01)
+        with pytest.raises(ValueError):
+            checker.validate([b'not an image', label], *FIELDS, annotate=False)
+
+    def test_locate_sizes_only_the_images_read(self, label, blank):
+        checker = slow_checker(image_workers=1, seconds=0.01)
+        verifications, geometry = checker.locate([label, blank], *FIELDS)
+        assert all(verifications.values())
+        assert (geometry[0]['width'], geometry[0]['height']) == (1536, 1224)
+        assert set(geometry[0]['boxes']) == set(verifications)
+        assert geometry[1] == {'width': None, 'height': None, 'boxes': {}}
+
+    @pytest.mark.skipif(not hasattr(os, 'fork'), reason="needs fork")
+    def test_pool_restarts_in_a_forked_child(self, label):
+        checker = slow_checker(image_workers=1, seconds=0.01)
+        checker.validate([label], *FIELDS, annotate=False)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                verifications, _ = checker.validate([label], *FIELDS, annotate=False)
+                os._exit(0 if all(verifications.values()) else 1)
+            except BaseException:
+                os._exit(2)
+        _, status = os.waitpid(pid, 0)
+        assert os.WEXITSTATUS(status) == 0
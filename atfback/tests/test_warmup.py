@@ -0,0 +1,109 @@
+"""
+Tests for the model warm-up and readiness
+"""
+import os
+
+import pytest
+
+from src.ocr_backends import OCRBackend
+from src.ocr_checker import OCRChecker
+from src.ocr_staged import Region
+from src.warmup import FAILED, LABEL_FIELDS, READY, STARTING, WarmUp, synthetic_label
+
+
+class CountingChecker(OCRChecker):
+    """Replay checker counting the warm-up reads"""
+
+    def __init__(self, fail=False):
+        super().__init__(modelSelect='replay')
+        self.fail = fail
+        self.reads = 0
+
+    def _read(self, image, rotation):
+        self.reads += 1
+        if self.fail:
+            raise RuntimeError("no model")
+        return super()._read(image, rotation)
+
+
+class StagedBackend(OCRBackend):
+    """Detects one region and reads the brand off it"""
+    name = 'staged'
+    staged = True
+
+    def __init__(self):
+        self.calls = []
+
+    def detect(self, image):
+        self.calls.append('detect')
+        return [Region('horizontal', [40, 640, 40, 120])]
+
+    def recognize(self, image, regions):
+        self.calls.append('recognize')
+        return [([[40, 40], [640, 40], [640, 120], [40, 120]], 'WARM UP BREWING', 0.9)]
+
+
+class TestWarmUp:
+    """Tests for WarmUp"""
+
+    def test_not_ready_until_warmed_up(self):
+        warmup = WarmUp(CountingChecker())
+        assert warmup.status == STARTING and not warmup.ready()
+        warmup.start()
+        assert warmup.wait(timeout=5)
+        assert warmup.ready()
+        assert warmup.to_dict()['seconds'] >= 0
+        assert set(warmup.verifications) == {'brand_name', 'product_class', 'alcohol_content', 'net_contents', 'gov_warn'}
+
+    def test_runs_once(self):
+        checker = CountingChecker()
+        warmup = WarmUp(checker)
+        warmup.start().join(5)
+        warmup.start().join(5)
+        assert checker.reads == 1
+
+    def test_failure_is_not_ready(self):
+        warmup = WarmUp(CountingChecker(fail=True))
+        warmup.start()
+        warmup.wait(timeout=5)
+        assert warmup.status == FAILED
+        assert warmup.to_dict() == {'ready': False, 'status': FAILED, 'seconds': warmup.to_dict()['seconds'], 'error': 'no model'}
+
+    def test_disabled_is_ready_at_once(self):
+        checker = CountingChecker()
+        warmup = WarmUp(checker, enabled=False)
+        assert warmup.ready() and warmup.start() is None
+        assert checker.reads == 0
+
+    def test_bypasses_the_cache(self, tmp_path):
+        from src.ocr_cache import OCRCache
+        checker = CountingChecker()
+        checker.cache = OCRCache(max_entries=4, directory=str(tmp_path))
+        for _ in range(2):
+            warmup = WarmUp(checker)
+            warmup.start().join(5)
+            assert warmup.ready()
+        # both ran the model, and left nothing behind in either tier
+        assert checker.reads == 2
+        assert checker.cache.stats()['entries'] == 0 and checker.cache.stats()['misses'] == 0
+        assert list(tmp_path.rglob('*.json')) == []
+
+    def test_runs_the_staged_path(self):
+        checker = OCRChecker(modelSelect='replay', rescan_rotations=False)
+        checker.backend = StagedBackend()
+        verifications = checker.warm_up(synthetic_label(), **LABEL_FIELDS)
+        assert verifications['brand_name'] and not verifications['gov_warn']
+        assert checker.backend.calls == ['detect', 'recognize']
+
+    def test_forked_child_warms_up_itself(self):
+        warmup = WarmUp(CountingChecker())
+        warmup.start().join(5)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                warmup.start().join(5)
+                os._exit(0 if warmup.status == READY and warmup.checker.reads == 2 else 1)
+            except BaseException:
+                os._exit(2)
+        _, status = os.waitpid(pid, 0)
+        assert os.WEXITSTATUS(status) == 0
@@ -0,0 +1,129 @@
+"""
+Tests for the full government warning verification
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+from src.ocr_backends import box_records, index_boxes
+from src.ocr_checker import OCRChecker
+from src.warning_matcher import AhoCorasick, WarningMatcher, compile_warning_matcher
+
+FIXTURE_PATH = Path(__file__).parent / "fixtures" / "replay_ocr.json"
+HEADING = 'GOVERNMENT WARNING: (1) ACCORDING TO THE SURGEON GENERAL, WOMEN'
+LINES = [
+    'SHOULD NOT DRINK ALCOHOLIC BEVERAGES DURING PREGNANCY BECAUSE OF',
+    'THE RISK OF BIRTH DEFECTS. (2) CONSUMPTION OF ALCOHOLIC BEVERAGES',
+    'IMPAIRS YOUR ABILITY TO DRIVE A CAR OR OPERATE MACHINERY, AND',
+    'MAY CAUSE HEALTH PROBLEMS.',
+]
+
+
+class CountingList(list):
+    """A list counting its item lookups"""
+
+    lookups = 0
+
+    def __getitem__(self, item):
+        CountingList.lookups += 1
+        return super().__getitem__(item)
+
+
+class CountingMatcher(WarningMatcher):
+    """Counts the hits each chain looks at, and how many it was given"""
+
+    hits = 0
+
+    def _chain(self, c, hits, span):
+        CountingMatcher.hits += len(hits)
+        return super()._chain(c, CountingList(hits), span)
+
+
+def _ocr(*texts, top=600):
+    # one box per line of small print, stacked into a block
+    return index_boxes([(text, 0.9, (100, top + 25 * n, 900, top + 25 * n + 20)) for n, text in enumerate(texts)])
+
+
+@pytest.fixture(scope="module")
+def checker():
+    return OCRChecker(modelSelect='replay')
+
+
+class TestAhoCorasick:
+    """Tests for the automaton"""
+
+    def test_finds_every_occurrence(self):
+        automaton = AhoCorasick(['HE', 'SHE', 'HERS', 'HIS'])
+        assert sorted(automaton.find_all('USHERS')) == [(1, 1), (2, 0), (2, 2)]
+
+    def test_no_patterns_found(self):
+        assert AhoCorasick(['ABC']).find_all('ABXABD') == []
+
+
+class TestWarningMatcher:
+    """Tests for WarningMatcher"""
+
+    def test_full_statement(self):
+        ocrdata, _ = _ocr(HEADING, *LINES)
+        clauses = compile_warning_matcher().verify(ocrdata)
+        assert all(clause.found for clause in clauses.values())
+        assert clauses['heading'].ids == [0]
+        assert clauses['pregnancy'].ids == [0, 1, 2]
+        assert clauses['machinery'].ids == [2, 3, 4]
+
+    def test_misread_letters_and_run_together_words(self):
+        ocrdata, _ = _ocr('G0VERNMENT WARNlNG (1) ACCORDING TO THE SURGEONGENERAL WOMEN', *LINES)
+        clauses = compile_warning_matcher().verify(ocrdata)
+        assert all(clause.found for clause in clauses.values())
+        assert clauses['heading'].coverage < 1
+
+    def test_missing_clause(self):
+        ocrdata, _ = _ocr(HEADING, LINES[0], 'THE RISK OF BIRTH DEFECTS.')
+        clauses = compile_warning_matcher().verify(ocrdata)
+        assert clauses['heading'].found and clauses['pregnancy'].found
+        assert not clauses['machinery'].found and clauses['machinery'].coverage < 0.5
+
+    def test_words_out_of_order_do_not_count(self):
+        words = 'ACCORDING TO THE SURGEON GENERAL WOMEN SHOULD NOT DRINK ALCOHOLIC BEVERAGES DURING PREGNANCY'.split()
+        ocrdata, _ = _ocr(' '.join(reversed(words)))
+        assert not compile_warning_matcher().verify(ocrdata)['pregnancy'].found
+
+    def test_custom_clauses(self):
+        matcher = WarningMatcher((('sulfites', 'CONTAINS SULFITES'),))
+        ocrdata, _ = _ocr('PRODUCT OF FRANCE', 'CONTAINS SULFITES')
+        assert matcher.verify(ocrdata)['sulfites'].ids == [1]
+
+    def test_repeated_statement_is_linear(self):
+        # a label printing the statement over and over: each hit only looks back over a window, not at every earlier hit
+        CountingList.lookups = CountingMatcher.hits = 0
+        ocrdata, _ = _ocr(*[HEADING, *LINES] * 100)
+        clauses = CountingMatcher().verify(ocrdata)
+        assert all(clause.found for clause in clauses.values())
+        assert CountingMatcher.hits > 5000
+        # all pairs would be thousands per hit here
+        assert CountingList.lookups < 200 * CountingMatcher.hits
+
+    def test_replay_label(self, checker):
+        [readtext] = json.loads(FIXTURE_PATH.read_text()).values()
+        ocrdata, _ = index_boxes(box_records(readtext))
+        clauses = checker.verify_government_warning(ocrdata)
+        assert {name: clause.found for name, clause in clauses.items()} == {'heading': True, 'pregnancy': True, 'machinery': True}
+
+
+class TestCheckGovernmentWarning:
+    """check_government_warning with and without the statement"""
+
+    def test_full_statement_is_found(self, checker):
+        ocrdata, _ = _ocr(HEADING, *LINES)
+        found, boxes = checker.check_government_warning(ocrdata, 1000, 1000)
+        assert found is True and len(boxes) == 5
+
+    def test_heading_alone_is_not_enough(self, checker):
+        ocrdata, _ = _ocr('GOVERNMENT WARNING')
+        assert checker.check_government_warning(ocrdata, 1000, 1000) == (False, [])
+
+    def test_heading_alone_without_warning_text(self):
+        checker = OCRChecker(modelSelect='replay', warning_text=False)
+        ocrdata, _ = _ocr('GOVERNMENT WARNING')
+        assert checker.check_government_warning(ocrdata, 1000, 1000) == (True, [(100, 600, 900, 620)])
@@ -0,0 +1,30 @@
+"""
+Headless worker entry point for the ATF Label Application
+Takes validation jobs from a queue instead of serving the web app, for audits
+"""
+import argparse
+import logging
+import sys
+import os
+
+# Add src directory to Python path so we can import the worker module
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from ocr_checker import OCRChecker
+from job_queue import open_queue
+from ocr_worker import run_worker
+
+if __name__ == "__main__":
+    # Usage: python worker.py --queue sqlite:///audit.db
+    parser = argparse.ArgumentParser(description="Headless OCR validation worker")
+    parser.add_argument("--queue", default=os.environ.get('OCR_QUEUE_URL', 'sqlite:///ocr_jobs.db'), help="Queue URL. Default: OCR_QUEUE_URL or sqlite:///ocr_jobs.db")
+    parser.add_argument("--model", default=os.environ.get('OCR_MODEL', 'easyocr'), help="OCR backend: easyocr, tesseract or replay")
+    parser.add_argument("--fixtures", default=os.environ.get('OCR_REPLAY_FIXTURES'), help="Replay fixture file for --model replay")
+    parser.add_argument("--poll", type=float, default=1.0, help="Seconds between polls of an empty queue")
+    parser.add_argument("--max-jobs", type=int, default=None, help="Exit after this many jobs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    checker = OCRChecker(modelSelect=args.model, fixture_path=args.fixtures)
+    run_worker(open_queue(args.queue), checker, poll_interval=args.poll, max_jobs=args.max_jobs)
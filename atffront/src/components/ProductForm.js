@@ -30,6 +30,8 @@ const ProductForm = ({ token }) => {
     const [isResultsModalOpen, setIsResultsModalOpen] = useState(false);
     // State for images returned from server
     const [resultImages, setResultImages] = useState([]);
+    // Image sizes and found boxes from server, drawn over resultImages
+    const [resultGeometry, setResultGeometry] = useState([]);
 
     // Helper function to get error classes
     const getInputClass = (fieldName) => {
@@ -151,7 +153,8 @@ const ProductForm = ({ token }) => {
 
     const handleSubmissionConfirm = (result) => {
         // Map server validation response to ResultsModal format
-        // Server returns: { success, validations: {brand_name, product_class, alcohol_content, net_contents, gov_warn}, user, images: [...] }
+        // Server returns: { success, validations: {brand_name, product_class, alcohol_content, net_contents, gov_warn}, user, geometry: [...] }
+        // geometry holds each image's size and found boxes; the boxes are drawn over the uploaded files
         
         const mappedData = {
             validations: {
@@ -164,7 +167,8 @@ const ProductForm = ({ token }) => {
         };
         
         setResultsData(mappedData);
-        setResultImages(result.images || []);  // Store images from server
+        setResultImages(result.geometry ? uploadedFiles.map((file) => URL.createObjectURL(file)) : (result.images || []));
+        setResultGeometry(result.geometry || []);
         setIsResultsModalOpen(true);
         setIsSubmitModalOpen(false);
     };
@@ -172,7 +176,9 @@ const ProductForm = ({ token }) => {
     const closeResultsModal = () => {
         setIsResultsModalOpen(false);
         setResultsData(null);
+        resultImages.filter((url) => url.startsWith('blob:')).forEach((url) => URL.revokeObjectURL(url));
         setResultImages([]);
+        setResultGeometry([]);
         // Don't clear the form - keep it for potential edits or reference
     };
 
@@ -282,6 +288,7 @@ const ProductForm = ({ token }) => {
                                 >
                                     <option value="ml">ml</option>
                                     <option value="fl oz">fl oz</option>
+                                    <option value="cl">cl</option>
                                     <option value="L">L</option>
                                 </select>
                             </div>
@@ -324,6 +331,7 @@ const ProductForm = ({ token }) => {
                     data={resultsData}
                     onClose={closeResultsModal}
                     images={resultImages}
+                    geometry={resultGeometry}
                 />
             )}
         </div>
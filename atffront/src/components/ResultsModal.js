@@ -1,6 +1,6 @@
 import React, { useState } from 'react';
 
-const ResultsModal = ({ data, onClose, images }) => {
+const ResultsModal = ({ data, onClose, images, geometry = [] }) => {
     const [currentImageIndex, setCurrentImageIndex] = useState(0);
 
     const goToNextImage = () => {
@@ -11,6 +11,47 @@ const ResultsModal = ({ data, onClose, images }) => {
         setCurrentImageIndex((prevIndex) => (prevIndex - 1 + images.length) % images.length);
     };
 
+    // Found boxes are drawn over the image in its own pixel coordinates; without a size
+    // (embedded images are annotated already, unread images have no boxes) the plain image is shown
+    const renderImage = (index) => {
+        const entry = geometry[index];
+        if (!entry || !entry.width || !entry.height) {
+            return (
+                <img
+                    src={images[index]}
+                    alt={`Result ${index + 1}`}
+                    className="max-w-full max-h-full object-contain rounded"
+                />
+            );
+        }
+        const strokeWidth = Math.max(entry.width, entry.height) / 300;
+        return (
+            <svg
+                viewBox={`0 0 ${entry.width} ${entry.height}`}
+                preserveAspectRatio="xMidYMid meet"
+                className="w-full h-full rounded"
+                role="img"
+                aria-label={`Result ${index + 1}`}
+            >
+                <image href={images[index]} width={entry.width} height={entry.height} />
+                {Object.entries(entry.boxes || {}).flatMap(([field, boxes]) =>
+                    boxes.map(([minx, miny, maxx, maxy], n) => (
+                        <rect
+                            key={`${field}-${n}`}
+                            x={minx}
+                            y={miny}
+                            width={maxx - minx}
+                            height={maxy - miny}
+                            fill="none"
+                            stroke="#00ff00"
+                            strokeWidth={strokeWidth}
+                        />
+                    ))
+                )}
+            </svg>
+        );
+    };
+
     // Helper function to get validation status from the data structure
     const getValidationStatus = (key) => {
         return data?.validations?.[key] || false;
@@ -42,11 +83,7 @@ const ResultsModal = ({ data, onClose, images }) => {
                                     &lt;
                                 </button>
                             )}
-                            <img
-                                src={images[currentImageIndex]}
-                                alt={`Result ${currentImageIndex + 1}`}
-                                className="max-w-full max-h-full object-contain rounded"
-                            />
+                            {renderImage(currentImageIndex)}
                             {images.length > 1 && (
                                 <button
                                     onClick={goToNextImage}
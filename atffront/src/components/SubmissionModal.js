@@ -24,8 +24,8 @@ const SubmissionModal = ({ data, onClose, images, onConfirm, token }) => {
                 formData.append('images', image);
             });
 
-            // Send to backend
-            const response = await fetch('/submit-product', {
+            // Send to backend; boxes mode returns where each field was found instead of annotated images
+            const response = await fetch('/submit-product?images=boxes', {
                 method: 'POST',
                 headers: {
                     'Authorization': `Bearer ${token}`,